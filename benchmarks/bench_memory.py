@@ -0,0 +1,238 @@
+"""内存预算测试 - 按脚本模拟一次使用过程（启动 -> N 次切换 -> M 次发送），记录每个阶段的 RSS 峰值和 tracemalloc 峰值
+
+用法（不需要图形界面）:
+    python benchmarks/bench_memory.py                          # 默认 8 次切换、20 次发送，按 memory_budget.json 检查
+    python benchmarks/bench_memory.py --switches 16 --sends 50 -o mem.json
+    python benchmarks/bench_memory.py --no-budget              # 只记录不检查
+
+阶段与 GUI 的对应关系:
+    startup   导入模块、预加载当前角色全部表情和所有背景（ManosabaCore 启动时的预加载）
+    switches  通过 ManosabaCore.switch_character 轮流切换角色并生成预览底图
+              （清空角色缓存、预加载新角色、经 render_utils.get_base_image 取底图并复制一份给预览）
+    sends     在当前底图上绘制语料文本/图片并合成、编码（发送流程去掉剪贴板和按键）
+
+RSS 由后台线程每隔几毫秒采样得到阶段内峰值；tracemalloc 只统计 Python 分配器，
+Pillow 的像素缓冲不在其中，所以两者都要看。超出 memory_budget.json 中的预算时返回1。
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET = os.path.join(BENCH_DIR, "memory_budget.json")
+DEFAULT_CORPUS = os.path.join(BENCH_DIR, "corpus.json")
+
+_MB = 1024 * 1024
+
+
+class RssSampler:
+    """后台采样进程 RSS，记录区间内的峰值"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._process = psutil.Process()
+        self._peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def rss(self) -> int:
+        return self._process.memory_info().rss
+
+    def __enter__(self):
+        self._peak = self.rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="RssSampler")
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, self.rss())
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self._peak = max(self._peak, self.rss())
+        return False
+
+    @property
+    def peak(self) -> int:
+        return self._peak
+
+
+def run_phase(name: str, func: Callable[[], None]) -> Dict[str, float]:
+    """执行一个阶段，返回 RSS / tracemalloc 统计（MB）"""
+    tracemalloc.reset_peak()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    st = time.perf_counter()
+    with RssSampler() as sampler:
+        rss_before = sampler.rss()
+        func()
+    traced_after, traced_peak = tracemalloc.get_traced_memory()
+    stats = {
+        "elapsed_s": round(time.perf_counter() - st, 2),
+        "rss_start_mb": round(rss_before / _MB, 1),
+        "rss_end_mb": round(sampler.rss() / _MB, 1),
+        "rss_peak_mb": round(sampler.peak / _MB, 1),
+        "tracemalloc_peak_mb": round(traced_peak / _MB, 2),
+        "tracemalloc_growth_mb": round((traced_after - traced_before) / _MB, 2),
+    }
+    print(
+        f"{name:10s} RSS 峰值 {stats['rss_peak_mb']:8.1f}MB  结束 {stats['rss_end_mb']:8.1f}MB  "
+        f"tracemalloc 峰值 {stats['tracemalloc_peak_mb']:7.2f}MB  增长 {stats['tracemalloc_growth_mb']:7.2f}MB  "
+        f"用时 {stats['elapsed_s']}s"
+    )
+    return stats
+
+
+class Session:
+    """脚本化的使用过程：切换角色走 ManosabaCore，底图走 render_utils.get_base_image（与 GUI 共用同一个缓存）
+
+    预加载在当前线程同步执行（core 使用禁用预加载的 Engine），这样每个阶段的峰值包含预加载的内存。
+    """
+
+    def __init__(self, corpus: dict, seed: int):
+        self.corpus = corpus
+        self.rng = random.Random(seed)
+        self.core = None
+        self.current_base = None
+        self.preview = None
+
+    def startup(self):
+        global CONFIGS, DEFAULT_BRACKET_COLOR, DEFAULT_TEXT_COLOR, load_utils, draw_utils, render_utils
+        from config import CONFIGS, DEFAULT_BRACKET_COLOR, DEFAULT_TEXT_COLOR
+        import load_utils
+        import draw_utils
+        import render_utils
+        from core import ManosabaCore
+        from engine import Engine
+
+        self.core = ManosabaCore(engine=Engine(preload=False, sentiment=False))
+        manager = load_utils.get_preload_manager()
+        manager.preload_character_images(CONFIGS.get_character())
+        manager.preload_backgrounds()
+        self._make_preview(CONFIGS.get_character())
+
+    def _make_preview(self, character_name: str):
+        emotion = self.rng.randint(1, CONFIGS.mahoshojo[character_name]["emotion_count"])
+        background = self.rng.randint(1, max(CONFIGS.background_count, 1))
+        base = render_utils.get_base_image(character_name, background, emotion)
+        self.current_base = base
+        self.preview = base.copy()
+
+    def switches(self, count: int):
+        characters = CONFIGS.character_list
+        for i in range(count):
+            index = CONFIGS.current_character_index % len(characters) + 1
+            self.core.switch_character(index)
+            character_name = CONFIGS.get_character()
+            load_utils.get_preload_manager().preload_character_images(character_name)
+            self._make_preview(character_name)
+
+    def sends(self, count: int):
+        from PIL import Image
+
+        cases = self.corpus["cases"]
+        character_name = CONFIGS.get_character()
+        font_name = render_utils.resolve_font_name(CONFIGS.gui_settings.get("font_family"), character_name)
+        box_top_left, box_bottom_right = CONFIGS.config.BOX_RECT
+        for i in range(count):
+            case = cases[i % len(cases)]
+            image = None
+            if case.get("image_size"):
+                image = Image.linear_gradient("L").resize(tuple(case["image_size"])).convert("RGB")
+                image.info["content_key"] = f"bench-{case['name']}"
+            # 每轮文本不同，避免整轮命中内容图层缓存
+            text = f"{case.get('text') or ''}{i // len(cases)}" if case.get("text") else None
+            layer = draw_utils.render_content_layer_cached(
+                self.current_base.size, box_top_left, box_bottom_right, text, image,
+                color=render_utils.hex_to_rgb(CONFIGS.gui_settings.get("text_color", DEFAULT_TEXT_COLOR)),
+                bracket_color=render_utils.hex_to_rgb(CONFIGS.gui_settings.get("bracket_color", DEFAULT_BRACKET_COLOR)),
+                max_font_height=CONFIGS.gui_settings.get("font_size", 120),
+                font_name=font_name,
+                image_padding=12,
+            )
+            draw_utils.compose_content_image(
+                self.current_base, layer,
+                compression_settings=CONFIGS.gui_settings.get("image_compression", None),
+            )
+
+
+def check_budget(results: Dict[str, Dict[str, float]], budget: Dict[str, Dict[str, float]]) -> List[str]:
+    """返回超出预算的描述列表；预算键名与结果键名相同（如 rss_peak_mb）"""
+    failures = []
+    for phase, limits in budget.items():
+        if phase.startswith("_") or phase not in results:
+            continue
+        for key, limit in limits.items():
+            value = results[phase].get(key)
+            if value is not None and value > limit:
+                failures.append(f"{phase}.{key} = {value} 超出预算 {limit}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="魔裁文本框内存预算测试")
+    parser.add_argument("--switches", type=int, default=8, help="切换角色次数")
+    parser.add_argument("--sends", type=int, default=20, help="发送次数")
+    parser.add_argument("--seed", type=int, default=0, help="随机表情/背景的种子")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="发送阶段使用的语料")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="预算文件")
+    parser.add_argument("--no-budget", action="store_true", help="不检查预算")
+    parser.add_argument("-o", "--output", default=None, help="把结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    tracemalloc.start()
+    session = Session(corpus, args.seed)
+    results = {
+        "startup": run_phase("startup", session.startup),
+        "switches": run_phase("switches", lambda: session.switches(args.switches)),
+        "sends": run_phase("sends", lambda: session.sends(args.sends)),
+    }
+    tracemalloc.stop()
+    session.core.shutdown()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "switches": args.switches,
+            "sends": args.sends,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+    if args.no_budget:
+        return 0
+    with open(args.budget, "r", encoding="utf-8") as f:
+        budget = json.load(f)
+    failures = check_budget(results, budget)
+    for failure in failures:
+        print(f"[超出预算] {failure}")
+    if failures:
+        return 1
+    print("内存预算检查通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
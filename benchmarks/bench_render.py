@@ -0,0 +1,233 @@
+"""渲染基准测试 - 用固定语料测量关键函数在冷/热缓存下的耗时分布和内存分配，结果保存为JSON便于比较
+
+用法（在项目根目录或任意目录运行，不需要图形界面）:
+    python benchmarks/bench_render.py                      # 运行并保存到 benchmarks/results/
+    python benchmarks/bench_render.py -n 20 -o out.json    # 指定每项重复次数和输出文件
+    python benchmarks/bench_render.py --compare old.json   # 与以前的结果比较，变慢超过阈值时返回1
+    python benchmarks/bench_render.py --only draw_content_auto
+
+测量项:
+    load_font_cached / load_character_safe / generate_base_image_with_text / draw_content_auto(每个语料)
+cold: 每次调用前清空 load_utils 的所有缓存；warm: 先调用一次，之后缓存命中。
+耗时和内存分开测量：tracemalloc 会拖慢执行，只在单独的一轮中开启，记录峰值和调用后仍保留的分配。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import PIL
+from PIL import Image
+
+from config import CONFIGS, DEFAULT_BRACKET_COLOR, DEFAULT_TEXT_COLOR
+from load_utils import clear_cache, load_character_safe, load_font_cached
+from draw_utils import draw_content_auto
+from render_utils import generate_base_image_with_text, get_base_image, hex_to_rgb, resolve_font_name, find_image_path
+from path_utils import get_resource_path
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BENCH_DIR, "corpus.json")
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """耗时分布（毫秒）"""
+    values = sorted(samples_ms)
+    return {
+        "n": len(values),
+        "min": round(values[0], 3),
+        "p50": round(_percentile(values, 50), 3),
+        "p90": round(_percentile(values, 90), 3),
+        "p99": round(_percentile(values, 99), 3),
+        "max": round(values[-1], 3),
+        "mean": round(statistics.fmean(values), 3),
+        "stdev": round(statistics.stdev(values), 3) if len(values) > 1 else 0.0,
+    }
+
+
+def measure(func: Callable[[], object], iterations: int, cold: bool) -> Dict[str, object]:
+    """测量 func 的耗时分布和一次调用的内存分配"""
+    if not cold:
+        func()  # 预热
+
+    samples = []
+    for _ in range(iterations):
+        if cold:
+            clear_cache("all")
+        st = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - st) * 1000)
+
+    if cold:
+        clear_cache("all")
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    result = func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    return {
+        "latency_ms": summarize(samples),
+        "alloc_peak_kb": round((peak - before) / 1024, 1),
+        "alloc_retained_kb": round((current - before) / 1024, 1),
+    }
+
+
+def _synthetic_image(name: str, size) -> Image.Image:
+    """语料中的插图：固定的渐变图，带 content_key 以便与剪贴板图片一样走缓存"""
+    img = Image.linear_gradient("L").resize(tuple(size)).convert("RGB")
+    img.info["content_key"] = f"bench-{name}"
+    return img
+
+
+def build_benchmarks(corpus: dict) -> Dict[str, Callable[[], object]]:
+    """测量项名称 -> 无参调用"""
+    character = corpus["character"]
+    background = corpus["background"]
+    emotion = corpus["emotion"]
+
+    font_name = resolve_font_name(CONFIGS.gui_settings.get("font_family"), character)
+    chara_path = find_image_path(get_resource_path(os.path.join(
+        "assets", "chara", character, f"{character} ({emotion})"
+    )))
+
+    benches: Dict[str, Callable[[], object]] = {}
+    for size in corpus.get("font_sizes", [110]):
+        benches[f"load_font_cached[{size}]"] = lambda size=size: load_font_cached(font_name, size)
+    benches["load_character_safe"] = lambda: load_character_safe(
+        chara_path, emotion_index=emotion, character_meta=CONFIGS.mahoshojo[character]
+    )
+    benches["generate_base_image_with_text"] = lambda: generate_base_image_with_text(character, background, emotion)
+
+    # draw_content_auto 的底图预先生成，只测量内容绘制、合成和编码
+    base = get_base_image(character, background, emotion)
+    box_top_left, box_bottom_right = CONFIGS.config.BOX_RECT
+    text_color = hex_to_rgb(CONFIGS.gui_settings.get("text_color", DEFAULT_TEXT_COLOR))
+    bracket_color = hex_to_rgb(CONFIGS.gui_settings.get("bracket_color", DEFAULT_BRACKET_COLOR))
+    max_font_height = CONFIGS.gui_settings.get("font_size", 120)
+
+    for case in corpus["cases"]:
+        image = _synthetic_image(case["name"], case["image_size"]) if case.get("image_size") else None
+
+        def run(case=case, image=image):
+            return draw_content_auto(
+                base, box_top_left, box_bottom_right,
+                case.get("text") or None, image,
+                color=text_color, bracket_color=bracket_color,
+                max_font_height=max_font_height, font_name=font_name,
+            )
+        benches[f"draw_content_auto[{case['name']}]"] = run
+    return benches
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(corpus: dict, iterations: int, only: Optional[str] = None) -> dict:
+    results = {}
+    for name, func in build_benchmarks(corpus).items():
+        if only and only not in name:
+            continue
+        results[name] = {
+            "cold": measure(func, iterations, cold=True),
+            "warm": measure(func, iterations, cold=False),
+        }
+        cold, warm = results[name]["cold"], results[name]["warm"]
+        print(
+            f"{name:45s} cold p50 {cold['latency_ms']['p50']:9.2f}ms  "
+            f"warm p50 {warm['latency_ms']['p50']:9.2f}ms  "
+            f"warm p90 {warm['latency_ms']['p90']:9.2f}ms  "
+            f"alloc peak {warm['alloc_peak_kb']:10.1f}KB"
+        )
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "iterations": iterations,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    """按 p50 比较两次结果，返回变慢超过阈值的测量项数"""
+    regressions = 0
+    print(f"\n与 {baseline['meta'].get('revision')} ({baseline['meta'].get('timestamp')}) 比较 (p50):")
+    for name, entry in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        for phase in ("cold", "warm"):
+            before = old[phase]["latency_ms"]["p50"]
+            after = entry[phase]["latency_ms"]["p50"]
+            ratio = after / before if before > 0 else 1.0
+            mark = ""
+            if ratio > 1 + threshold:
+                mark = "  <-- 变慢"
+                regressions += 1
+            print(f"  {name:45s} {phase:4s} {before:9.2f}ms -> {after:9.2f}ms  x{ratio:.2f}{mark}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="魔裁文本框渲染基准测试")
+    parser.add_argument("-n", "--iterations", type=int, default=10, help="每项每种缓存状态的重复次数")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="语料文件")
+    parser.add_argument("-o", "--output", default=None, help="结果文件，默认 benchmarks/results/bench-时间.json")
+    parser.add_argument("--only", default=None, help="只运行名称包含该字符串的测量项")
+    parser.add_argument("--compare", default=None, help="与以前的结果文件比较")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定变慢的比例阈值，默认0.1（10%%）")
+    args = parser.parse_args(argv)
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    report = run_benchmarks(corpus, max(2, args.iterations), args.only)
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""启动耗时测试 - 在新的解释器中测量从启动到生成首个预览的时间，并检查重依赖是否被延迟导入
+
+用法（不需要图形界面）:
+    python benchmarks/bench_startup.py                     # 默认运行5次取中位数，预算 2000ms
+    python benchmarks/bench_startup.py --budget-ms 1500 --runs 9
+    python benchmarks/bench_startup.py -o startup.json --top 30
+
+测量方式:
+    1. 多次启动子进程: import core -> ManosabaCore() -> generate_preview()，取首个预览耗时的中位数
+       （包含解释器启动；GUI 的 Tk 窗口在这之外，只在有显示器的环境中才能创建）
+    2. 再用 -X importtime 启动一次，按累计导入耗时列出最慢的模块
+    3. 首个预览生成时 openai / bs4 / pynput / keyboard / psutil 都不应该已被导入
+中位数超出预算或有禁止的模块被提前导入时返回1。
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 首个预览之前不应导入的重依赖（只在发送、热键、情感分析、读取HTML剪贴板时才需要）
+LAZY_MODULES = ["openai", "bs4", "pynput", "keyboard", "psutil"]
+
+_CHILD_SCRIPT = r"""
+import sys, time, json
+st = time.perf_counter()
+sys.path.insert(0, {root!r})
+from core import ManosabaCore
+core = ManosabaCore()
+core.generate_preview()
+elapsed_ms = (time.perf_counter() - st) * 1000
+print("@@STARTUP@@" + json.dumps({{"first_preview_ms": elapsed_ms, "modules": sorted(sys.modules)}}))
+"""
+
+
+def run_child(importtime: bool = False) -> Tuple[float, float, List[str], str]:
+    """启动一次子进程，返回 (进程启动到首个预览的总耗时ms, 进程内耗时ms, 已导入模块, stderr)"""
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", _CHILD_SCRIPT.format(root=ROOT)]
+
+    st = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, encoding="utf-8", errors="replace")
+    wall_ms = (time.perf_counter() - st) * 1000
+    for line in proc.stdout.splitlines():
+        if line.startswith("@@STARTUP@@"):
+            data = json.loads(line[len("@@STARTUP@@"):])
+            return wall_ms, data["first_preview_ms"], data["modules"], proc.stderr
+    raise RuntimeError(f"子进程没有生成预览 (退出码 {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, object]]:
+    """解析 -X importtime 输出，按累计耗时从大到小排序（微秒）"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append({
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip())) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            })
+        except ValueError:
+            continue
+    return sorted(rows, key=lambda row: row["cumulative_us"], reverse=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="魔裁文本框启动耗时测试")
+    parser.add_argument("--runs", type=int, default=5, help="计时运行次数（取中位数）")
+    parser.add_argument("--budget-ms", type=float, default=2000, help="进程启动到首个预览的中位数预算")
+    parser.add_argument("--top", type=int, default=20, help="列出累计导入耗时最多的模块数")
+    parser.add_argument("-o", "--output", default=None, help="把结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    wall_samples, preview_samples = [], []
+    modules: List[str] = []
+    for _ in range(max(1, args.runs)):
+        wall_ms, preview_ms, modules, _ = run_child()
+        wall_samples.append(wall_ms)
+        preview_samples.append(preview_ms)
+
+    _, _, _, stderr = run_child(importtime=True)
+    imports = parse_importtime(stderr)
+    top_level = [row for row in imports if row["depth"] == 0]
+    total_import_ms = sum(row["cumulative_us"] for row in top_level) / 1000
+
+    wall_p50 = statistics.median(wall_samples)
+    print(f"进程启动到首个预览: 中位数 {wall_p50:.0f}ms (最小 {min(wall_samples):.0f}ms, 最大 {max(wall_samples):.0f}ms)")
+    print(f"进程内到首个预览:   中位数 {statistics.median(preview_samples):.0f}ms")
+    print(f"顶层导入总耗时:     {total_import_ms:.0f}ms\n")
+    print(f"累计导入耗时最多的 {args.top} 个模块:")
+    for row in imports[:args.top]:
+        print(f"  {row['cumulative_us'] / 1000:8.1f}ms  (自身 {row['self_us'] / 1000:6.1f}ms)  {row['module']}")
+
+    eager = [name for name in LAZY_MODULES if name in modules]
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0]},
+                "wall_ms": wall_samples,
+                "first_preview_ms": preview_samples,
+                "total_import_ms": total_import_ms,
+                "imports": imports[:args.top],
+                "eager_lazy_modules": eager,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+    failed = False
+    if eager:
+        print(f"\n[失败] 首个预览之前已导入应延迟加载的模块: {', '.join(eager)}")
+        failed = True
+    if wall_p50 > args.budget_ms:
+        print(f"\n[失败] 启动耗时 {wall_p50:.0f}ms 超出预算 {args.budget_ms:.0f}ms")
+        failed = True
+    if not failed:
+        print(f"\n启动耗时在预算内 ({wall_p50:.0f}ms <= {args.budget_ms:.0f}ms)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
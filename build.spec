@@ -4,6 +4,7 @@
 
 import os
 import glob
+import shutil
 from PyInstaller.utils.hooks import collect_data_files, collect_submodules
 
 block_cipher = None
@@ -30,13 +31,25 @@ core_files = [
     'gui.py', 
     'config.py',
     'clipboard_utils.py',
+    'clipboard_backends.py',
+    'generation_worker.py',
     'sentiment_analyzer.py',
     'gui_components.py',
     'gui_hotkeys.py',
     'gui_settings.py',
     'path_utils.py',
     'load_utils.py',
-    'draw_utils.py'
+    'draw_utils.py',
+    'render_utils.py',
+    'emoji_atlas.py',
+    'emoji_utils.py',
+    'layout_utils.py',
+    'encode_utils.py',
+    'trace_utils.py',
+    'profile_utils.py',
+    'engine.py',
+    'font_utils.py',
+    'process_utils.py'
 ]
 
 for file in core_files:
@@ -44,6 +57,16 @@ for file in core_files:
         datas.append((file, '.'))
 
 
+# 打包emoji图集（assets/emoji.atlas），发布时用它代替assets/emoji下的散装PNG
+emoji_atlas_built = False
+try:
+    from emoji_atlas import build_emoji_atlas
+    build_emoji_atlas()
+    emoji_atlas_built = True
+except Exception as e:
+    print(f"emoji图集打包失败，将回退到散装PNG: {e}")
+
+
 # 收集证书文件
 try:
     certifi_data = collect_data_files('certifi')
@@ -171,4 +194,16 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
     icon='icon.ico' if os.path.exists('icon.ico') else None,
-)
\ No newline at end of file
+)
+
+# 资源文件放在程序旁边（get_resource_path 优先查找程序目录）：复制 assets 到输出目录，
+# 图集打包成功时不再复制 assets/emoji 下的散装PNG
+dist_assets = os.path.join(DISTPATH, 'assets')
+if os.path.isdir('assets'):
+    if os.path.exists(dist_assets):
+        shutil.rmtree(dist_assets)
+    shutil.copytree(
+        'assets',
+        dist_assets,
+        ignore=shutil.ignore_patterns('emoji', '*.tmp') if emoji_atlas_built else shutil.ignore_patterns('emoji.atlas', '*.tmp'),
+    )
@@ -0,0 +1,470 @@
+"""剪贴板后端模块 - 把各平台的剪贴板读写收敛到统一接口，另提供内存后端用于无桌面环境的测试和基准
+
+后端选择: 环境变量 MANOSABA_CLIPBOARD=windows / macos / memory，未设置时按平台自动选择。
+"""
+
+import io
+import os
+import time
+import tempfile
+import threading
+import subprocess
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from sys import platform
+from typing import Dict, Optional, Set, Tuple, Union
+
+from PIL import Image
+
+PLATFORM = platform.lower()
+
+if PLATFORM.startswith("win"):
+    try:
+        import win32clipboard
+    except ImportError:
+        print("[red]请先安装 Windows 运行库: pip install pywin32[/red]")
+        raise
+
+ImageData = Union[bytes, memoryview]
+
+# 输出格式 -> (临时文件后缀, AppleScript 剪贴板类型)
+_MACOS_IMAGE_CLASSES = {
+    "png": (".png", "PNGf"),
+    "jpeg": (".jpg", "JPEG"),
+}
+# 输出格式 -> macOS 粘贴板 UTI
+_MACOS_PASTEBOARD_TYPES = {
+    "png": "public.png",
+    "jpeg": "public.jpeg",
+}
+# 输出格式 -> Windows 注册剪贴板格式名（dib 使用标准的 CF_DIB）
+_WINDOWS_REGISTERED_FORMATS = {
+    "png": "PNG",
+    "jpeg": "JFIF",
+    "webp": "image/webp",
+}
+
+_BI_BITFIELDS = 3
+_MAX_POLL_INTERVAL = 0.008  # 序号检查很便宜，退避上限保持较小以免增加捕获延迟
+
+
+def dib_to_bmp(dib: ImageData) -> bytes:
+    """为 CF_DIB 数据补上 BITMAPFILEHEADER，得到 Pillow 可以直接打开的BMP文件字节"""
+    header_size = int.from_bytes(dib[0:4], "little")
+    offset = 14 + header_size
+    if header_size >= 40:
+        bits = int.from_bytes(dib[14:16], "little")
+        compression = int.from_bytes(dib[16:20], "little")
+        colors = int.from_bytes(dib[32:36], "little")
+        # BITMAPINFOHEADER 后面紧跟的颜色掩码和调色板
+        if header_size == 40 and compression == _BI_BITFIELDS:
+            offset += 12
+        if bits <= 8:
+            offset += (colors or (1 << bits)) * 4
+    return (
+        b"BM"
+        + (len(dib) + 14).to_bytes(4, "little")
+        + b"\x00\x00\x00\x00"
+        + offset.to_bytes(4, "little")
+        + bytes(dib)
+    )
+
+
+class ClipboardBackend(ABC):
+    """剪贴板后端接口（未实现全部抽象方法的后端在创建时就会报错）
+
+    read_image 返回 Pillow 可以直接打开的图片文件字节（Windows 的 DIB 会补上文件头），
+    get_sequence_number 返回剪贴板内容每次变化都会改变的序号，不支持时返回 None。
+    """
+
+    name = "base"
+
+    @contextmanager
+    def session(self):
+        """在一次打开的剪贴板上连续执行多个读操作（默认不做任何事）"""
+        yield
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def read_text(self) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def read_html(self) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def read_image(self) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def write_image(self, data: ImageData, fmt: str = "dib") -> bool:
+        ...
+
+    @abstractmethod
+    def has_image(self, fmt: str = "dib") -> bool:
+        ...
+
+    @abstractmethod
+    def available_formats(self) -> Set[str]:
+        """当前剪贴板上可读的内容类型（text / html / image），只检查格式不读取数据"""
+
+    def get_sequence_number(self) -> Optional[int]:
+        return None
+
+    def wait_for_read(self, timeout: float) -> Optional[bool]:
+        """粘贴后等待其他程序读取完剪贴板：观测到返回True，超时返回False，无法观测时返回None"""
+        return None
+
+    def wait_for_change(self, last_seq: Optional[int], timeout: float) -> bool:
+        """等待序号变化，变化返回True，超时返回False；不支持序号时立即返回True由调用方自行检查内容"""
+        if last_seq is None or self.get_sequence_number() is None:
+            return True
+        deadline = time.perf_counter() + timeout
+        wait = 0.001
+        while True:
+            if self.get_sequence_number() != last_seq:
+                return True
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            time.sleep(min(wait, remaining))
+            wait = min(wait * 2, _MAX_POLL_INTERVAL)
+
+
+class WindowsClipboardBackend(ClipboardBackend):
+    """基于 win32clipboard 的 Windows 剪贴板"""
+
+    name = "windows"
+
+    def __init__(self):
+        self._depth = 0
+        self._html_format = win32clipboard.RegisterClipboardFormat("HTML Format")
+
+    @contextmanager
+    def session(self):
+        self._open()
+        try:
+            yield
+        finally:
+            self._close()
+
+    def _open(self):
+        if self._depth == 0:
+            win32clipboard.OpenClipboard()
+        self._depth += 1
+
+    def _close(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                win32clipboard.CloseClipboard()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _image_format(fmt: str) -> int:
+        """输出格式 -> Windows 剪贴板格式ID"""
+        name = _WINDOWS_REGISTERED_FORMATS.get(fmt)
+        if name is None:
+            return win32clipboard.CF_DIB
+        return win32clipboard.RegisterClipboardFormat(name)
+
+    def clear(self):
+        with self.session():
+            win32clipboard.EmptyClipboard()
+
+    def read_text(self) -> Optional[str]:
+        with self.session():
+            if not win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_UNICODETEXT):
+                return None
+            return win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
+
+    def read_html(self) -> Optional[str]:
+        with self.session():
+            if not win32clipboard.IsClipboardFormatAvailable(self._html_format):
+                return None
+            html = win32clipboard.GetClipboardData(self._html_format)
+        if isinstance(html, bytes):
+            html = html.decode("utf-8", errors="ignore")
+        return html
+
+    def read_image(self) -> Optional[bytes]:
+        with self.session():
+            if not win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIB):
+                return None
+            return dib_to_bmp(win32clipboard.GetClipboardData(win32clipboard.CF_DIB))
+
+    def write_image(self, data: ImageData, fmt: str = "dib") -> bool:
+        clip_format = self._image_format(fmt)
+        with self.session():
+            win32clipboard.EmptyClipboard()
+            win32clipboard.SetClipboardData(clip_format, data)
+        return True
+
+    def has_image(self, fmt: str = "dib") -> bool:
+        clip_format = self._image_format(fmt)
+        with self.session():
+            return bool(win32clipboard.IsClipboardFormatAvailable(clip_format))
+
+    def available_formats(self) -> Set[str]:
+        # IsClipboardFormatAvailable 不需要打开剪贴板
+        formats = set()
+        if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_UNICODETEXT):
+            formats.add("text")
+        if win32clipboard.IsClipboardFormatAvailable(self._html_format):
+            formats.add("html")
+        if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIB):
+            formats.add("image")
+        return formats
+
+    def get_sequence_number(self) -> Optional[int]:
+        return win32clipboard.GetClipboardSequenceNumber()
+
+    def wait_for_read(self, timeout: float) -> Optional[bool]:
+        # 目标程序粘贴时会打开剪贴板：等到剪贴板被其他窗口打开、再被关闭
+        deadline = time.perf_counter() + timeout
+        wait = 0.001
+        opened = False
+        while True:
+            if win32clipboard.GetOpenClipboardWindow():
+                opened = True
+            elif opened:
+                return True
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            time.sleep(min(wait, remaining))
+            wait = min(wait * 2, 0.004)
+
+
+class MacClipboardBackend(ClipboardBackend):
+    """macOS 剪贴板：读取和序号使用 AppKit（pyobjc），写入图片使用 osascript"""
+
+    name = "macos"
+
+    def __init__(self):
+        try:
+            from AppKit import NSPasteboard
+            self._pasteboard = NSPasteboard.generalPasteboard()
+        except ImportError:
+            print("未安装 pyobjc，macOS 剪贴板只能读取纯文本: pip install pyobjc-framework-Cocoa")
+            self._pasteboard = None
+
+    def clear(self):
+        if self._pasteboard is not None:
+            self._pasteboard.clearContents()
+        else:
+            subprocess.run(["osascript", "-e", 'set the clipboard to ""'], capture_output=True, check=False)
+
+    def read_text(self) -> Optional[str]:
+        if self._pasteboard is not None:
+            return self._pasteboard.stringForType_("public.utf8-plain-text")
+        result = subprocess.run(["pbpaste"], capture_output=True, check=False)
+        return result.stdout.decode("utf-8", errors="ignore") or None
+
+    def read_html(self) -> Optional[str]:
+        if self._pasteboard is None:
+            return None
+        return self._pasteboard.stringForType_("public.html")
+
+    def read_image(self) -> Optional[bytes]:
+        if self._pasteboard is None:
+            return None
+        for uti in ("public.png", "public.tiff", "public.jpeg"):
+            data = self._pasteboard.dataForType_(uti)
+            if data is not None:
+                return bytes(data)
+        return None
+
+    def write_image(self, data: ImageData, fmt: str = "dib") -> bool:
+        if fmt not in _MACOS_IMAGE_CLASSES:
+            # 粘贴板没有对应类型（如裸DIB），转成PNG再写入
+            if fmt == "dib":
+                data = dib_to_bmp(data)
+            buf = io.BytesIO()
+            Image.open(io.BytesIO(data)).save(buf, format="PNG", compress_level=1)
+            data, fmt = buf.getbuffer(), "png"
+
+        suffix, image_class = _MACOS_IMAGE_CLASSES[fmt]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            tmp.write(data)
+            tmp_path = tmp.name
+
+        cmd = f"""osascript -e 'set the clipboard to (read (POSIX file "{tmp_path}") as «class {image_class}»)'"""
+        result = subprocess.run(cmd, shell=True, capture_output=True, check=False)
+
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+        return result.returncode == 0
+
+    def has_image(self, fmt: str = "dib") -> bool:
+        if self._pasteboard is None:
+            return False
+        # dib/webp 写入时已转为PNG
+        uti = _MACOS_PASTEBOARD_TYPES.get(fmt, "public.png")
+        return self._pasteboard.availableTypeFromArray_([uti]) is not None
+
+    def available_formats(self) -> Set[str]:
+        if self._pasteboard is None:
+            return {"text"} if self.read_text() else set()
+        types = set(self._pasteboard.types() or ())
+        formats = set()
+        if "public.utf8-plain-text" in types:
+            formats.add("text")
+        if "public.html" in types:
+            formats.add("html")
+        if types & {"public.png", "public.tiff", "public.jpeg"}:
+            formats.add("image")
+        return formats
+
+    def get_sequence_number(self) -> Optional[int]:
+        if self._pasteboard is None:
+            return None
+        return self._pasteboard.changeCount()
+
+
+class MemoryClipboardBackend(ClipboardBackend):
+    """内存剪贴板，用于无桌面环境下测试和计时完整的发送流程
+
+    op_delay: 每次读写操作的耗时（模拟打开剪贴板的开销）
+    write_settle_delay: 写入图片后多久才能被确认（模拟剪贴板监听程序和延迟渲染）
+    paste_read_delay: 粘贴后目标程序读取剪贴板的耗时，None 表示无法观测
+    外部程序的"剪切"用 set_content(..., delay=...) 模拟，内容会在 delay 秒后异步出现。
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        op_delay: float = 0.0,
+        write_settle_delay: float = 0.0,
+        paste_read_delay: Optional[float] = None,
+    ):
+        self.op_delay = op_delay
+        self.write_settle_delay = write_settle_delay
+        self.paste_read_delay = paste_read_delay
+        self._cond = threading.Condition()
+        self._formats: Dict[str, object] = {}
+        self._sequence = 0
+        self._image_visible_at = 0.0
+
+    def _simulate_latency(self):
+        if self.op_delay > 0:
+            time.sleep(self.op_delay)
+
+    def _replace(self, formats: Dict[str, object]):
+        with self._cond:
+            self._formats = formats
+            self._sequence += 1
+            self._cond.notify_all()
+
+    def set_content(
+        self,
+        text: Optional[str] = None,
+        html: Optional[str] = None,
+        image: Optional[bytes] = None,
+        delay: float = 0.0,
+    ):
+        """模拟外部程序写入剪贴板，image 为图片文件字节"""
+        formats = {k: v for k, v in (("text", text), ("html", html), ("image", image)) if v is not None}
+        if delay > 0:
+            timer = threading.Timer(delay, self._replace, (formats,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._replace(formats)
+
+    def get_written_image(self) -> Tuple[Optional[bytes], Optional[str]]:
+        """最近一次 write_image 写入的 (数据, 格式)"""
+        with self._cond:
+            return self._formats.get("output"), self._formats.get("output_format")
+
+    def clear(self):
+        self._simulate_latency()
+        self._replace({})
+
+    def read_text(self) -> Optional[str]:
+        self._simulate_latency()
+        with self._cond:
+            return self._formats.get("text")
+
+    def read_html(self) -> Optional[str]:
+        self._simulate_latency()
+        with self._cond:
+            return self._formats.get("html")
+
+    def read_image(self) -> Optional[bytes]:
+        self._simulate_latency()
+        with self._cond:
+            image = self._formats.get("image")
+            if image is None and self._formats.get("output_format") == "dib":
+                image = dib_to_bmp(self._formats["output"])
+        return image
+
+    def write_image(self, data: ImageData, fmt: str = "dib") -> bool:
+        self._simulate_latency()
+        with self._cond:
+            self._image_visible_at = time.perf_counter() + self.write_settle_delay
+        self._replace({"output": bytes(data), "output_format": fmt})
+        return True
+
+    def has_image(self, fmt: str = "dib") -> bool:
+        self._simulate_latency()
+        with self._cond:
+            return (
+                self._formats.get("output_format") == fmt
+                and time.perf_counter() >= self._image_visible_at
+            )
+
+    def available_formats(self) -> Set[str]:
+        with self._cond:
+            formats = {k for k in ("text", "html", "image") if k in self._formats}
+            if self._formats.get("output_format") == "dib":
+                formats.add("image")
+        return formats
+
+    def get_sequence_number(self) -> Optional[int]:
+        with self._cond:
+            return self._sequence
+
+    def wait_for_read(self, timeout: float) -> Optional[bool]:
+        if self.paste_read_delay is None:
+            return None
+        time.sleep(min(self.paste_read_delay, timeout))
+        return self.paste_read_delay <= timeout
+
+    def wait_for_change(self, last_seq: Optional[int], timeout: float) -> bool:
+        if last_seq is None:
+            return True
+        with self._cond:
+            return self._cond.wait_for(lambda: self._sequence != last_seq, timeout)
+
+
+_BACKENDS = {
+    "windows": WindowsClipboardBackend,
+    "macos": MacClipboardBackend,
+    "memory": MemoryClipboardBackend,
+}
+
+
+def create_clipboard_backend(name: Optional[str] = None) -> ClipboardBackend:
+    """创建剪贴板后端：name > 环境变量 MANOSABA_CLIPBOARD > 按平台自动选择"""
+    name = (name or os.environ.get("MANOSABA_CLIPBOARD") or "").lower()
+    if not name:
+        if PLATFORM.startswith("win"):
+            name = "windows"
+        elif PLATFORM == "darwin":
+            name = "macos"
+        else:
+            print("Linux 剪贴板支持尚未实现，使用内存剪贴板")
+            name = "memory"
+    if name not in _BACKENDS:
+        raise ValueError(f"不支持的剪贴板后端: {name}")
+    return _BACKENDS[name]()
@@ -2,185 +2,177 @@
 
 import io
 import os
-import tempfile
-import subprocess
 import re
-from sys import platform
+import time
 import base64
+import hashlib
+from typing import Optional, Union
 
 from urllib.parse import urlparse, unquote
 from urllib.request import url2pathname
 
 from PIL import Image
 
-from bs4 import BeautifulSoup
+from clipboard_backends import PLATFORM, ClipboardBackend, create_clipboard_backend
 
+MAX_SETTLE_ROUNDS = 5  # 内容稳定等待最多经历的变化次数
 
-PLATFORM = platform.lower()
 
-if PLATFORM.startswith("win"):
-    try:
-        import win32clipboard
-    except ImportError:
-        print("[red]请先安装 Windows 运行库: pip install pywin32[/red]")
-        raise
+def open_image_bytes(raw: bytes) -> Image.Image:
+    """从内存字节延迟打开图片（只读文件头，不解码），并记录内容哈希用于缓存
+
+    原始字节保存在 info["content_bytes"]，缩放时可以重新打开后再 draft（见 load_content_image_resized）。
+    """
+    image = Image.open(io.BytesIO(raw))
+    image.info["content_key"] = hashlib.blake2b(raw, digest_size=16).hexdigest()
+    image.info["content_bytes"] = raw
+    return image
 
 
 class ClipboardManager:
-    """剪贴板管理器"""
+    """剪贴板管理器（平台相关的读写由 clipboard_backends 中的后端完成）"""
 
-    def __init__(self):
+    def __init__(self, backend: Optional[ClipboardBackend] = None):
         self.platform = PLATFORM
+        self.backend = backend or create_clipboard_backend()
 
-    def copy_image_to_clipboard(self, bmp_bytes: bytes) -> bool:
-        """将BMP字节数据复制到剪贴板"""
-        try:
-            if self.platform == "darwin":
-                return self._copy_image_macos(bmp_bytes)
-            if self.platform.startswith("win"):
-                return self._copy_image_windows(bmp_bytes)
-            return self._copy_image_linux(bmp_bytes)
-        except Exception as e:
-            print(f"复制图片到剪贴板失败: {e}")
-            return False
-
-    def _copy_image_macos(self, png_bytes: bytes) -> bool:
-        """macOS 复制图片到剪贴板"""
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-            tmp.write(png_bytes)
-            tmp_path = tmp.name
+    def copy_image_to_clipboard(self, data: Union[bytes, memoryview], fmt: str = "dib") -> bool:
+        """将编码后的图片复制到剪贴板（接受 bytes 或 memoryview，不做额外复制）
 
-        cmd = f"""osascript -e 'set the clipboard to (read (POSIX file "{tmp_path}") as «class PNGf»)'"""
-        result = subprocess.run(cmd, shell=True, capture_output=True, check=False)
-
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
-
-        return result.returncode == 0
-
-    def _copy_image_windows(self, bmp_bytes: bytes) -> bool:
-        """Windows 复制图片到剪贴板"""
+        fmt 为 encode_utils 的输出格式: dib / png / jpeg / webp
+        """
         try:
-            win32clipboard.OpenClipboard()
-            win32clipboard.EmptyClipboard()
-            win32clipboard.SetClipboardData(win32clipboard.CF_DIB, bmp_bytes)
-            win32clipboard.CloseClipboard()
-            return True
+            return self.backend.write_image(data, fmt)
         except Exception as e:
-            print(f"Windows 复制图片失败: {e}")
+            print(f"复制图片到剪贴板失败: {e}")
             return False
-        finally:
-            try:
-                win32clipboard.CloseClipboard()
-            except Exception:
-                pass
 
-    def _copy_image_linux(self, png_bytes: bytes) -> bool:
-        """Linux 复制图片到剪贴板"""
-        print("Linux 剪贴板支持尚未实现")
-        return False
-
-    def has_image_in_clipboard(self) -> bool:
-        """检查剪贴板中是否有图片"""
+    def has_image_in_clipboard(self, fmt: str = "dib") -> bool:
+        """检查剪贴板中是否有指定输出格式的图片"""
         try:
-            if platform.startswith("win"):
-                win32clipboard.OpenClipboard()
-                try:
-                    # 尝试获取剪贴板中的图片数据
-                    if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIB):
-                        return True
-                    return False
-                finally:
-                    win32clipboard.CloseClipboard()
-            if platform == "darwin":
-                # macOS 的实现
-                from AppKit import NSPasteboard, NSPasteboardTypePNG
-
-                pasteboard = NSPasteboard.generalPasteboard()
-                return (
-                    pasteboard.availableTypeFromArray_([NSPasteboardTypePNG])
-                    is not None
-                )
-            # Linux 的实现
-            return False  # 需要根据具体实现补充
+            return self.backend.has_image(fmt)
         except Exception:
             return False
-    
+
     def clear_clipboard(self):
         """清空剪贴板"""
         try:
-            win32clipboard.OpenClipboard()
-            win32clipboard.EmptyClipboard()
-            win32clipboard.CloseClipboard()
+            self.backend.clear()
         except Exception as e:
             print(f"清空剪贴板失败: {e}")
-        finally:
+
+    def get_sequence_number(self) -> Optional[int]:
+        """剪贴板序号，不支持时返回None"""
+        try:
+            return self.backend.get_sequence_number()
+        except Exception:
+            return None
+
+    def wait_for_image(self, fmt: str = "dib", expected: float = 0.0, timeout: float = 0.5) -> bool:
+        """等待写入的图片可以被确认；expected 为该进程以往的确认耗时，在此之前不做检查"""
+        deadline = time.perf_counter() + timeout
+        if expected > 0:
+            time.sleep(min(expected * 0.5, timeout))
+        wait = 0.001
+        while True:
+            if self.has_image_in_clipboard(fmt):
+                return True
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            time.sleep(min(wait, remaining))
+            wait = min(wait * 2, 0.01)
+
+    def wait_for_paste_read(self, timeout: float) -> Optional[bool]:
+        """粘贴后等待目标程序读取剪贴板，无法观测时返回None"""
+        try:
+            return self.backend.wait_for_read(timeout)
+        except Exception:
+            return None
+
+    def wait_for_content(self, last_seq: Optional[int], timeout: float = 2.5, settle: float = 0.01):
+        """等待剪贴板在 last_seq 之后出现新内容，内容稳定后只解析一次，返回 (text, image)
+
+        支持序号的后端等待序号变化（内存后端是真正的通知），不支持时按指数退避检查格式。
+        每次变化先只做格式检查，有内容后再等待 settle 秒无新变化（程序常分多次写入
+        文本/HTML/位图），然后才读取并解析；最多等待 MAX_SETTLE_ROUNDS 次变化。超时返回 ("", None)。
+        """
+        deadline = time.perf_counter() + timeout
+        if last_seq is None:
+            last_seq = self.get_sequence_number()
+        wait = 0.002
+
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return "", None
+
+            if last_seq is not None:
+                if not self.backend.wait_for_change(last_seq, remaining):
+                    return "", None
+                last_seq = self.get_sequence_number()
+
             try:
-                win32clipboard.CloseClipboard()
+                formats = self.backend.available_formats()
             except Exception:
-                pass
+                formats = set()
+
+            if formats:
+                # 内容稳定后再解析
+                if last_seq is not None:
+                    # 持续变化的剪贴板最多等 MAX_SETTLE_ROUNDS 轮，不让发送一直等到超时
+                    for _ in range(MAX_SETTLE_ROUNDS):
+                        if not self.backend.wait_for_change(last_seq, settle):
+                            break
+                        last_seq = self.get_sequence_number()
+                        if time.perf_counter() >= deadline:
+                            break
+                else:
+                    time.sleep(settle)
+
+                text, image = self.get_clipboard_all()
+                if (text and text.strip()) or image is not None:
+                    return text, image
+
+            if last_seq is None:
+                time.sleep(min(wait, max(deadline - time.perf_counter(), 0)))
+                wait = min(wait * 2, 0.05)
 
     def get_clipboard_all(self):
         text = ""
         image = None
-        
-        
+
         try:
-            win32clipboard.OpenClipboard()
-            # 1️⃣ 优先直接取位图（真正的图片）
-            if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIB):
-                data = win32clipboard.GetClipboardData(win32clipboard.CF_DIB)
-                header = (
-                    b"BM"
-                    + (len(data) + 14).to_bytes(4, "little")
-                    + b"\x00\x00\x00\x00\x36\x00\x00\x00"
-                )
-                image = Image.open(io.BytesIO(header + data))
-                image.load()
-
-            # 2️⃣ 取纯文本
-            if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_UNICODETEXT):
-                text = win32clipboard.GetClipboardData(win32clipboard.CF_UNICODETEXT)
-
-            # 3️⃣ 如果没有真正的位图，但有 HTML → 从 HTML 解析图片
-            if image is None:
-                html = self._get_clipboard_html()
-                if html:
-                    html_text, html_image = self.parse_html_clipboard(html)
-
-                    if not text:
-                        text = html_text
-
-                    if html_image is not None:
-                        image = html_image
+            with self.backend.session():
+                # 1️⃣ 优先直接取位图（真正的图片）
+                raw = self.backend.read_image()
+                if raw is not None:
+                    # 延迟解码：缩放阶段命中缓存时不需要解码整张位图
+                    image = open_image_bytes(raw)
+
+                # 2️⃣ 取纯文本
+                text = self.backend.read_text() or ""
+
+                # 3️⃣ 如果没有真正的位图，但有 HTML → 从 HTML 解析图片
+                if image is None:
+                    html = self.backend.read_html()
+                    if html:
+                        html_text, html_image = self.parse_html_clipboard(html)
+
+                        if not text:
+                            text = html_text
+
+                        if html_image is not None:
+                            image = html_image
         except Exception as e:
             return "", None
-        finally:
-            try:
-                win32clipboard.CloseClipboard()
-            except Exception:
-                pass
 
         return text, image
 
-    def _get_clipboard_html(self):
-        html_format = win32clipboard.RegisterClipboardFormat("HTML Format")
-
-        if not win32clipboard.IsClipboardFormatAvailable(html_format):
-            return None
-
-        html_bytes = win32clipboard.GetClipboardData(html_format)
-
-        if isinstance(html_bytes, bytes):
-            html = html_bytes.decode("utf-8", errors="ignore")
-        else:
-            html = html_bytes
-
-        return html
-
     def _extract_img_src_from_html(self, html: str) -> str | None:
+        # BeautifulSoup 只有读到HTML剪贴板时才需要，首次使用时再导入
+        from bs4 import BeautifulSoup
+
         soup = BeautifulSoup(html, 'html.parser')
         img_tag = soup.find('img')
         return img_tag.get('src') if img_tag else None
@@ -258,8 +250,9 @@ class ClipboardManager:
                     # 尝试打开文件（注意微信临时文件可能会被占用/有权限问题）
                     # 先检查文件是否存在
                     if os.path.exists(path):
-                        with Image.open(path) as im:
-                            image = im.copy()  # 复制到内存，避免后续文件被删除导致问题
+                        # 读入内存，避免后续文件被删除导致问题；解码推迟到缩放阶段（JPEG可用draft缩小解码）
+                        with open(path, "rb") as f:
+                            image = open_image_bytes(f.read())
                     else:
                         print(f"HTML图片文件不存在: {path}")
                 except Exception as e:
@@ -276,14 +269,14 @@ class ClipboardManager:
                         if ';base64,' in src:
                             header, b64 = src.split(';base64,', 1)
                             raw = base64.b64decode(b64)
-                            image = Image.open(io.BytesIO(raw)).copy()
+                            image = open_image_bytes(raw)
                         else:
                             # 如果没有明确的 base64 标记，尝试直接解码
                             comma_idx = src.find(',')
                             if comma_idx != -1:
                                 b64 = src[comma_idx+1:]
                                 raw = base64.b64decode(b64)
-                                image = Image.open(io.BytesIO(raw)).copy()
+                                image = open_image_bytes(raw)
                     except Exception as e:
                         print(f"HTML图片加载失败（data URI）: {e}")
                 elif src.startswith('http://') or src.startswith('https://'):
@@ -294,8 +287,8 @@ class ClipboardManager:
                     # 尝试直接作为路径处理
                     try:
                         if os.path.exists(src):
-                            with Image.open(src) as im:
-                                image = im.copy()
+                            with open(src, "rb") as f:
+                                image = open_image_bytes(f.read())
                         else:
                             print(f"HTML 图片 src 无法识别或不可访问: {src}")
                     except Exception as e:
@@ -1,11 +1,32 @@
 """配置管理模块"""
 import os
+import threading
 from typing import Dict, Any, Optional
 import yaml
 from sys import platform
 from path_utils import get_base_path, get_resource_path, ensure_path_exists
 
 
+# 对话框文字颜色默认值（settings.yml 中没有 text_color / bracket_color 时使用）
+DEFAULT_TEXT_COLOR = "#FFFFFF"
+DEFAULT_BRACKET_COLOR = "#EF4F54"
+
+# 粘贴/发送时间配置的默认值（毫秒）
+DEFAULT_TIMING_PROFILE = {
+    "confirm_ms": 20.0,        # 写入剪贴板后到能确认图片存在的时间
+    "paste_settle_ms": 100.0,  # 按下粘贴后到目标程序读取完剪贴板的时间
+    "send_margin_ms": 20.0,    # 观测到读取完成后到按下回车的余量
+}
+# 学习到的时间配置的取值范围（毫秒），避免偶尔的快速样本把等待时间压到无法粘贴完成
+TIMING_LIMITS_MS = {
+    "confirm_ms": (5.0, 500.0),
+    "paste_settle_ms": (30.0, 1000.0),
+    "send_margin_ms": (5.0, 200.0),
+}
+TIMING_EMA_ALPHA = 0.3
+TIMING_SAVE_DELAY = 30.0  # 学习到的时间配置延迟保存（秒），多次发送合并为一次写入
+
+
 class ConfigLoader:
     """配置加载器"""
     
@@ -39,6 +60,11 @@ class ConfigLoader:
         self.current_character = {}
         self.keymap = {}
         self.process_whitelist = []
+        self.process_encoders = {}
+        self.timing_profiles = {}
+        self._timing_profiles_dirty = False
+        self._timing_lock = threading.Lock()
+        self._timing_save_timer: Optional[threading.Timer] = None
         self._load_configs()
 
         self.background_count = self._get_background_count()  # 背景图片数量
@@ -67,6 +93,8 @@ class ConfigLoader:
         self.text_configs_dict = self.load_config("text_configs")
         self.keymap = self.load_config("keymap")
         self.process_whitelist = self.load_config("process_whitelist")
+        self.process_encoders = self._load_process_encoders()
+        self.timing_profiles = self._load_timing_profiles()
 
         self.gui_settings = self.load_config("settings")
 
@@ -83,6 +111,7 @@ class ConfigLoader:
         self.keymap = self.load_config("keymap")
         # 重新加载进程白名单
         self.process_whitelist = self.load_config("process_whitelist")
+        self.process_encoders = self._load_process_encoders()
         # 重新加载GUI设置
         self.gui_settings = self.load_config("settings")
 
@@ -154,6 +183,7 @@ class ConfigLoader:
                 "next_background": "ctrl+shift+k",
                 "prev_background": "ctrl+shift+i",
                 "toggle_listener": "ctrl+alt+p",
+                "profile_next": "ctrl+alt+f",
                 "character_1": "ctrl+1",
                 "character_2": "ctrl+2",
                 "character_3": "ctrl+3",
@@ -170,6 +200,7 @@ class ConfigLoader:
                 "next_background": "cmd+shift+k",
                 "prev_background": "cmd+shift+i",
                 "toggle_listener": "cmd+alt+p",
+                "profile_next": "cmd+alt+f",
                 "character_1": "cmd+1",
                 "character_2": "cmd+2",
                 "character_3": "cmd+3",
@@ -192,6 +223,15 @@ class ConfigLoader:
             "image_compression": {
                 "pixel_reduction_enabled": True,
                 "pixel_reduction_ratio": 50
+            },
+            "generation": {
+                "policy": "drop",
+                "max_queue": 4
+            },
+            "profiling": {
+                "capture_count": 3,
+                "memory": False,
+                "max_dumps": 20
             }
         }
 
@@ -246,6 +286,80 @@ class ConfigLoader:
         
         return available_models
         
+    def _load_process_encoders(self) -> Dict[str, Dict[str, Any]]:
+        """加载 process_whitelist.yml 中 encoders 下当前平台的输出编码配置（进程名统一小写）"""
+        data = self._load_yaml_file("process_whitelist.yml") or {}
+        encoders = (data.get("encoders") or {}).get(self.platform) or {}
+        return {str(name).lower(): dict(settings or {}) for name, settings in encoders.items()}
+
+    def get_encoder_settings(self, process_name: str | None = None) -> Dict[str, Any]:
+        """获取指定前台进程的输出编码设置: 平台默认值 < default 条目 < 进程条目"""
+        # macOS 剪贴板不接受裸 DIB，默认输出 PNG
+        settings = {"format": "png", "compress_level": 1} if self.platform == "darwin" else {"format": "dib"}
+        settings.update(self.process_encoders.get("default", {}))
+        if process_name:
+            settings.update(self.process_encoders.get(process_name.lower(), {}))
+        return settings
+
+    def _load_timing_profiles(self) -> Dict[str, Dict[str, float]]:
+        """加载 timing_profiles.yml 中当前平台的按进程时间配置（进程名统一小写）"""
+        data = self._load_yaml_file("timing_profiles.yml") or {}
+        profiles = data.get(self.platform) or {}
+        return {str(name).lower(): dict(values or {}) for name, values in profiles.items()}
+
+    def get_timing_profile(self, process_name: str | None = None) -> Dict[str, float]:
+        """获取指定前台进程的粘贴/发送时间配置（毫秒）: 内置默认值 < default 条目 < 进程条目"""
+        profile = dict(DEFAULT_TIMING_PROFILE)
+        profile.update(self.timing_profiles.get("default", {}))
+        if process_name:
+            profile.update(self.timing_profiles.get(process_name.lower(), {}))
+        # 已保存的值可能来自没有范围限制的旧版本
+        for key, (low, high) in TIMING_LIMITS_MS.items():
+            if key in profile:
+                profile[key] = min(max(float(profile[key]), low), high)
+        return profile
+
+    def record_timing(self, process_name: str | None, key: str, value_ms: float):
+        """记录一次观测到的耗时，用指数滑动平均更新该进程的时间配置（只更新内存，保存见 save_timing_profiles）
+
+        结果限制在 TIMING_LIMITS_MS 范围内。
+        """
+        if not process_name:
+            return
+        name = process_name.lower()
+        low, high = TIMING_LIMITS_MS.get(key, (0.0, float("inf")))
+        with self._timing_lock:
+            current = self.get_timing_profile(name)[key]
+            learned = self.timing_profiles.setdefault(name, {})
+            value = current + TIMING_EMA_ALPHA * (value_ms - current)
+            learned[key] = round(min(max(value, low), high), 1)
+            learned["samples"] = int(learned.get("samples", 0)) + 1
+            self._timing_profiles_dirty = True
+
+    def schedule_timing_save(self, delay: float = TIMING_SAVE_DELAY):
+        """在 delay 秒后保存时间配置（已有待保存的计时器时不重复安排），退出时用 save_timing_profiles 立即保存"""
+        with self._timing_lock:
+            if not self._timing_profiles_dirty or self._timing_save_timer is not None:
+                return
+            timer = threading.Timer(delay, self.save_timing_profiles)
+            timer.daemon = True
+            self._timing_save_timer = timer
+        timer.start()
+
+    def save_timing_profiles(self) -> bool:
+        """保存学习到的时间配置（保留其他平台的数据）"""
+        with self._timing_lock:
+            if self._timing_save_timer is not None:
+                self._timing_save_timer.cancel()
+                self._timing_save_timer = None
+            if not self._timing_profiles_dirty:
+                return True
+            profiles = {name: dict(values) for name, values in self.timing_profiles.items()}
+            self._timing_profiles_dirty = False
+        existing_data = self._load_yaml_file("timing_profiles.yml") or {}
+        existing_data[self.platform] = profiles
+        return self._save_yaml_file("timing_profiles.yml", existing_data)
+
     def save_keymap(self,new_hotkeys=None):
         """保存快捷键设置到keymap.yml"""
         if new_hotkeys is None:
@@ -299,4 +413,44 @@ class AppConfig:
         self.ASSETS_PATH = get_resource_path("assets")
 
 
-CONFIGS = ConfigLoader()
\ No newline at end of file
+_configs: Optional[ConfigLoader] = None
+_configs_lock = threading.RLock()
+
+
+def get_configs() -> ConfigLoader:
+    """返回全局配置，第一次调用时才读取配置文件"""
+    global _configs
+    if _configs is None:
+        with _configs_lock:
+            if _configs is None:
+                _configs = ConfigLoader()
+    return _configs
+
+
+def set_configs(configs: Optional[ConfigLoader]):
+    """替换全局配置（为None时下次访问重新读取）"""
+    global _configs
+    with _configs_lock:
+        _configs = configs
+
+
+def is_configs_loaded() -> bool:
+    return _configs is not None
+
+
+class _ConfigsProxy:
+    """CONFIGS 的延迟代理：导入本模块不会解析YAML，第一次读写属性时才创建 ConfigLoader"""
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return getattr(get_configs(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_configs(), name, value)
+
+    def __repr__(self):
+        return f"<CONFIGS {'已加载' if is_configs_loaded() else '未加载'}>"
+
+
+CONFIGS = _ConfigsProxy()
@@ -1,62 +1,73 @@
 """魔裁文本框核心逻辑"""
-from config import CONFIGS
+from config import CONFIGS, DEFAULT_BRACKET_COLOR, DEFAULT_TEXT_COLOR
 from clipboard_utils import ClipboardManager
-from sentiment_analyzer import SentimentAnalyzer
 
-from load_utils import clear_cache, load_background_safe, load_character_safe, get_preload_manager, load_image_cached
-from path_utils import get_resource_path, get_available_fonts
-from draw_utils import draw_content_auto, load_font_cached
+from engine import Engine
+from sentiment_analyzer import SentimentAnalyzer
+from draw_utils import render_content_layer_cached, compose_content_image, composite_layer
+from render_utils import generate_base_image_with_text, get_base_image, hex_to_rgb, resolve_font_name
+from trace_utils import trace_span
+from profile_utils import configure_profiling, profile_capture
+from process_utils import get_foreground_resolver
 
 import os
 import time
 import random
-import psutil
 import threading
-from pynput.keyboard import Key, Controller
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from sys import platform
-import keyboard as kb_module
-from PIL import Image, ImageDraw, ImageOps
+from PIL import Image, ImageOps
 from typing import Dict, Any
 
-if platform.startswith("win"):
-    try:
-        import win32gui
-        import win32process
-    except ImportError:
-        print("[red]请先安装 Windows 运行库: pip install pywin32[/red]")
-        raise
+SENTIMENT_WAIT_TIMEOUT = 10.0  # 发送时等待情感分析结果的最长时间（秒），可在 sentiment_matching.timeout 中设置
+PASTE_WAIT_MAX = 1.0  # 粘贴后等待目标程序读取剪贴板的最长时间（秒）
+
 
 class ManosabaCore:
     """魔裁文本框核心类"""
 
-    def __init__(self):
-        # 初始化配置
-        self.kbd_controller = Controller()
-        self.clipboard_manager = ClipboardManager()
+    def __init__(self, clipboard_backend=None, engine: Engine | None = None):
+        # 配置、缓存、预加载和情感分析器由 Engine 持有（见 engine.py）
+        self.engine = (engine or Engine()).start()
+
+        # 模拟按键的控制器，首次发送时才创建（pynput 导入较慢）
+        self._kbd_controller = None
+        # clipboard_backend 为空时按环境变量/平台自动选择（见 clipboard_backends）
+        self.clipboard_manager = ClipboardManager(clipboard_backend)
         
         #预览图当前的索引
         self._preview_emotion = -1
         self._preview_background = -1
-        self._current_base_image = None  # 当前预览的基础图片（用于快速生成）
+        self._current_base_image = None  # 当前预览的基础图片（用于快速生成，只读，不在上面直接绘制）
+        self._last_content = None  # 最近一次发送的 (文本, 图片)，用于设置窗口的实时预览
+        self._last_foreground = None  # 本次发送时的前台进程，用于性能分析记录
+        self._send_content = None  # 本次发送的 (文本, 图片)，用于性能分析记录；提前返回时为None
         
         # 状态更新回调
         self.status_callback = None
         self.gui_callback = None
 
-        # 初始化情感分析器 - 不在这里初始化，等待特定时机
-        self.sentiment_analyzer = SentimentAnalyzer()
+        # 情感分析器对象由 Engine 创建 - 连接AI不在这里进行，等待特定时机
+        self.sentiment_analyzer = self.engine.sentiment_analyzer
         self.sentiment_analyzer_status = {
             'initialized': False,
             'initializing': False,
             'current_config': {}
         }
+        # 发送时的情感分析线程（与绘制并行）
+        self._sentiment_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment")
         
-        # 初始化预加载管理器
-        self.preload_manager = get_preload_manager()
+        # 前台进程名按 pid 缓存，白名单预先转成小写集合（见 process_utils）
+        self._foreground_resolver = get_foreground_resolver()
+
+        # 按需性能分析（见 profile_utils）
+        configure_profiling(CONFIGS.gui_settings.get("profiling", {}))
+
+        # 预加载管理器：首个预览生成后才开始预加载（避免与首个预览争抢CPU）；禁用预加载时不做任何事
+        self.preload_manager = self.engine.preload_manager
         self.preload_manager.set_update_callback(self.update_status)
-        
-        # 程序启动时开始预加载图片
-        self.update_status("正在预加载图片到缓存...")
+
+        self._preload_started = False
 
         # 初始化预加载状态
         self._preload_status = {
@@ -65,12 +76,6 @@ class ManosabaCore:
             'is_complete': False
         }
 
-        # 修改：只预加载当前角色的图片，而不是所有角色
-        current_character = CONFIGS.get_character()
-        self.preload_manager.preload_character_images_async(current_character)
-        # 同时预加载背景图片
-        self.preload_manager.preload_backgrounds_async()
-
         # 程序启动时检查是否需要初始化
         sentiment_settings = CONFIGS.gui_settings.get("sentiment_matching", {})
         if sentiment_settings.get("enabled", False):
@@ -81,6 +86,14 @@ class ManosabaCore:
             self._notify_gui_status_change(False, False)
 
     
+    @property
+    def kbd_controller(self):
+        """模拟按键的控制器（首次使用时导入 pynput）"""
+        if self._kbd_controller is None:
+            from pynput.keyboard import Controller
+            self._kbd_controller = Controller()
+        return self._kbd_controller
+
     def get_preload_progress(self):
         """获取预加载进度"""
         return self.preload_manager.get_preload_progress()
@@ -89,134 +102,16 @@ class ManosabaCore:
         """获取预加载状态"""
         return self.preload_manager.get_preload_status()
 
+    def shutdown(self):
+        """退出时调用：停止情感分析线程和引擎（预加载线程、保存时间配置）"""
+        self._sentiment_executor.shutdown(wait=False, cancel_futures=True)
+        self.engine.stop()
+
     def _generate_base_image_with_text(
         self, character_name: str, background_index: int, emotion_index: int
     ) -> Image.Image:
         """生成带角色文字的基础图片"""
-        # 1. 创建一个2560x854的空白图片（透明背景）
-        canvas = Image.new("RGBA", (2560, 854), (0, 0, 0, 0))
-        
-        # 2. 加载背景图（支持多格式）
-        supported_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp']
-        background_path = None
-        
-        for ext in supported_formats:
-            test_path = get_resource_path(os.path.join("assets", "background", f"c{background_index}{ext}"))
-            if os.path.exists(test_path):
-                background_path = test_path
-                break
-        
-        if background_path is None:
-            # 如果所有格式都不存在，使用默认png格式
-            background_path = get_resource_path(os.path.join("assets", "background", f"c{background_index}.png"))
-        
-        # 使用背景缓存函数（已包含缩放功能）
-        background = load_background_safe(background_path, default_size=(2560, 854), default_color=(100, 100, 200))
-        
-        # 计算背景图粘贴位置（底部对齐、水平居中）
-        bg_x = (canvas.width - background.width) // 2  # 水平居中
-        bg_y = canvas.height - background.height  # 底部对齐
-        
-        # 将背景图粘贴到画布上
-        canvas.paste(background, (bg_x, bg_y), background)
-        
-        # 3. 加载textbox1.png（黑色渐变效果）
-        textbox_path = get_resource_path(os.path.join("assets", "shader", "textbox.png"))
-        if os.path.exists(textbox_path):
-            textbox = load_image_cached(textbox_path)
-            # 确保textbox宽度为2560（如果原始尺寸不同，则进行等比缩放）
-            if textbox.width != 2560:
-                # 计算缩放比例和新高度
-                width_ratio = 2560 / textbox.width
-                new_height = int(textbox.height * width_ratio)
-                textbox = textbox.resize((2560, new_height), Image.Resampling.LANCZOS)
-            
-            # 左下角对齐位置
-            textbox_y = canvas.height - textbox.height
-            
-            # 确保textbox是RGBA模式
-            if textbox.mode != 'RGBA':
-                textbox = textbox.convert('RGBA')
-            # 创建一个新的合成图层
-            textbox_layer = Image.new("RGBA", canvas.size, (0, 0, 0, 0))
-            textbox_layer.paste(textbox, (0, textbox_y), textbox)
-
-            # 使用alpha_composite进行正确的alpha混合
-            canvas = Image.alpha_composite(canvas, textbox_layer)
-        
-        # 4. 加载角色图片（支持多种格式）
-        base_path = get_resource_path(os.path.join(
-            "assets",
-            "chara",
-            character_name,
-            f"{character_name} ({emotion_index})"
-        ))
-        
-        overlay_path = None
-        for ext in ['.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp']:
-            test_path = base_path + ext
-            if os.path.exists(test_path):
-                overlay_path = test_path
-                break
-        
-        if overlay_path is None:
-            # 如果所有格式都不存在，使用默认png格式
-            overlay_path = base_path + '.png'
-        
-        overlay = load_character_safe(overlay_path, default_size=(800, 600), default_color=(0, 0, 0, 0), emotion_index=emotion_index)
-        
-        # 计算角色图片粘贴位置（左下角对齐，相对于整个画布）
-        chara_x = 0  # 左下角对齐，x坐标为0
-        chara_y = canvas.height - overlay.height  # 左下角对齐，y坐标为画布高度-角色图片高度
-        
-        # 将角色图片粘贴到画布上
-        canvas.paste(overlay, (chara_x, chara_y), overlay)
-        
-        # 5. 加载namebase.png
-        namebase_path = get_resource_path(os.path.join("assets", "shader", "namebase.png"))
-        if os.path.exists(namebase_path):
-            namebase = load_image_cached(namebase_path)
-            new_height = int(namebase.height * 1.3)
-            new_width = int(namebase.width * 1.3)
-            namebase = namebase.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # 左下角对齐粘贴
-            namebase_y = canvas.height - namebase.height-400
-            canvas.paste(namebase, (500, namebase_y), namebase)
-        
-        # 6. 添加角色名称文字
-        if CONFIGS.text_configs_dict and character_name in CONFIGS.text_configs_dict:
-            draw = ImageDraw.Draw(canvas)
-            shadow_offset = (2, 2)
-            shadow_color = (0, 0, 0)
-
-            for config in CONFIGS.text_configs_dict[character_name]:
-                text = config["text"]
-                position = tuple(config["position"])
-                font_color = tuple(config["font_color"])
-                font_size = config["font_size"]
-
-                # 获取字体
-                font_name = CONFIGS.current_character.get("font", "font3.ttf")
-                font = load_font_cached(font_name, font_size)
-                
-                # 计算新的位置
-                text_x = int(position[0])
-                # 假设文字在画布底部上方100px的位置
-                text_y = canvas.height - 850 + int(position[1])
-                
-                # 绘制阴影文字
-                shadow_position = (
-                    text_x + shadow_offset[0],
-                    text_y + shadow_offset[1],
-                    text_x + shadow_offset[0],
-                    text_y + shadow_offset[1],
-                )
-                draw.text(shadow_position, text, fill=shadow_color, font=font)
-
-                # 绘制主文字
-                draw.text((text_x, text_y), text, fill=font_color, font=font)
-        return canvas
+        return generate_base_image_with_text(character_name, background_index, emotion_index)
 
     def set_gui_callback(self, callback):
         """设置GUI回调函数，用于通知状态变化"""
@@ -413,22 +308,19 @@ class ManosabaCore:
             self.update_status(f"情感分析失败: {e}")
             return None
 
-    def _update_emotion_by_sentiment(self, text: str) -> bool:
-        """根据文本情感更新表情，返回是否成功更新"""
-        # 检查情感分析器是否已初始化
-        if not self.sentiment_analyzer_status['initialized']:
-            self.update_status("情感分析器未初始化，跳过情感分析")
-            return False
-            
-        emotion_index = self._get_emotion_by_sentiment(text)
-        if emotion_index:
-            CONFIGS.selected_emotion = emotion_index
-            return True
-        return False
+    def _analyze_sentiment_task(self, text: str) -> int | None:
+        """后台线程中执行的情感分析（与文字图层绘制并行），只返回表情索引，不修改全局状态
+
+        由等待它的那次发送负责应用结果：已取消/失败/超时的发送不会在之后改掉下一次发送的表情。
+        """
+        with trace_span("sentiment", chars=len(text)) as span:
+            emotion_index = self._get_emotion_by_sentiment(text)
+            span.set(emotion=emotion_index)
+        return emotion_index
 
     def switch_character(self, index: int) -> bool:
         """切换到指定索引的角色"""
-        clear_cache("character")
+        self.engine.clear_caches("character")
         if 0 < index <= len(CONFIGS.character_list):
             CONFIGS.current_character_index = index
             CONFIGS.mahoshojo = CONFIGS.load_config("chara_meta")
@@ -462,46 +354,19 @@ class ManosabaCore:
 
         return final_index
 
+    def _get_foreground_process_name(self) -> str | None:
+        """获取前台进程名（小写），获取失败返回None，不支持的平台返回空字符串"""
+        return self._foreground_resolver.get_foreground_process_name()
+
+    def _process_allowed(self, name: str | None) -> bool:
+        """校验进程名是否在白名单"""
+        return self._foreground_resolver.process_allowed(name, CONFIGS.process_whitelist)
+
     def _active_process_allowed(self) -> bool:
         """校验当前前台进程是否在白名单"""
         if not CONFIGS.process_whitelist:
             return True
-        
-        wl = {name.lower() for name in CONFIGS.process_whitelist}
-
-        if platform.startswith("win"):
-            try:
-                hwnd = win32gui.GetForegroundWindow()
-                if not hwnd:
-                    return False
-                _, pid = win32process.GetWindowThreadProcessId(hwnd)
-                name = psutil.Process(pid).name().lower()
-                return name in wl
-            except (psutil.Error, OSError):
-                return False
-
-        elif platform == "darwin":
-            try:
-                import subprocess
-
-                result = subprocess.run(
-                    [
-                        "osascript",
-                        "-e",
-                        'tell application "System Events" to get name of first process whose frontmost is true',
-                    ],
-                    capture_output=True,
-                    text=True,
-                    check=True,
-                )
-                name = result.stdout.strip().lower()
-                return name in wl
-            except subprocess.SubprocessError:
-                return False
-
-        else:
-            # Linux 支持
-            return True
+        return self._process_allowed(self._get_foreground_process_name())
     
     def set_status_callback(self, callback):
         """设置状态更新回调函数"""
@@ -514,10 +379,38 @@ class ManosabaCore:
 
     def _hex_to_rgb(self, hex_color: str) -> tuple:
         """将十六进制颜色转换为RGB元组"""
-        hex_color = hex_color.lstrip('#')
-        if len(hex_color) == 3:
-            hex_color = ''.join([c*2 for c in hex_color])
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+        return hex_to_rgb(hex_color)
+
+    def _resolve_font_name(self) -> str:
+        """对话框文字使用的字体文件（GUI中设置的字体，而不是角色专用字体）"""
+        return resolve_font_name(CONFIGS.gui_settings.get("font_family"), CONFIGS.get_character())
+
+    def _render_content_layer(self, text: str, image, font_name: str):
+        """按当前设置绘制文字/图片图层（带缓存）"""
+        return render_content_layer_cached(
+            self._current_base_image.size,
+            CONFIGS.config.BOX_RECT[0],
+            CONFIGS.config.BOX_RECT[1],
+            text,
+            image,
+            text_align="left",
+            text_valign="top",
+            image_align="center",
+            image_valign="middle",
+            color=self._hex_to_rgb(CONFIGS.gui_settings.get("text_color", DEFAULT_TEXT_COLOR)),
+            bracket_color=self._hex_to_rgb(CONFIGS.gui_settings.get("bracket_color", DEFAULT_BRACKET_COLOR)),
+            max_font_height=CONFIGS.gui_settings.get("font_size", 120),
+            font_name=font_name,
+            image_padding=12,
+        )
+
+    def generate_text_preview(self, sample_text: str = "这是「文字颜色」预览") -> Image.Image:
+        """在当前底图上叠加文字图层的预览（设置窗口修改颜色时使用，只重新绘制文字图层）"""
+        if self._current_base_image is None:
+            self.generate_preview()
+        text, image = self._last_content or (sample_text, None)
+        layer = self._render_content_layer(text, image, self._resolve_font_name())
+        return composite_layer(self._current_base_image, layer)
 
     def generate_preview(self) -> tuple:
         """生成预览图片和相关信息"""
@@ -540,14 +433,17 @@ class ManosabaCore:
         self._preview_emotion = emotion_index
         self._preview_background = background_index
 
-        # 生成预览图片
+        # 生成预览图片（合成好的底图由 render_utils 按 角色/背景/表情 缓存，切换回来时直接复用）
         try:
-            self._current_base_image = self._generate_base_image_with_text(
-                character_name, background_index, emotion_index
-            )
+            self._current_base_image = get_base_image(character_name, background_index, emotion_index)
         except:
             self._current_base_image = Image.new("RGB", (400, 300), color="gray")
 
+        # 首个预览生成后才开始后台预加载（当前角色表情和所有背景）
+        if not self._preload_started:
+            self._preload_started = True
+            self.engine.start_preload(character_name)
+
         # 用于 GUI 预览
         preview_image = self._current_base_image.copy()
 
@@ -556,141 +452,196 @@ class ManosabaCore:
 
         return preview_image, info
 
-    def generate_image(self) -> str:
-        """生成并发送图片"""
-        if not self._active_process_allowed():
-            return "前台应用不在白名单内"
-
-        base_msg=""
+    def generate_image(self, cancel_event: threading.Event | None = None) -> str:
+        """生成并发送图片
+
+        cancel_event 被设置时在剪切前和写入剪贴板前放弃本次生成；写入剪贴板之后不再取消。
+        """
+        with profile_capture("send") as capture:
+            with trace_span("send") as span:
+                result = self._generate_image(cancel_event)
+                span.set(result=result)
+            text, image = self._send_content or ("", None)
+            capture.set(
+                result=result,
+                process=self._last_foreground,
+                character=CONFIGS.get_character(),
+                emotion=self._preview_emotion,
+                background=self._preview_background,
+                text_chars=len(text),
+                image_size=image.size if image is not None else None,
+                font_family=CONFIGS.gui_settings.get("font_family"),
+                font_size=CONFIGS.gui_settings.get("font_size"),
+                image_compression=CONFIGS.gui_settings.get("image_compression"),
+                encoder_settings=CONFIGS.get_encoder_settings(self._last_foreground),
+            )
+        return result
 
+    def _generate_image(self, cancel_event: threading.Event | None = None) -> str:
         # 开始计时
         start_time = time.time()
-        print(f"[{int((time.time()-start_time)*1000)}] 开始生成图片")
+        # 性能分析记录的是本次发送；提前返回时不能沿用上一次发送的内容和进程
+        # （_last_content 保留给设置窗口的实时预览，不在这里清空）
+        self._last_foreground = None
+        self._send_content = None
+
+        with trace_span("foreground") as span:
+            foreground = self._get_foreground_process_name()
+            span.set(process=foreground)
+        self._last_foreground = foreground
+        if not self._process_allowed(foreground):
+            return "前台应用不在白名单内"
+        if cancel_event is not None and cancel_event.is_set():
+            return "生成已取消"
 
-        # 清空剪贴板
-        self.clipboard_manager.clear_clipboard()
+        base_msg=""
 
-        time.sleep(0.005)
+        # 按键相关的依赖首次发送时才导入（已导入时只是一次字典查找）
+        from pynput.keyboard import Key
+
+        with trace_span("capture") as span:
+            # 清空剪贴板，记录序号用于等待剪切产生的变化
+            self.clipboard_manager.clear_clipboard()
+            clipboard_seq = self.clipboard_manager.get_sequence_number()
 
-        if platform.startswith("win"):
-            kb_module.send("ctrl+a")
-            kb_module.send("ctrl+x")
-        else:
-            self.kbd_controller.press(Key.cmd)
-            self.kbd_controller.press("a")
-            self.kbd_controller.release("a")
-            self.kbd_controller.press("x")
-            self.kbd_controller.release("x")
-            self.kbd_controller.release(Key.cmd)
-
-        print(f"[{int((time.time()-start_time)*1000)}] 开始读取剪切板")
-        deadline = time.time() + 2.5
-        while time.time() < deadline:
-            text, image = self.clipboard_manager.get_clipboard_all()
-            if (text and text.strip()) or image is not None:
-                print(f"[{int((time.time()-start_time)*1000)}] 剪切板内容获取完成")
-                break
             time.sleep(0.005)
-            
-        print("读取到图片" if image is not None else "", "读取到文本" if text.strip() else "")
+
+            if platform.startswith("win"):
+                import keyboard as kb_module
+
+                kb_module.send("ctrl+a")
+                kb_module.send("ctrl+x")
+            else:
+                self.kbd_controller.press(Key.cmd)
+                self.kbd_controller.press("a")
+                self.kbd_controller.release("a")
+                self.kbd_controller.press("x")
+                self.kbd_controller.release("x")
+                self.kbd_controller.release(Key.cmd)
+
+            text, image = self.clipboard_manager.wait_for_content(clipboard_seq, timeout=2.5)
+            span.set(text_chars=len(text), image=image is not None)
+        self._send_content = (text, image)
+
+        if text == "" and image is None:
+            return "错误: 没有文本或图像"
+
         # 情感匹配处理：仅当启用且只有文本内容时
+        # 情感分析在后台线程进行，与文字排版/绘制重叠；表情只影响底图，最后再合成
         sentiment_settings = CONFIGS.gui_settings.get("sentiment_matching", {})
+        sentiment_future = None
 
         if (sentiment_settings.get("enabled", False) and 
             self.sentiment_analyzer_status['initialized'] and
             text.strip()):
             
             self.update_status("正在分析文本情感...")
-            emotion_updated = self._update_emotion_by_sentiment(text)
-            
-            if emotion_updated:
+            sentiment_future = self._sentiment_executor.submit(self._analyze_sentiment_task, text)
+
+        try:
+            with trace_span("font_lookup"):
+                font_name = self._resolve_font_name()
+
+            # 绘制文字和图片图层（不依赖表情，相同内容重复发送时直接复用缓存的图层）
+            with trace_span("render"):
+                layer = self._render_content_layer(text, image, font_name)
+            self._last_content = (text, image)
+        except Exception as e:
+            if sentiment_future is not None:
+                sentiment_future.cancel()
+            return f"生成图像失败: {e}"
+
+        if cancel_event is not None and cancel_event.is_set():
+            if sentiment_future is not None:
+                sentiment_future.cancel()
+            return "生成已取消"
+
+        if sentiment_future is not None:
+            with trace_span("sentiment_wait") as span:
+                try:
+                    emotion_index = sentiment_future.result(
+                        timeout=sentiment_settings.get("timeout", SENTIMENT_WAIT_TIMEOUT)
+                    )
+                except FuturesTimeoutError:
+                    # 运行中的请求无法中断，结果会被丢弃
+                    sentiment_future.cancel()
+                    emotion_index = None
+                span.set(emotion=emotion_index)
+
+            if emotion_index:
+                CONFIGS.selected_emotion = emotion_index
                 self.update_status("情感分析完成，更新表情")
-                print(f"[{int((time.time()-start_time)*1000)}] 情感分析完成")
                 # 刷新预览以显示新的表情
                 base_msg += f"情感: {self.sentiment_analyzer.selected_emotion}  "
-                self.generate_preview()
+                with trace_span("base"):
+                    self.generate_preview()
                 
             else:
                 self.update_status("情感分析失败，使用默认表情")
                 CONFIGS.selected_emotion = None
-                print(f"[{int((time.time()-start_time)*1000)}] 情感分析失败")
-
-        if text == "" and image is None:
-            return "错误: 没有文本或图像"
 
         try:
-            # 使用GUI中设置的对话框字体，而不是角色专用字体
-            font_family = CONFIGS.gui_settings.get("font_family")
-
-            # 查找匹配的字体文件
-            font_name = next(
-                (font_file for font_file in get_available_fonts()
-                if font_file and font_family == os.path.splitext(os.path.basename(font_file))[0]),
-                None
-            )
-
-            if not font_name:
-                print(f"字体家族 {font_family} 不在可用字体列表中")
-                font_name = CONFIGS.mahoshojo[CONFIGS.get_character()].get("font", "font3.ttf")
-
-            # 生成图片
-            print(f"[{int((time.time()-start_time)*1000)}] 开始合成图片")
-            bmp_bytes = draw_content_auto(
-                image_source=self._current_base_image,
-                top_left=CONFIGS.config.BOX_RECT[0],
-                bottom_right=CONFIGS.config.BOX_RECT[1],
-                text=text,
-                content_image=image,
-                text_align="left",
-                text_valign="top",
-                image_align="center",
-                image_valign="middle",
-                color=self._hex_to_rgb(CONFIGS.gui_settings.get("text_color", "#FFFFFF")),
-                bracket_color=self._hex_to_rgb(CONFIGS.gui_settings.get("bracket_color", "##EF4F54")),
-                max_font_height=CONFIGS.gui_settings.get("font_size", 120),
-                font_name=font_name,
-                image_padding=12,
-                compression_settings=CONFIGS.gui_settings.get("image_compression", None),
-            )
-
-            print(f"[{int((time.time()-start_time)*1000)}] 图片合成完成")
-
+            # 合成到底图并编码
+            with trace_span("output"):
+                encoded = compose_content_image(
+                    self._current_base_image,
+                    layer,
+                    compression_settings=CONFIGS.gui_settings.get("image_compression", None),
+                    encoder_settings=CONFIGS.get_encoder_settings(foreground),
+                )
         except Exception as e:
             return f"生成图像失败: {e}"
 
-        # 复制到剪贴板
-        if not self.clipboard_manager.copy_image_to_clipboard(bmp_bytes):
-            return "复制到剪贴板失败"
-        
-        print(f"[{int((time.time()-start_time)*1000)}] 图片复制到剪切板完成")
-
-        # 等待剪贴板确认（最多等待2.5秒）
-        wait = 0.01
-        total = 0
-        while total < 0.5:
-            if self.clipboard_manager.has_image_in_clipboard():
-                break
-            time.sleep(wait)
-            total += wait
-            wait = min(wait * 1.5, 0.08)
-        print(f"[{int((time.time()-start_time)*1000)}] 剪切板确认完成")
+        if cancel_event is not None and cancel_event.is_set():
+            return "生成已取消"
+
+        with trace_span("clipboard") as span:
+            # 复制到剪贴板
+            if not self.clipboard_manager.copy_image_to_clipboard(encoded.data, encoded.format):
+                return "复制到剪贴板失败"
+
+            # 等待剪贴板确认：按该进程以往的确认耗时安排第一次检查（最多等待0.5秒）
+            timing = CONFIGS.get_timing_profile(foreground)
+            confirm_start = time.perf_counter()
+            confirmed = self.clipboard_manager.wait_for_image(encoded.format, timing["confirm_ms"] / 1000, timeout=0.5)
+            if confirmed:
+                CONFIGS.record_timing(foreground, "confirm_ms", (time.perf_counter() - confirm_start) * 1000)
+            span.set(confirmed=confirmed)
 
         # 自动粘贴和发送
         if CONFIGS.config.AUTO_PASTE_IMAGE:
-            self.kbd_controller.press(Key.ctrl if platform != "darwin" else Key.cmd)
-            self.kbd_controller.press("v")
-            self.kbd_controller.release("v")
-            self.kbd_controller.release(Key.ctrl if platform != "darwin" else Key.cmd)
-
-            if not self._active_process_allowed():
-                return "前台应用不在白名单内"
-            if CONFIGS.config.AUTO_SEND_IMAGE:
-                time.sleep(0.1)
-                self.kbd_controller.press(Key.enter)
-                self.kbd_controller.release(Key.enter)
-
-                print(f"[{int((time.time()-start_time)*1000)}] 自动发送完成")
-        
+            with trace_span("paste") as span:
+                paste_start = time.perf_counter()
+                self.kbd_controller.press(Key.ctrl if platform != "darwin" else Key.cmd)
+                self.kbd_controller.press("v")
+                self.kbd_controller.release("v")
+                self.kbd_controller.release(Key.ctrl if platform != "darwin" else Key.cmd)
+
+                if not self._active_process_allowed():
+                    return "前台应用不在白名单内"
+                if CONFIGS.config.AUTO_SEND_IMAGE:
+                    # 等目标程序读取完剪贴板再回车：在学习到的粘贴耗时之上留出余量等待读取，
+                    # 超时时把整个等待时间作为一次（偏大的）样本，让学习值能够变大；
+                    # 无法观测读取时按学习到的粘贴耗时等待
+                    settle = timing["paste_settle_ms"] / 1000
+                    read = self.clipboard_manager.wait_for_paste_read(
+                        timeout=min(max(settle * 2, 0.05), PASTE_WAIT_MAX)
+                    )
+                    if read is None:
+                        remaining = settle - (time.perf_counter() - paste_start)
+                        if remaining > 0:
+                            time.sleep(remaining)
+                    else:
+                        CONFIGS.record_timing(foreground, "paste_settle_ms", (time.perf_counter() - paste_start) * 1000)
+                        if read:
+                            time.sleep(timing["send_margin_ms"] / 1000)
+                    self.kbd_controller.press(Key.enter)
+                    self.kbd_controller.release(Key.enter)
+                    span.set(paste_read=read)
+
+        # 学习到的时间配置延迟合并保存，不在发送流程中写文件
+        CONFIGS.schedule_timing_save()
+
         # 构建状态消息
         base_msg += f"角色: {CONFIGS.get_character()}, 表情: {self._preview_emotion}, 背景: {self._preview_background}, 用时: {int((time.time() - start_time) * 1000)}ms"
         
@@ -1,44 +1,163 @@
 # filename: draw_utils.py
-from io import BytesIO
-from typing import Tuple, Union, Literal, Optional
-from PIL import Image, ImageDraw, ImageFont
-import os
-import time
-import emoji
+from typing import Dict, NamedTuple, Tuple, Union, Literal, Optional
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageFont
 
-from load_utils import load_font_cached
-from path_utils import get_resource_path
+from load_utils import (
+    load_font_cached, load_glyph_cached, load_emoji_cached, load_content_image_resized, load_content_layer_cached,
+)
+from layout_utils import ROLE_TEXT, ROLE_BRACKET, TextLayout, build_runs, count_units, fit_runs
+from encode_utils import EncodeResult, encode_image
+from trace_utils import trace_span
 
 # 类型别名定义
 Align = Literal["left", "center", "right"]
 VAlign = Literal["top", "middle", "bottom"]
 
-# 保留括号定义
-bracket_pairs = {
-    "[": "]",
-    "【": "】",
-    "〔": "〕",
-    "‘": "’",
-    "「": "」",
-    "｢": "｣",
-    "『": "』",
-    "〖": "〗",
-    "<": ">",
-    "《": "》",
-    "〈": "〉",
-    "「": "」",
-    "｢": "｣",
-    "『": "』",
-    "〖": "〗",
-    "<": ">",
-    "《": "》",
-    "〈": "〉",
-    "“": "”",
-    '"': '"',
-}
 
-def draw_content_auto(
-    image_source: Union[str, Image.Image],
+class ContentLayer(NamedTuple):
+    """裁剪到内容边界的文字/图片图层，与底图分开保存，换底图时可以直接复用"""
+    image: Optional[Image.Image]  # RGBA 图层，没有任何内容时为None
+    offset: Tuple[int, int]       # 图层左上角在底图上的位置
+    canvas_size: Tuple[int, int]  # 绘制时的底图尺寸
+
+
+def _needs_shaping(text: str) -> bool:
+    # 中日韩文字（U+2E80 之后）、数字和标点逐字绘制即可；其他文字的字母需要字距调整/整形
+    return any(ch.isalpha() and ord(ch) < 0x2E80 for ch in text)
+
+def blit_text_mask(
+    mask: Image.Image,
+    x: int,
+    y: int,
+    text: str,
+    font: ImageFont.FreeTypeFont,
+) -> int:
+    # 把文本的字形覆盖率写入 L 模式蒙版（坐标相对蒙版原点），返回步进宽度
+    # 逐字粘贴缓存的字形没有字距调整和字形整形，含拉丁/西里尔/阿拉伯等字母的文本段整段交给 Pillow 绘制
+    if _needs_shaping(text):
+        ImageDraw.Draw(mask).text((x, y), text, font=font, fill=255)
+        return int(font.getlength(text))
+    pen_x = float(x)
+    for ch in text:
+        glyph, (ox, oy), advance = load_glyph_cached(font, ch)
+        if glyph is not None:
+            mask.paste(255, (int(round(pen_x)) + ox, y + oy), glyph)
+        pen_x += advance
+    return int(pen_x - x)
+
+def alpha_composite_at(img: Image.Image, src: Image.Image, pos: Tuple[int, int]) -> None:
+    # 按 alpha 把 src 合成到 RGBA 图像的 pos 处（可超出边界），透明图层上也能得到正确颜色
+    x, y = pos
+    left, top = max(0, -x), max(0, -y)
+    right = min(src.width, img.width - x)
+    bottom = min(src.height, img.height - y)
+    if right <= left or bottom <= top:
+        return
+    if src.mode != "RGBA":
+        src = src.convert("RGBA")
+    if (left, top, right, bottom) != (0, 0, src.width, src.height):
+        src = src.crop((left, top, right, bottom))
+    img.alpha_composite(src, (x + left, y + top))
+
+def _solid_with_mask(fill: Tuple[int, int, int], mask: Image.Image) -> Image.Image:
+    layer = Image.new("RGBA", mask.size, fill + (255,))
+    layer.putalpha(mask)
+    return layer
+
+def composite_text_masks(
+    img: Image.Image,
+    origin: Tuple[int, int],
+    color_masks: dict,
+    shadow_offset: int = 4,
+    shadow_color: Tuple[int, int, int] = (0, 0, 0),
+    shadow_blur: float = 0,
+) -> None:
+    # 用各颜色的蒙版合成文本：先用全部覆盖率的并集合成阴影，再逐颜色填充
+    masks = [m for m in color_masks.values() if m.getbbox()]
+    if not masks:
+        return
+    ox, oy = origin
+
+    if shadow_offset or shadow_blur:
+        shadow_mask = masks[0]
+        for m in masks[1:]:
+            shadow_mask = ImageChops.lighter(shadow_mask, m)
+        if shadow_blur:
+            shadow_mask = shadow_mask.filter(ImageFilter.GaussianBlur(shadow_blur))
+        alpha_composite_at(img, _solid_with_mask(shadow_color, shadow_mask), (ox + shadow_offset, oy + shadow_offset))
+
+    for fill, m in color_masks.items():
+        alpha_composite_at(img, _solid_with_mask(fill, m), (ox, oy))
+
+def draw_text_layout(
+    img: Image.Image,
+    layout: TextLayout,
+    text_rect: Tuple[int, int, int, int],
+    role_colors: Dict[int, Tuple[int, int, int]],
+    text_align: Align = "left",
+    text_valign: VAlign = "top",
+    shadow_offset: int = 4,
+) -> None:
+    # 按排版结果绘制文本：字形先写入按颜色区分的蒙版，最后一次性合成阴影和填充，emoji 最后粘贴
+    EMOJI_FALLBACK_CHAR = "□"  # emoji 加载失败时使用的替代字符
+
+    tx1, ty1, tx2, ty2 = text_rect
+    region_w, region_h = tx2 - tx1, ty2 - ty1
+    font = layout.font
+    emoji_size = layout.size
+
+    if text_valign == "top":
+        y_start = ty1
+    elif text_valign == "middle":
+        y_start = ty1 + (region_h - layout.height) // 2
+    else:  # bottom
+        y_start = ty2 - layout.height
+
+    if text_align == "left":
+        line_xs = [tx1] * len(layout.lines)
+    elif text_align == "center":
+        line_xs = [tx1 + (region_w - line_w) // 2 for line_w in layout.line_widths]
+    else:
+        line_xs = [tx2 - line_w for line_w in layout.line_widths]
+
+    # 蒙版按排版边界分配：超出区域的行（最小字号兜底、无法断开的长串）也和以前一样画出来
+    mask_pad = layout.size
+    left = min([tx1] + line_xs)
+    right = max([tx2] + [x + w for x, w in zip(line_xs, layout.line_widths)])
+    mask_origin = (left - mask_pad, y_start - mask_pad)
+    mask_size = (right - left + 2 * mask_pad, max(layout.height, region_h) + 2 * mask_pad)
+    color_masks: dict = {}
+    pending_emojis: list = []
+
+    ascent, _ = font.getmetrics()
+    emoji_y_offset = ascent - emoji_size + int(emoji_size * 0.1) + int(emoji_size * 0.1 * emoji_size / 90)
+
+    y_pos = y_start
+    for runs, x_pos in zip(layout.lines, line_xs):
+        pen_x = float(x_pos)
+        for run in runs:
+            fill = role_colors.get(run.role, role_colors[ROLE_TEXT])
+            emoji_img = load_emoji_cached(run.emoji, emoji_size) if run.emoji is not None else None
+            if emoji_img is not None:
+                pending_emojis.append((emoji_img, (int(round(pen_x)), y_pos + emoji_y_offset)))
+            else:
+                mask = color_masks.get(fill)
+                if mask is None:
+                    mask = color_masks[fill] = Image.new("L", mask_size, 0)
+                glyphs = EMOJI_FALLBACK_CHAR if run.emoji is not None else run.text
+                blit_text_mask(mask, int(round(pen_x)) - mask_origin[0], y_pos - mask_origin[1], glyphs, font)
+            pen_x += run.advance
+
+        y_pos += layout.line_height
+        if y_pos - y_start > region_h:
+            break
+
+    composite_text_masks(img, mask_origin, color_masks, shadow_offset)
+    for emoji_img, pos in pending_emojis:
+        alpha_composite_at(img, emoji_img, pos)
+
+def render_content_layer(
+    canvas_size: Tuple[int, int],
     top_left: Tuple[int, int],
     bottom_right: Tuple[int, int],
     text: Optional[str] = None,
@@ -53,14 +172,13 @@ def draw_content_auto(
     font_name: Optional[str] = None,
     line_spacing: float = 0.15,
     image_padding: int = 12,
-    compression_settings: Optional[dict] = None,
     min_image_ratio: float = 0.2,  # 图片区域最小比例
-) -> bytes:
-    # 在指定矩形内自适应绘制文本和/或图片
+) -> ContentLayer:
+    # 在指定矩形内自适应绘制文本和/或图片，绘制到透明图层上并裁剪到内容边界（不依赖底图内容）
     # 图片放置在右侧，文字放置在左侧
     
     # 参数:
-    #     image_source: 背景图片或路径
+    #     canvas_size: 底图尺寸
     #     top_left: 区域左上角坐标
     #     bottom_right: 区域右下角坐标
     #     text: 要绘制的文本
@@ -75,203 +193,16 @@ def draw_content_auto(
     #     font_name: 字体名称
     #     line_spacing: 行间距比例
     #     image_padding: 图片内边距
-    #     compression_settings: 压缩设置
     #     min_image_ratio: 图片区域最小比例
 
-    PLACEHOLDER_CHAR = "□"  # 用来占位 emoji 的字符
-    EMOJI_FALLBACK_CHAR = "□"  # emoji 加载失败时使用的替代字符
-
     # 字体加载函数
     def load_font(size: int) -> ImageFont.FreeTypeFont:
         font_to_use = font_name if font_name else "font3.ttf"
         return load_font_cached(font_to_use, size)
 
-    # --- 辅助函数：提取emoji并替换为占位符 ---
-    def extract_emojis_and_replace(src: str, placeholder: str = PLACEHOLDER_CHAR):
-        emoji_infos = emoji.emoji_list(src)
-        if not emoji_infos:
-            return src, []
-        out_chars = []
-        emojis = []
-        last = 0
-        for info in emoji_infos:
-            s = info['match_start']
-            e = info['match_end']
-            if s > last:
-                out_chars.append(src[last:s])
-            out_chars.append(placeholder)
-            emojis.append(src[s:e])
-            last = e
-        if last < len(src):
-            out_chars.append(src[last:])
-        placeholder_text = "".join(out_chars)
-        return placeholder_text, emojis
-
-    def get_emoji_filename(seq: str) -> str:
-        return "emoji_u" + "_".join(f"{ord(c):x}" for c in seq) + ".png"
-
-    def load_emoji_image(emoji_char_or_seq: str, emoji_size: int) -> Optional[Image.Image]:
-        try:
-            filename = get_emoji_filename(emoji_char_or_seq)
-            emoji_path = get_resource_path(os.path.join("assets", "emoji", filename))
-
-            if not os.path.exists(emoji_path):
-                base_char = emoji_char_or_seq[0]
-                base_filename = get_emoji_filename(base_char)
-                base_path = get_resource_path(os.path.join("assets", "emoji", base_filename))
-
-                if not os.path.exists(base_path):
-                    print(f"[load_emoji_image] emoji asset not found: {emoji_path} nor {base_path}")
-                    return None
-
-                emoji_img = Image.open(base_path).convert("RGBA")
-            else:
-                emoji_img = Image.open(emoji_path).convert("RGBA")
-
-            if emoji_img.width != emoji_size or emoji_img.height != emoji_size:
-                emoji_img = emoji_img.resize((emoji_size, emoji_size), Image.Resampling.BILINEAR)
-
-            return emoji_img
-        except Exception as e:
-            print(f"[load_emoji_image] 加载emoji图片失败 {emoji_char_or_seq}: {e}")
-            return None
-
-    def draw_text_or_emoji(
-        draw: ImageDraw.Draw,
-        x: int,
-        y: int,
-        text: str,
-        # font: ImageFont.FreeTypeFont,
-        color: Tuple[int, int, int],
-        emoji_size: Optional[int] = None,
-        shadow_offset: int = 4,
-    ) -> int:
-        if emoji_size is not None:
-            emoji_img = load_emoji_image(text, emoji_size)
-            if emoji_img is None:
-                try:
-                    draw.text((x + shadow_offset, y + shadow_offset), EMOJI_FALLBACK_CHAR, font=font, fill=(0, 0, 0))
-                    draw.text((x, y), EMOJI_FALLBACK_CHAR, font=font, fill=color)
-                    w = int(draw.textlength(EMOJI_FALLBACK_CHAR, font=font))
-                    print(f"[draw_text_or_emoji] emoji 加载失败，使用替代字符绘制: {text}")
-                    return w
-                except Exception as e:
-                    print(f"[draw_text_or_emoji] emoji 绘制失败且替代字符绘制也失败: {text} -> {e}")
-                    return 0
-
-            try:
-                ascent, _ = font.getmetrics()
-                emoji_y = y + ascent - emoji_size + int(emoji_size * 0.1)
-                img = draw._image
-                font_size_ratio = emoji_size / 90 if 90 != 0 else 1
-                dynamic_offset = int(emoji_size * 0.1 * font_size_ratio)
-                paste_y = emoji_y + dynamic_offset
-                img.paste(emoji_img, (x, paste_y), emoji_img)
-                return emoji_img.width
-            except Exception as e:
-                print(f"[draw_text_or_emoji] emoji paste 失败 {text}: {e}")
-                try:
-                    draw.text((x + shadow_offset, y + shadow_offset), EMOJI_FALLBACK_CHAR, font=font, fill=(0, 0, 0))
-                    draw.text((x, y), EMOJI_FALLBACK_CHAR, font=font, fill=color)
-                    w = int(draw.textlength(EMOJI_FALLBACK_CHAR, font=font))
-                    return w
-                except Exception as e2:
-                    print(f"[draw_text_or_emoji] 替代字符绘制也失败: {e2}")
-                    return 0
-        else:
-            draw.text((x + shadow_offset, y + shadow_offset), text, font=font, fill=(0, 0, 0))
-            draw.text((x, y), text, font=font, fill=color)
-            return int(draw.textlength(text, font=font))
-
-    def wrap_lines_with_measure(txt: str, font: ImageFont.FreeTypeFont, max_w: int):
-        lines: list[str] = []
-        ascent, descent = font.getmetrics()
-        line_h = int((ascent + descent) * (1 + line_spacing))
-
-        max_line_w = 0
-        
-        measure_cache = {}
-        def measure(s: str) -> float:
-            if s not in measure_cache:
-                measure_cache[s] = draw.textlength(s, font=font)
-            return measure_cache[s]
-        
-        for para in txt.splitlines() or [""]:
-            has_space = " " in para
-            units = para.split(" ") if has_space else list(para)
-            buf = ""
-
-            def unit_join(a: str, b: str) -> str:
-                if not a:
-                    return b
-                return f"{a} {b}" if has_space else f"{a}{b}"
-
-            i = 0
-            units_len = len(units)
-
-            while i < units_len:
-                trial = unit_join(buf, units[i])
-                w = measure(trial)
-
-                if w <= max_w:
-                    buf = trial
-                    i += 1
-                else:
-                    if buf:
-                        lines.append(buf)
-                        max_line_w = max(max_line_w, measure(buf))
-                        buf = ""
-                    else:
-                        if has_space and len(units[i]) > 1:
-                            word = units[i]
-                            left, right = 1, len(word)
-
-                            while left <= right:
-                                mid = (left + right) // 2
-                                prefix = word[:mid]
-                                if measure(prefix) <= max_w:
-                                    left = mid + 1
-                                else:
-                                    right = mid - 1
-
-                            if right > 0:
-                                part = word[:right]
-                                lines.append(part)
-                                max_line_w = max(max_line_w, measure(part))
-                                units[i] = word[right:]
-                            else:
-                                lines.append(word)
-                                max_line_w = max(max_line_w, measure(word))
-                                i += 1
-                        else:
-                            u = units[i]
-                            u_w = measure(u)
-                            if u_w <= max_w:
-                                buf = u
-                            else:
-                                lines.append(u)
-                                max_line_w = max(max_line_w, u_w)
-                            i += 1
-
-            if buf:
-                lines.append(buf)
-                max_line_w = max(max_line_w, measure(buf))
-
-            if para == "" and (not lines or lines[-1] != ""):
-                lines.append("")
-
-        total_h = max(line_h * max(1, len(lines)), 1)
-        return lines, int(max_line_w), total_h, line_h
-
     # --- 主函数逻辑开始 ---
-    st=time.time()
+    img = Image.new("RGBA", canvas_size, (0, 0, 0, 0))
 
-    if isinstance(image_source, Image.Image):
-        img = image_source
-    else:
-        img = Image.open(image_source).convert("RGBA")
-
-    draw = ImageDraw.Draw(img)
 
     x1, y1 = top_left
     x2, y2 = bottom_right
@@ -280,11 +211,14 @@ def draw_content_auto(
 
     region_w, region_h = x2 - x1, y2 - y1
     
+    # 分词并解析括号颜色（分区、排版和绘制共用同一份结果）
+    if text is not None:
+        with trace_span("tokenize", chars=len(text)):
+            paragraphs = build_runs(text)
+
     # 计算文字区域和图片区域
     if content_image is not None and text is not None:
-        # 提取emoji并替换为占位符
-        placeholder_text, emoji_list = extract_emojis_and_replace(text, PLACEHOLDER_CHAR)
-        text_length = len(placeholder_text)
+        text_length = count_units(paragraphs)
         
         # 获取图片尺寸和特征
         cw, ch = content_image.size
@@ -333,12 +267,7 @@ def draw_content_auto(
         image_rect = None
     else:
         # 既没有文字也没有图片
-        buf = BytesIO()
-        img.convert("RGB").save(buf, format="BMP")
-        return buf.getvalue()[14:]
-
-    print(f"分区耗时: {int((time.time() - st)*1000)}")
-    st=time.time()
+        return _trim_layer(img)
 
     # --- 处理图片部分 ---
     if content_image is not None and image_rect is not None:
@@ -357,7 +286,8 @@ def draw_content_auto(
         new_w = max(1, int(round(cw * scale)))
         new_h = max(1, int(round(ch * scale)))
 
-        resized = content_image.resize((new_w, new_h), Image.Resampling.BILINEAR)
+        with trace_span("content_image", size=f"{new_w}x{new_h}"):
+            resized = load_content_image_resized(content_image, (new_w, new_h))
 
         if image_align == "left":
             px = ix1 + image_padding
@@ -374,172 +304,123 @@ def draw_content_auto(
             py = iy2 - image_padding - new_h
 
         if "A" in resized.getbands():
-            img.paste(resized, (px, py), resized)
+            alpha_composite_at(img, resized, (px, py))
         else:
             img.paste(resized, (px, py))
-        print(f"图片耗时: {int((time.time() - st)*1000)}")
-        st=time.time()
-        
+
+
     # --- 处理文字部分 ---
     if text is not None and text_rect is not None:
         tx1, ty1, tx2, ty2 = text_rect
         region_w_text, region_h_text = tx2 - tx1, ty2 - ty1
 
-        # 提取emoji并替换为占位符
-        placeholder_text, emoji_list = extract_emojis_and_replace(text, PLACEHOLDER_CHAR)
-        print(f"emoji分析耗时: {int((time.time() - st)*1000)}")
-        st=time.time()
-        
         # 搜索最大字号
-        hi = min(region_h_text, max_font_height) if max_font_height else region_h_text
-        lo, best_size, best_lines, best_line_h, best_block_h = 1, 0, [], 0, 0
-
-        while lo <= hi:
-            mid = (lo + hi) // 2
-            font = load_font(mid)
-            lines, w, h, lh = wrap_lines_with_measure(placeholder_text, font, region_w_text)
-
-            if w <= region_w_text and h <= region_h_text:
-                best_size, best_lines, best_line_h, best_block_h = mid, lines, lh, h
-                lo = mid + 1
-            else:
-                hi = mid - 1
+        with trace_span("layout") as span:
+            layout = fit_runs(paragraphs, load_font, region_w_text, region_h_text, max_font_height, line_spacing)
+            span.set(font_size=layout.size, lines=len(layout.lines))
+
+        with trace_span("raster"):
+            draw_text_layout(
+                img,
+                layout,
+                text_rect,
+                {ROLE_TEXT: color, ROLE_BRACKET: bracket_color},
+                text_align,
+                text_valign,
+            )
+
+
+    return _trim_layer(img)
+
+def _trim_layer(img: Image.Image) -> ContentLayer:
+    # 裁剪掉图层四周的全透明区域
+    bbox = img.getbbox()
+    if bbox is None:
+        return ContentLayer(None, (0, 0), img.size)
+    return ContentLayer(img.crop(bbox), (bbox[0], bbox[1]), img.size)
+
+def render_content_layer_cached(canvas_size: Tuple[int, int], top_left: Tuple[int, int],
+                                bottom_right: Tuple[int, int], text: Optional[str] = None,
+                                content_image: Optional[Image.Image] = None, **kwargs) -> ContentLayer:
+    # 带缓存的 render_content_layer：绘制参数（含内容图片哈希）相同则复用上次的图层
+    # 内容图片没有 content_key 时无法判断是否同一张图，直接绘制不缓存
+    content_key = None
+    if content_image is not None:
+        content_key = content_image.info.get("content_key")
+        if content_key is None:
+            return render_content_layer(canvas_size, top_left, bottom_right, text, content_image, **kwargs)
+
+    cache_key = (tuple(canvas_size), tuple(top_left), tuple(bottom_right), text, content_key,
+                 tuple(sorted(kwargs.items())))
+    return load_content_layer_cached(
+        cache_key,
+        lambda: render_content_layer(canvas_size, top_left, bottom_right, text, content_image, **kwargs),
+    )
+
+def composite_layer(base: Union[str, Image.Image], layer: ContentLayer) -> Image.Image:
+    # 把内容图层合成到底图的副本上，底图本身保持不变
+    if not isinstance(base, Image.Image):
+        base = Image.open(base)
+    img = base.convert("RGBA") if base.mode != "RGBA" else base.copy()
+    if layer.image is not None:
+        alpha_composite_at(img, layer.image, layer.offset)
+    return img
+
+def compose_content_image(
+    base: Union[str, Image.Image],
+    layer: ContentLayer,
+    compression_settings: Optional[dict] = None,
+    encoder_settings: Optional[dict] = None,
+) -> EncodeResult:
+    # 把内容图层合成到底图上（不修改底图），再按设置缩小并编码输出
+    with trace_span("compose"):
+        img = composite_layer(base, layer)
 
-        if best_size == 0:
-            font = load_font(1)
-            lines, _, h, lh = wrap_lines_with_measure(placeholder_text, font, region_w_text)
-            best_lines, best_block_h, best_line_h = lines, h, lh
-            best_size = 1
-        else:
-            font = load_font(best_size)
-            _, _, best_block_h, best_line_h = wrap_lines_with_measure(placeholder_text, font, region_w_text)
-        print(f"字号搜索耗时: {int((time.time() - st)*1000)}")
-        st=time.time()
-        
-        # 计算emoji尺寸
-        emoji_size = best_size
-
-        # 计算垂直起始位置
-        if text_valign == "top":
-            y_start = ty1
-        elif text_valign == "middle":
-            y_start = ty1 + (region_h_text - best_block_h) // 2
-        else:  # bottom
-            y_start = ty2 - best_block_h
-
-        # 绘制文字
-        y_pos = y_start
-        bracket_stack = []
-        emoji_iter_index = 0
-        total_emojis = len(emoji_list)
-
-        # 解析颜色片段
-        def parse_color_segments(
-            s: str, bracket_stack: list
-        ) -> Tuple[list[tuple[str, Tuple[int, int, int]]], list]:
-            segs: list[tuple[str, Tuple[int, int, int]]] = []
-            buf = ""
-
-            for ch in s:
-                if ch in bracket_pairs:
-                    if buf:
-                        current_color = bracket_color if bracket_stack else color
-                        segs.append((buf, current_color))
-                        buf = ""
-
-                    if ch in ('"', "'", "`"):
-                        if bracket_stack and bracket_stack[-1] == ch:
-                            segs.append((ch, bracket_color))
-                            bracket_stack.pop()
-                        else:
-                            segs.append((ch, bracket_color))
-                            bracket_stack.append(ch)
-                    else:
-                        segs.append((ch, bracket_color))
-                        bracket_stack.append(ch)
-
-                elif ch in bracket_pairs.values():
-                    if buf:
-                        segs.append((buf, bracket_color))
-                        buf = ""
-
-                    segs.append((ch, bracket_color))
-
-                    if bracket_stack:
-                        last_bracket = bracket_stack[-1]
-                        if bracket_pairs.get(last_bracket) == ch:
-                            bracket_stack.pop()
-                else:
-                    buf += ch
-                    
-            if buf:
-                current_color = bracket_color if bracket_stack else color
-                segs.append((buf, current_color))
-
-            return segs, bracket_stack
-
-        for ln in best_lines:
-            line_w = draw.textlength(ln, font=font)
-
-            if text_align == "left":
-                x_pos = tx1
-            elif text_align == "center":
-                x_pos = tx1 + (region_w_text - line_w) // 2
-            else:
-                x_pos = tx2 - line_w
-
-            segments, bracket_stack = parse_color_segments(ln, bracket_stack)
-
-            for seg_text, seg_color in segments:
-                if not seg_text:
-                    continue
-
-                i = 0
-                L = len(seg_text)
-                while i < L:
-                    ch = seg_text[i]
-                    if ch == PLACEHOLDER_CHAR:
-                        if emoji_iter_index < total_emojis:
-                            emoji_seq = emoji_list[emoji_iter_index]
-                            emoji_iter_index += 1
-                            width = draw_text_or_emoji(draw, x_pos, y_pos, emoji_seq, seg_color, emoji_size)
-                            x_pos += width
-                        else:
-                            width = draw_text_or_emoji(draw, x_pos, y_pos, EMOJI_FALLBACK_CHAR, seg_color, None)
-                            x_pos += width
-                        i += 1
-                    else:
-                        j = i
-                        while j < L and seg_text[j] != PLACEHOLDER_CHAR:
-                            j += 1
-                        text_fragment = seg_text[i:j]
-                        width = draw_text_or_emoji(draw, x_pos, y_pos, text_fragment, seg_color, None)
-                        x_pos += width
-                        i = j
-
-            y_pos += best_line_h
-            if y_pos - y_start > region_h_text:
-                break
-
-        if emoji_iter_index < total_emojis:
-            print(f"[draw] 警告：有 {total_emojis - emoji_iter_index} 个 emoji 未被绘制（占位符不足）")
-        print(f"绘制耗时: {int((time.time() - st)*1000)}")
-        st=time.time()
-        
     # --- 压缩图片 ---
     if compression_settings is not None:
         reduction_ratio = compression_settings.get("pixel_reduction_ratio", 50) / 100.0
         new_width = max(int(img.width * (1 - reduction_ratio)), 300)
         new_height = max(int(img.height * (1 - reduction_ratio)), 100)
-        img = img.resize((new_width, new_height), Image.Resampling.BILINEAR)
-        print(f"压缩耗时: {int((time.time() - st)*1000)}")
-        st=time.time()
-
-    # --- 输出 BMP ---
-    buf = BytesIO()
-    img_rgb = img.convert("RGB")
-    img_rgb.save(buf, format="BMP")
-    bmp_data = buf.getvalue()[14:]
-        
-    print(f"输出耗时: {int((time.time() - st)*1000)}")
-    return bmp_data
\ No newline at end of file
+        with trace_span("downscale", size=f"{new_width}x{new_height}"):
+            img = img.resize((new_width, new_height), Image.Resampling.BILINEAR)
+
+    # --- 编码输出 ---
+    with trace_span("encode") as span:
+        result = encode_image(img, encoder_settings)
+        span.set(format=result.format, bytes=result.size, quality=result.quality)
+    return result
+
+def draw_content_auto(
+    image_source: Union[str, Image.Image],
+    top_left: Tuple[int, int],
+    bottom_right: Tuple[int, int],
+    text: Optional[str] = None,
+    content_image: Optional[Image.Image] = None,
+    text_align: Align = "left",
+    text_valign: VAlign = "top",
+    image_align: Align = "center",
+    image_valign: VAlign = "middle",
+    color: Tuple[int, int, int] = (255, 255, 255),
+    bracket_color: Tuple[int, int, int] = (137, 177, 251),
+    max_font_height: Optional[int] = None,
+    font_name: Optional[str] = None,
+    line_spacing: float = 0.15,
+    image_padding: int = 12,
+    compression_settings: Optional[dict] = None,
+    min_image_ratio: float = 0.2,  # 图片区域最小比例
+    encoder_settings: Optional[dict] = None,
+) -> EncodeResult:
+    # 绘制内容图层并合成到底图上输出（底图不会被修改），参数含义见 render_content_layer
+    # image_source: 背景图片或路径; compression_settings: 压缩设置; encoder_settings: 输出编码设置，默认输出DIB
+    if isinstance(image_source, Image.Image):
+        base = image_source
+    else:
+        base = Image.open(image_source).convert("RGBA")
+
+    layer = render_content_layer(
+        base.size, top_left, bottom_right, text, content_image,
+        text_align, text_valign, image_align, image_valign,
+        color, bracket_color, max_font_height, font_name,
+        line_spacing, image_padding, min_image_ratio,
+    )
+    return compose_content_image(base, layer, compression_settings, encoder_settings)
@@ -0,0 +1,196 @@
+"""emoji 图集模块 - 把 assets/emoji 下的散装PNG打包成单个图集文件并按需切片读取
+
+图集文件结构:
+    MAGIC(4) | 版本(u32) | 索引长度(u32) | 索引JSON | 各emoji各级mip的PNG数据
+
+索引JSON:
+    {"mips": [128], "entries": {"1f602": [[偏移, 长度], ...], ...}}
+    entries 的键为下划线连接的十六进制码位（与 emoji_u 文件名一致），
+    每个键对应的列表与 mips 一一对应，偏移相对于数据区起点。
+    默认只保存 128px 一级：与原图同尺寸时直接保存原PNG字节，否则缩放后无损保存，
+    更小的尺寸在加载时缩放（load_emoji_cached 会缓存缩放结果）。
+    图集比散装文件小的部分来自每个文件的文件系统占用和打包开销（约 21MB 数据 / 28MB 磁盘占用 -> 单个约 21MB 文件）。
+
+使用方法（打包前执行一次）: python emoji_atlas.py
+"""
+
+import io
+import os
+import sys
+import json
+import mmap
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from path_utils import get_resource_path
+
+ATLAS_MAGIC = b"MSEA"
+ATLAS_VERSION = 2  # 版本1的较小mip是有损的调色板PNG，不再使用
+ATLAS_FILENAME = "emoji.atlas"
+DEFAULT_MIP_SIZES = (128,)
+
+_HEADER = struct.Struct("<4sII")
+
+
+def emoji_key(seq: str) -> str:
+    """emoji序列 -> 图集索引键（与散装文件名保持一致）"""
+    return "_".join(f"{ord(c):x}" for c in seq)
+
+
+def get_atlas_path() -> str:
+    return get_resource_path(os.path.join("assets", ATLAS_FILENAME))
+
+
+def asset_filename_to_key(filename: str) -> Optional[str]:
+    """散装文件名 -> 索引键，兼容 emoji_u1f602_200d.png 和 u1f645-u1f3fb-u200d.png 两种命名"""
+    name, ext = os.path.splitext(filename)
+    if ext.lower() != ".png":
+        return None
+    if name.startswith("emoji_u"):
+        parts = name[len("emoji_u"):].split("_")
+    elif name.startswith("u"):
+        parts = [p[1:] if p.startswith("u") else p for p in name.split("-")]
+    else:
+        return None
+    try:
+        return "_".join(f"{int(p, 16):x}" for p in parts)
+    except ValueError:
+        return None
+
+
+def build_emoji_atlas(
+    source_dir: Optional[str] = None,
+    output_path: Optional[str] = None,
+    mip_sizes: Tuple[int, ...] = DEFAULT_MIP_SIZES,
+) -> str:
+    """把 source_dir 下的emoji PNG打包成图集文件，返回输出路径"""
+    source_dir = source_dir or get_resource_path(os.path.join("assets", "emoji"))
+    output_path = output_path or get_atlas_path()
+    mip_sizes = tuple(sorted(mip_sizes, reverse=True))
+
+    entries: Dict[str, List[List[int]]] = {}
+    data = io.BytesIO()
+    for filename in sorted(os.listdir(source_dir)):
+        key = asset_filename_to_key(filename)
+        if key is None or key in entries:
+            continue
+        path = os.path.join(source_dir, filename)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            with Image.open(io.BytesIO(raw)) as im:
+                source = im.convert("RGBA")
+        except Exception as e:
+            print(f"[build_emoji_atlas] 跳过无法解码的文件 {filename}: {e}")
+            continue
+
+        slots = []
+        for size in mip_sizes:
+            offset = data.tell()
+            if source.size == (size, size):
+                data.write(raw)
+            else:
+                mip = source.resize((size, size), Image.Resampling.LANCZOS)
+                mip.save(data, format="PNG", optimize=True)
+            slots.append([offset, data.tell() - offset])
+        entries[key] = slots
+
+    index = json.dumps(
+        {"mips": list(mip_sizes), "entries": entries},
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, len(index)))
+        f.write(index)
+        f.write(data.getbuffer())
+    os.replace(tmp_path, output_path)
+
+    print(f"[build_emoji_atlas] 已打包 {len(entries)} 个emoji，mip: {list(mip_sizes)} -> {output_path}")
+    return output_path
+
+
+class EmojiAtlas:
+    """内存映射的emoji图集，按 (序列, 目标尺寸) 切出最合适的mip"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, index_len = _HEADER.unpack_from(self._mm, 0)
+            if magic != ATLAS_MAGIC or version != ATLAS_VERSION:
+                raise ValueError(f"图集文件格式不匹配: {path}")
+            index_start = _HEADER.size
+            index = json.loads(self._mm[index_start:index_start + index_len].decode("utf-8"))
+        except Exception:
+            self.close()
+            raise
+
+        self._data_start = index_start + index_len
+        self.mip_sizes: List[int] = index["mips"]
+        self._entries: Dict[str, List[List[int]]] = index["entries"]
+
+    def __contains__(self, seq: str) -> bool:
+        return emoji_key(seq) in self._entries
+
+    def keys(self):
+        """图集内所有emoji的索引键"""
+        return self._entries.keys()
+
+    def pick_mip(self, size: int) -> int:
+        """选择不小于目标尺寸的最小mip，目标比最大mip还大时返回最大mip"""
+        for mip in reversed(self.mip_sizes):
+            if mip >= size:
+                return mip
+        return self.mip_sizes[0]
+
+    def load(self, seq: str, mip: int) -> Optional[Image.Image]:
+        """解码指定mip的emoji，不存在时返回None"""
+        slots = self._entries.get(emoji_key(seq))
+        if slots is None or mip not in self.mip_sizes:
+            return None
+        offset, length = slots[self.mip_sizes.index(mip)]
+        start = self._data_start + offset
+        with Image.open(io.BytesIO(self._mm[start:start + length])) as im:
+            return im.convert("RGBA")
+
+    def close(self):
+        mm = getattr(self, "_mm", None)
+        if mm is not None:
+            mm.close()
+            self._mm = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+_atlas = None
+_atlas_checked = False
+_atlas_lock = threading.Lock()
+
+
+def get_emoji_atlas() -> Optional[EmojiAtlas]:
+    """获取全局图集实例，图集文件不存在或损坏时返回None（调用方回退到散装PNG）"""
+    global _atlas, _atlas_checked
+    if _atlas_checked:
+        return _atlas
+    with _atlas_lock:
+        if not _atlas_checked:
+            path = get_atlas_path()
+            if os.path.exists(path):
+                try:
+                    _atlas = EmojiAtlas(path)
+                except Exception as e:
+                    print(f"[get_emoji_atlas] 加载emoji图集失败，回退到散装PNG: {e}")
+                    _atlas = None
+            _atlas_checked = True
+    return _atlas
+
+
+if __name__ == "__main__":
+    build_emoji_atlas(output_path=sys.argv[1] if len(sys.argv) > 1 else None)
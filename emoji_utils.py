@@ -0,0 +1,137 @@
+"""emoji 分词模块 - 基于实际存在的emoji资源构建前缀树，单次线性扫描完成分词"""
+
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from path_utils import get_resource_path
+from emoji_atlas import get_emoji_atlas, asset_filename_to_key
+
+VS16 = "️"  # 变体选择符-16（emoji表现形式）
+ZWJ = "‍"   # 零宽连接符
+SKIN_TONES = frozenset(chr(cp) for cp in range(0x1F3FB, 0x1F400))
+
+_END = ""  # 前缀树节点中存放资源序列的键（空字符串不会与任何字符冲突）
+
+_trie = None
+_trie_lock = threading.Lock()
+
+
+def _iter_asset_keys():
+    """枚举所有可用的emoji资源键，优先使用图集索引"""
+    atlas = get_emoji_atlas()
+    if atlas is not None:
+        yield from atlas.keys()
+        return
+
+    emoji_dir = get_resource_path(os.path.join("assets", "emoji"))
+    if not os.path.isdir(emoji_dir):
+        return
+    for filename in os.listdir(emoji_dir):
+        key = asset_filename_to_key(filename)
+        if key:
+            yield key
+
+
+def _build_trie() -> dict:
+    """用资源键构建前缀树，路径上去掉 FE0F，终点记录资源本身的码位序列"""
+    root: dict = {}
+    for key in sorted(_iter_asset_keys()):
+        asset_seq = "".join(chr(int(p, 16)) for p in key.split("_"))
+        node = root
+        for ch in asset_seq:
+            if ch == VS16:
+                continue
+            node = node.setdefault(ch, {})
+        # 同一规范化序列已有资源时保留先登记的（emoji_u 命名排在前面）
+        node.setdefault(_END, asset_seq)
+    return root
+
+
+def get_emoji_trie() -> dict:
+    """获取全局emoji前缀树（首次使用时构建）"""
+    global _trie
+    if _trie is None:
+        with _trie_lock:
+            if _trie is None:
+                _trie = _build_trie()
+    return _trie
+
+
+def reset_emoji_trie():
+    """资源变化后丢弃前缀树，下次使用时重新构建"""
+    global _trie
+    with _trie_lock:
+        _trie = None
+
+
+def _match_at(text: str, start: int, trie: dict) -> Tuple[int, Optional[str]]:
+    """从 start 开始匹配最长的可用资源，返回 (结束位置, 资源序列)，无匹配时资源序列为None"""
+    node = trie
+    i = start
+    n = len(text)
+    best_end, best_asset = start, None
+
+    while i < n:
+        ch = text[i]
+        if ch == VS16 and i > start:
+            # FE0F 不参与匹配，但属于当前emoji
+            i += 1
+            if node.get(_END) is not None and best_end == i - 1:
+                best_end = i
+            continue
+        child = node.get(ch)
+        if child is None:
+            break
+        node = child
+        i += 1
+        asset = node.get(_END)
+        if asset is not None:
+            # 纯ASCII字符（数字、#、*）必须带 FE0F 或组成更长序列才当作emoji
+            if not (len(asset) == 1 and ord(asset) < 0x80 and not text.startswith(VS16, i)):
+                best_end, best_asset = i, asset
+
+    if best_asset is None:
+        return start, None
+
+    # 资源里没有的肤色修饰符：归一到不带肤色的资源，修饰符一并吞掉
+    while best_end < n and (text[best_end] in SKIN_TONES or text[best_end] == VS16):
+        best_end += 1
+    return best_end, best_asset
+
+
+def tokenize_emoji(text: str) -> List[Tuple[str, Optional[str]]]:
+    """把文本切分为 [(片段, 资源序列或None), ...]
+
+    普通文本片段的资源序列为None；emoji片段的资源序列是实际要加载的资源码位，
+    完整的组合序列没有资源时，会按最长可用前缀拆成多个emoji，中间多余的 ZWJ 被丢弃
+    """
+    trie = get_emoji_trie()
+    tokens: List[Tuple[str, Optional[str]]] = []
+    buf_start = 0
+    i = 0
+    n = len(text)
+    after_emoji = False
+
+    while i < n:
+        ch = text[i]
+        if ch in trie:
+            end, asset = _match_at(text, i, trie)
+            if asset is not None:
+                if buf_start < i:
+                    tokens.append((text[buf_start:i], None))
+                tokens.append((text[i:end], asset))
+                i = buf_start = end
+                after_emoji = True
+                continue
+        if after_emoji and ch in (ZWJ, VS16):
+            # 组合序列被拆开后残留的连接符
+            i += 1
+            buf_start = i
+            continue
+        after_emoji = False
+        i += 1
+
+    if buf_start < n:
+        tokens.append((text[buf_start:], None))
+    return tokens
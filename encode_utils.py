@@ -0,0 +1,212 @@
+"""图片编码模块 - 直接从图像缓冲区生成剪贴板需要的DIB数据，以及可按进程配置的 PNG/JPEG/WebP 输出编码"""
+
+import io
+import time
+import struct
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image
+
+# BITMAPINFOHEADER: 结构大小, 宽, 高(正数=自下而上), 平面数, 位深, 压缩方式,
+# 像素数据大小, 水平/垂直分辨率(像素/米), 调色板颜色数, 重要颜色数
+_BITMAPINFOHEADER = struct.Struct("<IiiHHIIiiII")
+_BI_RGB = 0
+_PIXELS_PER_METER = 3780  # 96 DPI，与 Pillow 保存 BMP 时的默认值一致
+
+# 位深 -> (图像模式, Pillow raw 打包模式)
+_DIB_RAWMODES = {
+    24: ("RGB", "BGR"),
+    32: ("RGBA", "BGRA"),
+}
+# 可以不转换直接打包的 (位深, 图像模式)；RGBA -> BGR 由打包器直接丢弃 alpha
+_DIB_DIRECT_MODES = {(24, "RGB"), (24, "RGBA"), (32, "RGBA")}
+_DIB_CHUNK_SIZE = 1 << 16
+
+
+def encode_dib(img: Image.Image, bits: int = 24) -> memoryview:
+    """把图像编码为 CF_DIB 数据（BITMAPINFOHEADER + 自下而上的 BGR(A) 像素行）
+
+    RGB/RGBA 图像直接从原缓冲区打包，不需要先 convert("RGB")（bits=32 的 RGB 图像需要先转为 RGBA）；
+    bits=32 时输出 32 位 BI_RGB，保留 alpha 通道（多数程序会忽略它）。
+    结果缓冲区一次分配，文件头和像素行直接写入其中，不再拼接出第二份完整数据；
+    返回 memoryview，剪贴板层可以直接使用而无需再复制。
+    """
+    if bits not in _DIB_RAWMODES:
+        raise ValueError(f"不支持的DIB位深: {bits}")
+    mode, rawmode = _DIB_RAWMODES[bits]
+    if (bits, img.mode) not in _DIB_DIRECT_MODES:
+        img = img.convert(mode)
+    img.load()
+
+    width, height = img.size
+    stride = ((width * bits + 31) // 32) * 4  # 每行按4字节对齐
+    image_size = stride * height
+    header_size = _BITMAPINFOHEADER.size
+
+    buf = bytearray(header_size + image_size)
+    _BITMAPINFOHEADER.pack_into(
+        buf,
+        0,
+        header_size,
+        width,
+        height,
+        1,
+        bits,
+        _BI_RGB,
+        image_size,
+        _PIXELS_PER_METER,
+        _PIXELS_PER_METER,
+        0,
+        0,
+    )
+    if not image_size:
+        return memoryview(buf)
+
+    # 与 Image.tobytes 相同的 raw 编码器，按块写入预分配的缓冲区（不生成中间的完整像素 bytes）
+    # raw 编码器的 stride 参数负责行尾补齐，-1 表示自下而上输出
+    encoder = Image._getencoder(img.mode, "raw", (rawmode, stride, -1))
+    encoder.setimage(img.im, (0, 0) + img.size)
+    view = memoryview(buf)
+    offset = header_size
+    while True:
+        _, errcode, chunk = encoder.encode(max(_DIB_CHUNK_SIZE, stride))
+        view[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+        if errcode:
+            break
+    if errcode < 0:
+        raise RuntimeError(f"DIB编码失败: {errcode}")
+    return view
+
+
+class EncodeResult(NamedTuple):
+    """编码结果"""
+    data: Union[bytes, memoryview]  # 编码后的数据
+    format: str                     # 实际使用的格式: dib / png / jpeg / webp
+    size: int                       # 数据字节数
+    elapsed_ms: float               # 编码总耗时（包含质量搜索）
+    quality: Optional[int] = None   # 有损格式最终使用的质量
+
+
+_DEFAULT_QUALITY = 90  # JPEG/WebP 默认质量
+
+
+def _encode_with_pillow(img: Image.Image, fmt: str, **params) -> memoryview:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **params)
+    return buf.getbuffer()
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def _encode_dib(img: Image.Image, settings: dict, quality: Optional[int]):
+    return encode_dib(img, settings.get("bits", 24))
+
+
+def _encode_png(img: Image.Image, settings: dict, quality: Optional[int]):
+    # PNG 无损，quality 在这里表示压缩等级（0-9，越大越慢越小）
+    level = settings.get("compress_level", 1) if quality is None else quality
+    return _encode_with_pillow(_to_rgb(img), "PNG", compress_level=level)
+
+
+def _encode_jpeg(img: Image.Image, settings: dict, quality: Optional[int]):
+    return _encode_with_pillow(
+        _to_rgb(img), "JPEG",
+        quality=settings.get("quality", _DEFAULT_QUALITY) if quality is None else quality,
+        subsampling=settings.get("subsampling", 0),
+    )
+
+
+def _encode_webp(img: Image.Image, settings: dict, quality: Optional[int]):
+    return _encode_with_pillow(
+        _to_rgb(img), "WEBP",
+        quality=settings.get("quality", _DEFAULT_QUALITY) if quality is None else quality,
+        method=settings.get("method", 2),
+    )
+
+
+# 格式名 -> (编码函数, 目标大小模式下的质量搜索范围; None 表示按压缩等级逐级尝试)
+_ENCODERS: Dict[str, Tuple[Callable, Optional[Tuple[int, int]]]] = {
+    "dib": (_encode_dib, None),
+    "png": (_encode_png, None),
+    "jpeg": (_encode_jpeg, (30, 95)),
+    "webp": (_encode_webp, (30, 95)),
+}
+_PNG_LEVELS = (1, 6, 9)
+
+
+def register_encoder(
+    name: str,
+    func: Callable[[Image.Image, dict, Optional[int]], Union[bytes, memoryview]],
+    quality_range: Optional[Tuple[int, int]] = None,
+):
+    """注册输出编码器，quality_range 不为空时支持按目标大小搜索质量"""
+    _ENCODERS[name.lower()] = (func, quality_range)
+
+
+def get_encoder_names() -> List[str]:
+    return list(_ENCODERS.keys())
+
+
+def encode_image(img: Image.Image, settings: Optional[dict] = None) -> EncodeResult:
+    """按配置编码输出图片
+
+    settings:
+        format: dib / png / jpeg / webp，默认 dib
+        target_bytes: 目标大小，超过时在时间预算内搜索质量（有损格式）或提高压缩等级（PNG）
+        time_budget_ms: 目标大小模式下的搜索时间预算（每次尝试前检查），默认 150
+        quality / min_quality / max_quality / compress_level / method / bits: 各编码器参数
+    不支持的格式回退到 dib。
+    """
+    settings = settings or {}
+    fmt = str(settings.get("format", "dib")).lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in _ENCODERS:
+        print(f"[encode_image] 不支持的输出格式 {fmt}，回退到 dib")
+        fmt = "dib"
+    func, quality_range = _ENCODERS[fmt]
+
+    st = time.perf_counter()
+    target = settings.get("target_bytes")
+    data = func(img, settings, None)
+    quality = settings.get("quality", _DEFAULT_QUALITY) if quality_range else None
+
+    if target and len(data) > target and fmt != "dib":
+        deadline = st + settings.get("time_budget_ms", 150) / 1000
+        if quality_range:
+            data, quality = _search_quality(img, settings, func, quality_range, target, deadline, data)
+        else:
+            for level in _PNG_LEVELS:
+                if level <= settings.get("compress_level", 1) or time.perf_counter() >= deadline:
+                    continue
+                data = func(img, settings, level)
+                if len(data) <= target:
+                    break
+
+    return EncodeResult(data, fmt, len(data), (time.perf_counter() - st) * 1000, quality)
+
+
+def _search_quality(img, settings, func, quality_range, target, deadline, first):
+    """在时间预算内二分搜索不超过目标大小的最高质量，预算用完时返回已找到的最好结果"""
+    lo = settings.get("min_quality", quality_range[0])
+    hi = min(settings.get("max_quality", quality_range[1]), settings.get("quality", _DEFAULT_QUALITY) - 1)
+    best, best_q = None, None
+    smallest, smallest_q = first, settings.get("quality", _DEFAULT_QUALITY)
+
+    while lo <= hi and time.perf_counter() < deadline:
+        mid = (lo + hi) // 2
+        data = func(img, settings, mid)
+        if len(data) <= target:
+            best, best_q = data, mid
+            lo = mid + 1
+        else:
+            if len(data) < len(smallest):
+                smallest, smallest_q = data, mid
+            hi = mid - 1
+
+    if best is not None:
+        return best, best_q
+    return smallest, smallest_q
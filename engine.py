@@ -0,0 +1,118 @@
+"""运行时引擎 - 管理配置、缓存、预加载和情感分析器的生命周期，由调用方显式启动和停止
+
+导入 config / load_utils 不再有副作用（不读取YAML、不启动线程），需要什么由 Engine 按需创建:
+    GUI:            Engine() -> start()，首个预览生成后再 start_preload()，退出时 stop()
+    批量渲染/服务:   Engine(preload=False, sentiment=False) -> start()，只用配置和绘制缓存
+
+配置在 start() 时读取（或使用传入的 ConfigLoader）并安装为全局 CONFIGS；图片/字体/底图缓存仍是
+load_utils、render_utils 的模块级缓存（多个进程/线程共用），统一通过 clear_caches() 清理；
+禁用预加载时 preload_manager 是一个什么都不做的管理器，调用方不需要判断。
+"""
+
+from typing import Any, Callable, Dict, Optional
+
+from config import ConfigLoader, get_configs, set_configs
+from font_utils import refresh_font_registry
+from load_utils import PreloadManager, clear_cache, get_preload_manager
+
+
+class _DisabledPreloadManager:
+    """禁用预加载时使用：接口与 PreloadManager 相同，不启动线程、不加载任何东西"""
+
+    def set_update_callback(self, callback: Callable[[str], None]):
+        pass
+
+    def preload_character_images_async(self, character_name: str) -> bool:
+        return False
+
+    def preload_backgrounds_async(self):
+        pass
+
+    def get_preload_progress(self) -> float:
+        return 0.0
+
+    def get_preload_status(self) -> Dict[str, Any]:
+        return {'loaded_items': 0, 'total_items': 0, 'is_complete': True, 'current_character': None}
+
+    def stop_worker(self):
+        pass
+
+
+class Engine:
+    """魔裁文本框运行时"""
+
+    def __init__(self, preload: bool = True, sentiment: bool = True, configs: Optional[ConfigLoader] = None):
+        self.preload_enabled = preload
+        self.sentiment_enabled = sentiment
+        self._configs = configs
+        self._preload_manager: Optional[PreloadManager] = None
+        self._sentiment_analyzer = None
+        self._preload_started = False
+        self.started = False
+
+    @property
+    def configs(self) -> ConfigLoader:
+        """引擎使用的配置（start() 之前访问时先读取配置）"""
+        if self._configs is None:
+            self._configs = get_configs()
+        return self._configs
+
+    @property
+    def preload_manager(self):
+        """预加载管理器（禁用预加载时是不做任何事的管理器）；获取时不会启动工作线程"""
+        if self._preload_manager is None:
+            self._preload_manager = get_preload_manager() if self.preload_enabled else _DisabledPreloadManager()
+        return self._preload_manager
+
+    @property
+    def sentiment_analyzer(self):
+        """情感分析器（禁用时为None），第一次访问时创建"""
+        if not self.sentiment_enabled:
+            return None
+        if self._sentiment_analyzer is None:
+            from sentiment_analyzer import SentimentAnalyzer
+
+            self._sentiment_analyzer = SentimentAnalyzer()
+        return self._sentiment_analyzer
+
+    def start(self) -> "Engine":
+        """读取配置（传入了 configs 时使用它作为全局配置）"""
+        if self.started:
+            return self
+        if self._configs is not None:
+            set_configs(self._configs)
+        else:
+            self._configs = get_configs()
+        self.started = True
+        return self
+
+    def start_preload(self, character_name: Optional[str] = None):
+        """开始后台预加载角色表情和背景（只在第一次调用时提交背景预加载）"""
+        if not self.preload_enabled:
+            return
+        manager = self.preload_manager
+        manager.preload_character_images_async(character_name or self.configs.get_character())
+        if not self._preload_started:
+            self._preload_started = True
+            manager.preload_backgrounds_async()
+
+    def clear_caches(self, cache_type: str = "all"):
+        """清理图片/字体等缓存（清理字体缓存时同时重新扫描字体目录）"""
+        clear_cache(cache_type)
+        if cache_type in ("font", "all"):
+            refresh_font_registry()
+
+    def stop(self):
+        """停止预加载线程，立即保存还在等待延迟保存的时间配置"""
+        if not self.started:
+            return
+        self.preload_manager.stop_worker()
+        self.configs.save_timing_profiles()
+        self.started = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
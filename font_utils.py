@@ -0,0 +1,223 @@
+"""字体注册表 - 扫描一次字体目录，按字体家族（文件名去掉扩展名）查找字体文件
+
+发送时解析字体只是一次字典查找；字体目录的修改时间最多每 FONT_DIR_CHECK_INTERVAL 秒检查一次，
+目录有变化（添加/删除字体）或在设置中点击应用时重新扫描。
+另外可以查询字体元数据（字体内部名称、样式、文件大小）和字形覆盖率（缺字检查）。
+"""
+
+import os
+import time
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from path_utils import get_base_path, get_resource_path
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+FONT_DIR_CHECK_INTERVAL = 5.0  # 秒
+_COVERAGE_FONT_SIZE = 32
+_NOTDEF_PROBE = "\U0010FFFD"  # 私用区码位，字体中不会有这个字形，用来得到 .notdef 字形
+
+
+class FontInfo(NamedTuple):
+    family: str     # 字体家族（设置中的 font_family，即文件名去掉扩展名）
+    file_name: str  # 字体文件名（load_font_cached 使用）
+    path: str
+    size_bytes: int
+    mtime: float
+
+
+class _FontRegistry:
+    """字体家族 -> 字体文件"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fonts: Dict[str, FontInfo] = {}
+        self._dir_mtimes: Tuple[Tuple[str, float], ...] = ()
+        self._checked_at = 0.0
+        self._built = False
+        self._warned = set()
+        # (字体路径, 修改时间) -> (字体内部名称, 样式)；(字体路径, 修改时间, 码位) -> 是否有字形
+        self._names: Dict[Tuple[str, float], Tuple[str, str]] = {}
+        self._glyphs: Dict[Tuple[str, float, int], bool] = {}
+        self._coverage_fonts: Dict[str, object] = {}
+
+    @staticmethod
+    def _font_dirs() -> List[str]:
+        """与 path_utils.get_available_fonts 相同：优先程序目录下的 assets/fonts，没有字体时再用资源路径"""
+        external_dir = os.path.join(get_base_path(), "assets", "fonts")
+        resource_dir = get_resource_path(os.path.join("assets", "fonts"))
+        return [external_dir] if resource_dir == external_dir else [external_dir, resource_dir]
+
+    @staticmethod
+    def _stat_dirs(dirs: Iterable[str]) -> Tuple[Tuple[str, float], ...]:
+        mtimes = []
+        for font_dir in dirs:
+            try:
+                mtimes.append((font_dir, os.stat(font_dir).st_mtime))
+            except OSError:
+                mtimes.append((font_dir, -1.0))
+        return tuple(mtimes)
+
+    def _scan(self, dirs: List[str]) -> Dict[str, FontInfo]:
+        fonts: Dict[str, FontInfo] = {}
+        for font_dir in dirs:
+            try:
+                entries = sorted(os.scandir(font_dir), key=lambda entry: entry.name)
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.name.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                family = os.path.splitext(entry.name)[0]
+                if family in fonts:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                fonts[family] = FontInfo(family, entry.name, entry.path, stat.st_size, stat.st_mtime)
+            # 外部目录有字体时不再使用资源路径
+            if fonts:
+                break
+        return fonts
+
+    def refresh(self, force: bool = False) -> bool:
+        """目录修改时间变化（或 force）时重新扫描，返回是否重新扫描了"""
+        dirs = self._font_dirs()
+        dir_mtimes = self._stat_dirs(dirs)
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._built and not force and dir_mtimes == self._dir_mtimes:
+                return False
+            self._fonts = self._scan(dirs)
+            self._dir_mtimes = dir_mtimes
+            self._built = True
+            self._warned.clear()
+            self._coverage_fonts.clear()
+        return True
+
+    def _ensure_fresh(self):
+        if not self._built or time.monotonic() - self._checked_at > FONT_DIR_CHECK_INTERVAL:
+            self.refresh()
+
+    def get(self, family: Optional[str]) -> Optional[FontInfo]:
+        self._ensure_fresh()
+        return self._fonts.get(family) if family else None
+
+    def families(self) -> List[str]:
+        self._ensure_fresh()
+        return list(self._fonts)
+
+    def fonts(self) -> List[FontInfo]:
+        self._ensure_fresh()
+        return list(self._fonts.values())
+
+    def warn_missing(self, family: Optional[str]):
+        """同一个缺失的字体家族只提示一次（重新扫描后重置）"""
+        if family in self._warned:
+            return
+        self._warned.add(family)
+        print(f"字体家族 {family} 不在可用字体列表中")
+
+    def _coverage_font(self, info: FontInfo):
+        from PIL import ImageFont
+
+        font = self._coverage_fonts.get(info.path)
+        if font is None:
+            font = ImageFont.truetype(info.path, size=_COVERAGE_FONT_SIZE)
+            self._coverage_fonts[info.path] = font
+        return font
+
+    def get_font_name(self, info: FontInfo) -> Tuple[str, str]:
+        """字体文件内部记录的 (名称, 样式)"""
+        key = (info.path, info.mtime)
+        names = self._names.get(key)
+        if names is None:
+            try:
+                names = tuple(self._coverage_font(info).getname())
+            except OSError as e:
+                print(f"读取字体信息失败 {info.file_name}: {e}")
+                names = (info.family, "")
+            self._names[key] = names
+        return names
+
+    def has_glyphs(self, info: FontInfo, text: str) -> Dict[str, bool]:
+        """逐字检查字体是否包含字形（字形与 .notdef 相同视为缺字；空白字符视为包含）"""
+        font = self._coverage_font(info)
+        notdef = None
+        result = {}
+        for ch in dict.fromkeys(text):
+            key = (info.path, info.mtime, ord(ch))
+            covered = self._glyphs.get(key)
+            if covered is None:
+                if ch.isspace():
+                    covered = True
+                else:
+                    if notdef is None:
+                        notdef = _glyph_signature(font, _NOTDEF_PROBE)
+                    covered = _glyph_signature(font, ch) != notdef
+                self._glyphs[key] = covered
+            result[ch] = covered
+        return result
+
+
+def _glyph_signature(font, ch: str) -> tuple:
+    mask = font.getmask(ch)
+    return font.getbbox(ch), font.getlength(ch), bytes(mask) if mask.size[0] else b""
+
+
+_registry = _FontRegistry()
+
+
+def refresh_font_registry(force: bool = True) -> bool:
+    """重新扫描字体目录（设置改变时调用）"""
+    return _registry.refresh(force)
+
+
+def list_font_families() -> List[str]:
+    """可用的字体家族（文件名去掉扩展名）"""
+    return _registry.families()
+
+
+def get_font_info(family: Optional[str]) -> Optional[FontInfo]:
+    return _registry.get(family)
+
+
+def find_font_file(family: Optional[str]) -> Optional[str]:
+    """字体家族对应的字体文件名，不存在时返回None"""
+    info = _registry.get(family)
+    return info.file_name if info else None
+
+
+def warn_missing_font(family: Optional[str]):
+    _registry.warn_missing(family)
+
+
+def get_font_metadata(family: str) -> Optional[dict]:
+    """字体元数据：文件、大小、字体内部名称和样式"""
+    info = _registry.get(family)
+    if info is None:
+        return None
+    name, style = _registry.get_font_name(info)
+    return {
+        "family": info.family,
+        "file_name": info.file_name,
+        "path": info.path,
+        "size_bytes": info.size_bytes,
+        "mtime": info.mtime,
+        "name": name,
+        "style": style,
+    }
+
+
+def get_glyph_coverage(family: str, text: str) -> Tuple[float, str]:
+    """返回 (text 中有字形的字符比例, 缺字的字符)；字体不存在时返回 (0.0, 全部字符)"""
+    chars = "".join(dict.fromkeys(text))
+    if not chars:
+        return 1.0, ""
+    info = _registry.get(family)
+    if info is None:
+        return 0.0, chars
+    covered = _registry.has_glyphs(info, chars)
+    missing = "".join(ch for ch, ok in covered.items() if not ok)
+    return (len(chars) - len(missing)) / len(chars), missing
@@ -0,0 +1,160 @@
+"""图片生成工作线程模块 - 单个常驻线程按顺序处理生成请求，支持排队策略和取消
+
+排队策略（settings.yml 中 generation.policy）:
+    drop:   正在生成或已有排队请求时直接丢弃新请求（默认，与以前的行为一致）
+    queue:  按顺序排队，队列满（generation.max_queue）时丢弃新请求
+    latest: 新请求到来时取消正在进行和排队中的请求，只处理最新的一个
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from trace_utils import trace_span
+
+POLICY_DROP = "drop"
+POLICY_QUEUE = "queue"
+POLICY_LATEST = "latest"
+POLICIES = (POLICY_DROP, POLICY_QUEUE, POLICY_LATEST)
+
+
+class GenerationRequest:
+    """一次生成请求，记录各阶段时间点，cancel_event 被设置后处理函数应尽快放弃"""
+
+    def __init__(self, request_id: int):
+        self.id = request_id
+        self.cancel_event = threading.Event()
+        self.submitted_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """排队等待和执行耗时（毫秒）"""
+        timings = {}
+        if self.started_at is not None:
+            timings["queued_ms"] = (self.started_at - self.submitted_at) * 1000
+            if self.finished_at is not None:
+                timings["run_ms"] = (self.finished_at - self.started_at) * 1000
+        return timings
+
+
+class GenerationWorker:
+    """常驻生成线程
+
+    handler(cancel_event) 在工作线程中执行并返回状态消息；
+    on_complete(request) 在工作线程中回调，GUI 需要自行切回主线程。
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[threading.Event], str],
+        on_complete: Optional[Callable[[GenerationRequest], None]] = None,
+        policy: str = POLICY_DROP,
+        max_queue: int = 4,
+    ):
+        if policy not in POLICIES:
+            print(f"未知的生成排队策略 {policy}，使用 {POLICY_DROP}")
+            policy = POLICY_DROP
+        self.handler = handler
+        self.on_complete = on_complete
+        self.policy = policy
+        self.max_queue = max(1, max_queue)
+
+        self._cond = threading.Condition()
+        self._queue: Deque[GenerationRequest] = deque()
+        self._current: Optional[GenerationRequest] = None
+        self._next_id = 1
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_busy(self) -> bool:
+        with self._cond:
+            return self._current is not None or bool(self._queue)
+
+    def submit(self) -> Optional[GenerationRequest]:
+        """提交一次生成请求，按策略被丢弃时返回None"""
+        with self._cond:
+            if self._stopped:
+                return None
+            busy = self._current is not None or bool(self._queue)
+
+            if self.policy == POLICY_DROP and busy:
+                return None
+            if self.policy == POLICY_QUEUE and len(self._queue) >= self.max_queue:
+                return None
+            if self.policy == POLICY_LATEST:
+                self._cancel_locked()
+
+            request = GenerationRequest(self._next_id)
+            self._next_id += 1
+            self._queue.append(request)
+            self._ensure_thread()
+            self._cond.notify()
+            return request
+
+    def cancel_all(self):
+        """取消正在进行和排队中的请求"""
+        with self._cond:
+            self._cancel_locked()
+
+    def _cancel_locked(self):
+        if self._current is not None:
+            self._current.cancel()
+        for request in self._queue:
+            request.cancel()
+
+    def stop(self, timeout: Optional[float] = None):
+        with self._cond:
+            self._stopped = True
+            self._cancel_locked()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="generation-worker", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                request = self._queue.popleft()
+                self._current = request
+
+            request.started_at = time.perf_counter()
+            if request.cancelled:
+                request.result = "生成已取消"
+            else:
+                with trace_span("request", id=request.id) as span:
+                    span.set(queued_ms=round(request.timings["queued_ms"], 1))
+                    try:
+                        request.result = self.handler(request.cancel_event)
+                    except Exception as e:
+                        request.result = f"生成失败: {str(e)}"
+                        print(request.result)
+            request.finished_at = time.perf_counter()
+
+            with self._cond:
+                self._current = None
+
+            if self.on_complete is not None:
+                try:
+                    self.on_complete(request)
+                except Exception as e:
+                    print(f"生成完成回调失败: {e}")
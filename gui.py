@@ -2,13 +2,12 @@
 
 import tkinter as tk
 from tkinter import ttk
-import threading
 
 from core import ManosabaCore
+from generation_worker import GenerationWorker
 from gui_settings import SettingsWindow
 from gui_hotkeys import HotkeyManager
 from gui_components import PreviewManager, StatusManager
-from load_utils import get_preload_manager
 from config import CONFIGS
 
 class ManosabaGUI:
@@ -30,8 +29,14 @@ class ManosabaGUI:
         self.preview_manager = PreviewManager(self)
         self.status_manager = StatusManager(self)
 
-        # 图片生成状态
-        self.is_generating = False
+        # 图片生成：单个常驻线程，按设置中的策略处理连续按下的生成热键
+        generation_settings = CONFIGS.gui_settings.get("generation", {})
+        self.generation_worker = GenerationWorker(
+            self.core.generate_image,
+            on_complete=lambda request: self.root.after(0, lambda: self.on_generation_complete(request.result)),
+            policy=generation_settings.get("policy", "drop"),
+            max_queue=generation_settings.get("max_queue", 4),
+        )
 
         self.setup_gui()
         self.root.bind("<Configure>", self.on_window_resize)
@@ -433,26 +438,10 @@ class ManosabaGUI:
 
     def generate_image(self):
         """生成图片"""
-        if self.is_generating:
+        if self.generation_worker.submit() is None:
             return
-        
-        # 设置生成状态
-        self.is_generating = True
         self.status_manager.update_status("正在生成图片...")
 
-        def generate_in_thread():
-            try:
-                result = self.core.generate_image()
-                self.root.after(0, lambda: self.on_generation_complete(result))
-            except Exception as e:
-                error_msg = f"生成失败: {str(e)}"
-                print(error_msg)
-                self.root.after(0, lambda: self.on_generation_complete(error_msg))
-            finally:
-                self.is_generating = False
-        thread = threading.Thread(target=generate_in_thread, daemon=True)
-        thread.start()
-
     def on_generation_complete(self, result):
         """生成完成后的回调函数"""
         self.status_manager.update_status(result)
@@ -464,7 +453,11 @@ class ManosabaGUI:
 
     def run(self):
         """运行 GUI"""
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            # 退出时停止后台线程，立即保存还在等待延迟保存的时间配置
+            self.core.shutdown()
 
 
 if __name__ == "__main__":
@@ -65,6 +65,11 @@ class PreviewManager:
             self._resize_and_update_preview(self.preview_image)
             
 
+    def show_image(self, image: Image.Image):
+        """直接显示给定图片（如设置窗口的文字颜色预览），不改变预览信息"""
+        self.preview_image = image
+        self._resize_and_update_preview(self.preview_image)
+
     def update_preview(self):
         """更新预览"""
         try:
@@ -2,9 +2,7 @@
 
 import threading
 import time
-from pynput import keyboard
-from pynput.keyboard import Key, KeyCode, Controller, HotKey
-from load_utils import clear_cache
+from profile_utils import arm_profiling
 from config import CONFIGS
 
 
@@ -18,27 +16,6 @@ class HotkeyManager:
         self._listener = None  # 全局热键监听器
         self._hotkey_handlers = {}  # 存储热键处理函数
         self._active = True  # 是否启用热键监听
-        self._keyboard = Controller()  # 用于模拟按键
-        
-        # 特殊键映射
-        self._special_keys = {
-            Key.ctrl: "<ctrl>",
-            Key.ctrl_l: "<ctrl>",
-            Key.ctrl_r: "<ctrl>",
-            Key.alt: "<alt>",
-            Key.alt_l: "<alt>", 
-            Key.alt_r: "<alt>",
-            Key.shift: "<shift>",
-            Key.shift_l: "<shift>",
-            Key.shift_r: "<shift>",
-            Key.cmd: "<cmd>",
-            Key.cmd_l: "<cmd>",
-            Key.cmd_r: "<cmd>",
-            Key.space: "<space>",
-            Key.enter: "<enter>",
-            Key.esc: "<esc>",
-            Key.tab: "<tab>",
-        }
 
     def setup_hotkeys(self):
         """设置热键监听"""
@@ -141,6 +118,9 @@ class HotkeyManager:
                 self.gui.root.after(0, lambda: self.switch_background(1))
             elif action == "prev_background":
                 self.gui.root.after(0, lambda: self.switch_background(-1))
+            elif action == "profile_next":
+                count = arm_profiling()
+                self.gui.root.after(0, lambda: self.gui.update_status(f"将记录接下来 {count} 次发送的性能分析"))
             elif action.startswith("character_") and action in quick_chars:
                 char_id = quick_chars.get(action)
                 self.gui.root.after(0, lambda c=char_id: self.switch_to_character_by_id(c))
@@ -164,7 +144,9 @@ class HotkeyManager:
             return
         
         try:
-            # 启动全局热键监听器
+            # 启动全局热键监听器（pynput 在这里才导入，此时首个预览已经生成）
+            from pynput import keyboard
+
             self._listener = keyboard.GlobalHotKeys(self._hotkey_handlers)
             self._listener.daemon = True
             self._listener.start()
@@ -242,7 +224,7 @@ class HotkeyManager:
 
     def _handle_character_switch_success(self):
         """处理角色切换成功后的通用操作"""
-        clear_cache("character")
+        self.core.engine.clear_caches("character")
         self.gui.character_var.set(
             f"{CONFIGS.get_character(full_name=True)} ({CONFIGS.get_character()})"
         )
@@ -3,10 +3,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
-import os
 import re
-from path_utils import get_available_fonts
-from config import CONFIGS
+from font_utils import list_font_families, refresh_font_registry
+from config import CONFIGS, DEFAULT_BRACKET_COLOR, DEFAULT_TEXT_COLOR
 
 
 class SettingsWindow:
@@ -16,6 +15,7 @@ class SettingsWindow:
         self.parent = parent
         self.core = core
         self.gui = gui
+        self._text_preview_job = None  # 文字颜色实时预览的延迟任务
 
         # 创建窗口
         self.window = tk.Toplevel(parent)
@@ -121,7 +121,7 @@ class SettingsWindow:
         color_frame.grid(row=3, column=1, sticky=(tk.W, tk.E), pady=5, padx=5)
         
         self.text_color_var = tk.StringVar(
-            value=CONFIGS.gui_settings.get("text_color", "#FFFFFF")
+            value=CONFIGS.gui_settings.get("text_color", DEFAULT_TEXT_COLOR)
         )
         color_entry = ttk.Entry(
             color_frame,
@@ -157,7 +157,7 @@ class SettingsWindow:
         bracket_color_frame.grid(row=4, column=1, sticky=(tk.W, tk.E), pady=5, padx=5)
         
         self.bracket_color_var = tk.StringVar(
-            value=CONFIGS.gui_settings.get("bracket_color", "#EF4F54")
+            value=CONFIGS.gui_settings.get("bracket_color", DEFAULT_BRACKET_COLOR)
         )
         bracket_color_entry = ttk.Entry(
             bracket_color_frame,
@@ -414,6 +414,13 @@ class SettingsWindow:
             hotkeys.get("toggle_listener", "alt+ctrl+p"),
             0,
         )
+        self._create_hotkey_editable_row(
+            control_frame,
+            "记录接下来几次发送的性能分析",
+            "profile_next",
+            hotkeys.get("profile_next", "alt+ctrl+f"),
+            1,
+        )
 
         # 角色快速选择快捷键
         quick_char_frame = ttk.LabelFrame(
@@ -734,16 +741,8 @@ class SettingsWindow:
 
     def _get_available_fonts(self):
         """获取可用字体列表，优先显示项目字体"""
-        font_files = get_available_fonts()
-        project_fonts = []
-
-        # 直接从路径中提取字体文件名（不含扩展名）
-        for font_path in font_files:
-            if font_path:
-                # 获取文件名（不含路径和扩展名）
-                font_name = os.path.splitext(os.path.basename(font_path))[0]
-                project_fonts.append(font_name)
-        return project_fonts
+        # 字体家族即字体文件名（不含扩展名），由字体注册表提供
+        return list_font_families()
 
     def _on_setting_changed(self, event=None):
         """设置改变时的回调"""
@@ -829,6 +828,8 @@ class SettingsWindow:
 
         # 保存设置到文件
         CONFIGS.save_gui_settings()
+        # 重新扫描字体目录（用户可能刚放入新字体）
+        refresh_font_registry()
         self._save_whitelist_settings()
         success = self._save_hotkey_settings()
 
@@ -854,7 +855,7 @@ class SettingsWindow:
         
         # 收集普通快捷键 - 修复：使用正确的变量名
         for key in ['start_generate', 'next_character', 'prev_character', 'next_emotion', 'prev_emotion', 
-                    'next_background', 'prev_background', 'toggle_listener']:
+                    'next_background', 'prev_background', 'toggle_listener', 'profile_next']:
             var_name = f"{key}_hotkey_var"
             if hasattr(self, var_name):
                 hotkey_var = getattr(self, var_name)
@@ -895,6 +896,7 @@ class SettingsWindow:
         if self._validate_color_format(color_value):
             # 更新预览标签背景色
             self.color_preview_label.configure(background=color_value)
+            self._schedule_text_preview()
         else:
             # 如果颜色格式无效，显示默认颜色（保持原样，不更新）
             pass  # 不更新预览，保持之前的状态
@@ -906,10 +908,26 @@ class SettingsWindow:
         if self._validate_color_format(color_value):
             # 更新预览标签背景色
             self.bracket_color_preview_label.configure(background=color_value)
+            self._schedule_text_preview()
         else:
             # 如果颜色格式无效，显示默认颜色（保持原样，不更新）
             pass  # 不更新预览，保持之前的状态
 
+    def _schedule_text_preview(self):
+        """颜色修改后在主窗口实时预览文字效果（连续输入时合并为一次，只重新绘制文字图层）"""
+        if self._text_preview_job is not None:
+            self.window.after_cancel(self._text_preview_job)
+        self._text_preview_job = self.window.after(150, self._show_text_preview)
+
+    def _show_text_preview(self):
+        self._text_preview_job = None
+        # 颜色变量的回调先于 _on_setting_changed 执行，这里同步一次确保使用最新颜色
+        self._on_setting_changed()
+        try:
+            self.gui.preview_manager.show_image(self.core.generate_text_preview())
+        except Exception as e:
+            print(f"文字预览失败: {e}")
+
     def _validate_color_format(self, color_value):
         """验证颜色格式是否为有效的十六进制颜色"""
         pattern = r'^#([A-Fa-f0-9]{6})$'
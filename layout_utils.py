@@ -0,0 +1,283 @@
+"""富文本排版模块 - 一次分词得到带颜色角色的文本段，测量换行和绘制共用同一份结果"""
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import ImageFont
+
+from emoji_utils import tokenize_emoji
+
+# 颜色角色
+ROLE_TEXT = 0      # 普通文本
+ROLE_BRACKET = 1   # 强调文本（成对括号及其内容）
+
+# 保留括号定义
+bracket_pairs = {
+    "[": "]",
+    "【": "】",
+    "〔": "〕",
+    "‘": "’",
+    "「": "」",
+    "｢": "｣",
+    "『": "』",
+    "〖": "〗",
+    "<": ">",
+    "《": "》",
+    "〈": "〉",
+    "“": "”",
+    '"': '"',
+}
+_closing_brackets = frozenset(bracket_pairs.values())
+
+
+class TextRun(NamedTuple):
+    """同一颜色角色的连续文本，或单个emoji"""
+    text: str                    # 原文
+    emoji: Optional[str] = None  # emoji资源序列，普通文本为None
+    role: int = ROLE_TEXT        # 颜色角色
+    advance: float = 0           # 步进宽度（排版后才有值）
+
+
+class TextLayout(NamedTuple):
+    """某一字号下的排版结果"""
+    font: ImageFont.FreeTypeFont
+    size: int
+    lines: List[List[TextRun]]
+    line_widths: List[int]
+    width: int
+    height: int
+    line_height: int
+
+
+def _bracket_roles(units: List[Tuple[str, Optional[str]]]) -> List[int]:
+    """对整段文本做括号配对，只有成功配对的括号及其内容标记为强调"""
+    n = len(units)
+    delta = [0] * (n + 1)
+    stack: List[Tuple[str, int]] = []
+
+    for i, (ch, asset) in enumerate(units):
+        if asset is not None:
+            continue
+        if ch in bracket_pairs and not (bracket_pairs[ch] == ch and stack and stack[-1][0] == ch):
+            stack.append((ch, i))
+        elif ch in _closing_brackets:
+            # 从栈顶往下找对应的左括号，中间未闭合的左括号按普通字符处理
+            for depth in range(len(stack) - 1, -1, -1):
+                if bracket_pairs[stack[depth][0]] == ch:
+                    start = stack[depth][1]
+                    del stack[depth:]
+                    delta[start] += 1
+                    delta[i + 1] -= 1
+                    break
+
+    roles = []
+    level = 0
+    for i in range(n):
+        level += delta[i]
+        roles.append(ROLE_BRACKET if level > 0 else ROLE_TEXT)
+    return roles
+
+
+def build_runs(text: str) -> List[List[TextRun]]:
+    """把文本切分成段落，每个段落是 TextRun 列表（括号配对跨段落进行）"""
+    units: List[Tuple[str, Optional[str]]] = []
+    for segment, asset in tokenize_emoji(text.replace("\r\n", "\n").replace("\r", "\n")):
+        if asset is None:
+            units.extend((ch, None) for ch in segment)
+        else:
+            units.append((segment, asset))
+
+    roles = _bracket_roles(units)
+
+    paragraphs: List[List[TextRun]] = [[]]
+    chars: List[str] = []
+    chars_role = ROLE_TEXT
+    for (ch, asset), role in zip(units, roles):
+        if asset is None and ch != "\n" and (not chars or role == chars_role):
+            chars.append(ch)
+            chars_role = role
+            continue
+        if chars:
+            paragraphs[-1].append(TextRun("".join(chars), None, chars_role))
+            chars = []
+        if asset is not None:
+            paragraphs[-1].append(TextRun(ch, asset, role))
+        elif ch == "\n":
+            paragraphs.append([])
+        else:
+            chars, chars_role = [ch], role
+    if chars:
+        paragraphs[-1].append(TextRun("".join(chars), None, chars_role))
+    # 与 str.splitlines() 一致：末尾的一个换行不产生空段落
+    if len(paragraphs) > 1 and not paragraphs[-1]:
+        paragraphs.pop()
+    return paragraphs
+
+
+def count_units(paragraphs: List[List[TextRun]]) -> int:
+    """文本长度（emoji按一个字符计）"""
+    return sum(1 if run.emoji else len(run.text) for para in paragraphs for run in para)
+
+
+def _wrap_paragraph(
+    units: List[Tuple[str, Optional[str], int]],
+    measure: Callable[[str, Optional[str]], float],
+    max_w: int,
+) -> List[List[Tuple[str, Optional[str], int]]]:
+    """贪心换行：段落中有空格时按单词换行（过长的单词再按字符拆开），否则按字符换行"""
+    if not units:
+        return [[]]
+
+    has_space = any(u[0] == " " and u[1] is None for u in units)
+    if has_space:
+        atoms: List[List[Tuple[str, Optional[str], int]]] = [[]]
+        separators = []
+        for u in units:
+            if u[0] == " " and u[1] is None:
+                separators.append(u)
+                atoms.append([])
+            else:
+                atoms[-1].append(u)
+    else:
+        atoms = [[u] for u in units]
+        separators = []
+
+    lines = []
+    line: List[Tuple[str, Optional[str], int]] = []
+    line_w = 0.0
+
+    for idx, atom in enumerate(atoms):
+        sep = separators[idx - 1] if has_space and idx > 0 and line else None
+        sep_w = measure(sep[0], None) if sep else 0
+        atom_w = sum(measure(u[0], u[1]) for u in atom)
+
+        if line_w + sep_w + atom_w <= max_w:
+            if sep:
+                line.append(sep)
+            line.extend(atom)
+            line_w += sep_w + atom_w
+            continue
+
+        if line:
+            lines.append(line)
+            line, line_w = [], 0.0
+            if atom_w <= max_w:
+                line, line_w = list(atom), atom_w
+                continue
+
+        # 空行也放不下：按字符拆开，每行至少放一个字符
+        for u in atom:
+            u_w = measure(u[0], u[1])
+            if line and line_w + u_w > max_w:
+                lines.append(line)
+                line, line_w = [], 0.0
+            line.append(u)
+            line_w += u_w
+
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _merge_units(units: List[Tuple[str, Optional[str], int]], measure) -> List[TextRun]:
+    """把一行的字符重新合并为同角色的 TextRun，并记录步进宽度"""
+    runs: List[TextRun] = []
+    chars: List[str] = []
+    advance = 0.0
+    role = ROLE_TEXT
+
+    for ch, asset, unit_role in units:
+        if chars and (asset is not None or unit_role != role):
+            runs.append(TextRun("".join(chars), None, role, advance))
+            chars, advance = [], 0.0
+        if asset is not None:
+            runs.append(TextRun(ch, asset, unit_role, measure(ch, asset)))
+        else:
+            chars.append(ch)
+            advance += measure(ch, None)
+            role = unit_role
+    if chars:
+        runs.append(TextRun("".join(chars), None, role, advance))
+    return runs
+
+
+def _paragraph_units(para: List[TextRun]) -> List[Tuple[str, Optional[str], int]]:
+    """段落 -> 换行用的最小单位（单个字符或单个emoji）"""
+    units = []
+    for run in para:
+        if run.emoji is not None:
+            units.append((run.text, run.emoji, run.role))
+        else:
+            units.extend((ch, None, run.role) for ch in run.text)
+    return units
+
+
+def _layout_units(
+    para_units: List[List[Tuple[str, Optional[str], int]]],
+    font: ImageFont.FreeTypeFont,
+    size: int,
+    max_w: int,
+    line_spacing: float,
+) -> TextLayout:
+    advance_cache: Dict[str, float] = {}
+
+    def measure(ch: str, asset: Optional[str]) -> float:
+        if asset is not None:
+            return size
+        w = advance_cache.get(ch)
+        if w is None:
+            w = advance_cache[ch] = font.getlength(ch)
+        return w
+
+    ascent, descent = font.getmetrics()
+    line_h = int((ascent + descent) * (1 + line_spacing))
+
+    lines: List[List[TextRun]] = []
+    widths: List[int] = []
+    for units in para_units:
+        for line_units in _wrap_paragraph(units, measure, max_w):
+            runs = _merge_units(line_units, measure)
+            lines.append(runs)
+            widths.append(int(sum(r.advance for r in runs)))
+
+    total_h = max(line_h * max(1, len(lines)), 1)
+    return TextLayout(font, size, lines, widths, max(widths, default=0), total_h, line_h)
+
+
+def layout_runs(
+    paragraphs: List[List[TextRun]],
+    font: ImageFont.FreeTypeFont,
+    size: int,
+    max_w: int,
+    line_spacing: float = 0.15,
+) -> TextLayout:
+    """按给定字体排版，emoji宽度等于字号"""
+    para_units = [_paragraph_units(para) for para in paragraphs]
+    return _layout_units(para_units, font, size, max_w, line_spacing)
+
+
+def fit_runs(
+    paragraphs: List[List[TextRun]],
+    load_font: Callable[[int], ImageFont.FreeTypeFont],
+    max_w: int,
+    max_h: int,
+    max_size: Optional[int] = None,
+    line_spacing: float = 0.15,
+) -> TextLayout:
+    """二分搜索能放进 max_w x max_h 的最大字号，放不下时退回1号字"""
+    para_units = [_paragraph_units(para) for para in paragraphs]
+    lo = 1
+    hi = min(max_h, max_size) if max_size else max_h
+    best: Optional[TextLayout] = None
+
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        layout = _layout_units(para_units, load_font(mid), mid, max_w, line_spacing)
+        if layout.width <= max_w and layout.height <= max_h:
+            best = layout
+            lo = mid + 1
+        else:
+            hi = mid - 1
+
+    if best is None:
+        best = _layout_units(para_units, load_font(1), 1, max_w, line_spacing)
+    return best
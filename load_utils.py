@@ -1,21 +1,63 @@
 """文件加载工具"""
+import io
 import os
 import threading
 import queue
-from PIL import ImageFont, Image
-from typing import Callable, Dict, Any, Optional
+from collections import OrderedDict
+from PIL import ImageFont, Image, ImageDraw
+from typing import Callable, Dict, Any, Optional, Tuple
 
 from path_utils import get_resource_path
 from config import CONFIGS
+from emoji_atlas import get_emoji_atlas
 
 # 字体缓存
 _font_cache = {}
+_glyph_cache = OrderedDict()  # 字形缓存 (字体文件, 字号, 码位) -> (覆盖率蒙版, 偏移, 步进)（LRU）
+_GLYPH_CACHE_LIMIT = 2048
 
 # 图片缓存
 _background_cache = {}  # 背景图片缓存（长期缓存）
 _character_cache = {}   # 角色图片缓存（可释放）
 _general_image_cache = {}  # 通用图片缓存
 
+# emoji缓存
+_emoji_source_cache = {}  # (emoji序列, mip尺寸) -> 解码后的原始图片（缺失的资源记为None）
+_emoji_sized_cache = OrderedDict()  # (emoji序列, 尺寸) -> 缩放后的图片（LRU）
+_EMOJI_SIZED_CACHE_LIMIT = 256
+
+# 内容图片缓存 (内容哈希, 目标尺寸) -> 缩放后的图片（LRU）
+_content_image_cache = OrderedDict()
+_CONTENT_IMAGE_CACHE_LIMIT = 8
+
+# 内容图层缓存 (绘制参数) -> 裁剪后的文字/图片图层（LRU）
+_content_layer_cache = OrderedDict()
+_CONTENT_LAYER_CACHE_LIMIT = 4
+
+# clear_cache 时一并清理的派生缓存: (缓存类型, 清理函数)
+_cache_clear_hooks: list = []
+
+# 上面的 LRU 缓存会被渲染服务的多个线程同时访问，查找/插入/淘汰都在这个锁里进行（绘制不持有锁）
+_lru_lock = threading.Lock()
+
+
+def _lru_get(cache: OrderedDict, key):
+    """LRU 查找，命中时移到末尾，未命中返回None"""
+    with _lru_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _lru_put(cache: OrderedDict, key, value, limit: int):
+    """LRU 插入，超出 limit 时淘汰最久未使用的条目"""
+    with _lru_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
 
 # 预加载状态管理类
 class PreloadManager:
@@ -33,13 +75,20 @@ class PreloadManager:
         self._has_work = threading.Event()    # 有工作需要处理的信号
         self._task_queue = queue.Queue(maxsize=1)  # 任务队列，最多存储1个任务
         
-        # 启动工作线程
-        self._worker_thread = threading.Thread(
-            target=self._preload_worker, 
-            daemon=True,
-            name="PreloadWorker"
-        )
-        self._worker_thread.start()
+        # 工作线程在第一次提交预加载任务时才启动
+        self._worker_thread = None
+
+    def _ensure_worker(self):
+        """启动工作线程（已启动时什么也不做）"""
+        with self._lock:
+            if self._worker_thread is None or not self._worker_thread.is_alive():
+                self._should_stop.clear()
+                self._worker_thread = threading.Thread(
+                    target=self._preload_worker,
+                    daemon=True,
+                    name="PreloadWorker"
+                )
+                self._worker_thread.start()
     
     def set_update_callback(self, callback: Callable[[str], None]):
         """设置状态更新回调"""
@@ -121,7 +170,8 @@ class PreloadManager:
                     ))
                 
                 # 预加载到缓存
-                load_character_safe(overlay_path, emotion_index=emotion_index)
+                load_character_safe(overlay_path, emotion_index=emotion_index,
+                                    character_meta=CONFIGS.mahoshojo[character_name])
                 
                 # 更新已加载项目数
                 with self._lock:
@@ -144,6 +194,7 @@ class PreloadManager:
     
     def preload_character_images_async(self, character_name: str) -> bool:
         """异步预加载指定角色的所有表情图片"""
+        self._ensure_worker()
         try:
             # 清空队列中的旧任务（如果有）
             while not self._task_queue.empty():
@@ -162,45 +213,50 @@ class PreloadManager:
             self.update_status(f"预加载任务队列已满，无法提交 {character_name}")
             return False
 
-    def preload_backgrounds_async(self):
-        """异步预加载所有背景图片"""
-        def preload_task():
-            try:
-                self.update_status("正在预加载背景图片...")
-                background_count = CONFIGS.background_count
+    def preload_character_images(self, character_name: str):
+        """同步预加载指定角色的所有表情图片（在调用线程中执行）"""
+        self._preload_character_task(character_name)
+
+    def preload_backgrounds(self):
+        """同步预加载所有背景图片（在调用线程中执行）"""
+        try:
+            self.update_status("正在预加载背景图片...")
+            background_count = CONFIGS.background_count
+            
+            for background_index in range(1, background_count + 1):
+                # 尝试加载多种格式的背景图片
+                background_path = None
                 
-                for background_index in range(1, background_count + 1):
-                    # 尝试加载多种格式的背景图片
-                    background_path = None
-                    
-                    # 支持的图片格式列表
-                    supported_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp']
-                    
-                    for ext in supported_formats:
-                        # 尝试构建不同格式的路径
-                        test_path = get_resource_path(os.path.join("assets", "background", f"c{background_index}{ext}"))
-                        if os.path.exists(test_path):
-                            background_path = test_path
-                            break
-                    
-                    if background_path:
-                        load_background_safe(background_path)
-                    else:
-                        # 如果所有格式都不存在，尝试默认png格式（保持向后兼容）
-                        default_path = get_resource_path(os.path.join("assets", "background", f"c{background_index}.png"))
-                        load_background_safe(default_path)
-                    
-                    # 实时更新进度
-                    progress = background_index / background_count
-                    if background_index % 5 == 0 or background_index == background_count:
-                        self.update_status(f"预加载背景: {background_index}/{background_count} ({progress:.0%})")
+                # 支持的图片格式列表
+                supported_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp']
                 
-                self.update_status("背景图片预加载完成")
-            except Exception as e:
-                self.update_status(f"背景图片预加载失败: {str(e)}")
-        
+                for ext in supported_formats:
+                    # 尝试构建不同格式的路径
+                    test_path = get_resource_path(os.path.join("assets", "background", f"c{background_index}{ext}"))
+                    if os.path.exists(test_path):
+                        background_path = test_path
+                        break
+                
+                if background_path:
+                    load_background_safe(background_path)
+                else:
+                    # 如果所有格式都不存在，尝试默认png格式（保持向后兼容）
+                    default_path = get_resource_path(os.path.join("assets", "background", f"c{background_index}.png"))
+                    load_background_safe(default_path)
+                
+                # 实时更新进度
+                progress = background_index / background_count
+                if background_index % 5 == 0 or background_index == background_count:
+                    self.update_status(f"预加载背景: {background_index}/{background_count} ({progress:.0%})")
+            
+            self.update_status("背景图片预加载完成")
+        except Exception as e:
+            self.update_status(f"背景图片预加载失败: {str(e)}")
+
+    def preload_backgrounds_async(self):
+        """异步预加载所有背景图片"""
         # 在后台线程中执行预加载
-        preload_thread = threading.Thread(target=preload_task, daemon=True)
+        preload_thread = threading.Thread(target=self.preload_backgrounds, daemon=True)
         preload_thread.start()
     
     def get_preload_progress(self) -> float:
@@ -235,15 +291,21 @@ class PreloadManager:
     def stop_worker(self):
         """停止工作线程（通常在程序退出时调用）"""
         self._should_stop.set()
-        if self._worker_thread.is_alive():
+        if self._worker_thread is not None and self._worker_thread.is_alive():
             self._worker_thread.join(timeout=1.0)
 
-# 创建全局预加载管理器实例
-_preload_manager = PreloadManager()
+# 全局预加载管理器实例（第一次获取时创建）
+_preload_manager: Optional[PreloadManager] = None
+_preload_manager_lock = threading.Lock()
 
 # 简化后的函数定义
 def get_preload_manager() -> PreloadManager:
     """获取预加载管理器实例"""
+    global _preload_manager
+    if _preload_manager is None:
+        with _preload_manager_lock:
+            if _preload_manager is None:
+                _preload_manager = PreloadManager()
     return _preload_manager
 
 
@@ -271,6 +333,114 @@ def load_font_cached(font_name: str, size: int) -> ImageFont.FreeTypeFont:
     return _font_cache[cache_key]
 
 
+def load_glyph_cached(font: ImageFont.FreeTypeFont, char: str) -> Tuple[Optional[Image.Image], Tuple[int, int], float]:
+    """获取单个字形的覆盖率蒙版(L模式)，返回 (蒙版, 相对绘制原点的偏移, 步进宽度)，空白字形蒙版为None"""
+    cache_key = (getattr(font, "path", None) or id(font), getattr(font, "size", 0), ord(char))
+    glyph = _lru_get(_glyph_cache, cache_key)
+    if glyph is None:
+        advance = font.getlength(char)
+        left, top, right, bottom = font.getbbox(char)
+        if right > left and bottom > top:
+            # 只光栅化一次，后续绘制直接复用蒙版
+            mask = Image.new("L", (right - left, bottom - top), 0)
+            ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+            glyph = (mask, (left, top), advance)
+        else:
+            glyph = (None, (0, 0), advance)
+        _lru_put(_glyph_cache, cache_key, glyph, _GLYPH_CACHE_LIMIT)
+    return glyph
+
+
+def _get_emoji_filename(seq: str) -> str:
+    return "emoji_u" + "_".join(f"{ord(c):x}" for c in seq) + ".png"
+
+def _load_emoji_source(seq: str, size: int) -> Optional[Image.Image]:
+    """加载emoji原始图片，找不到完整序列时退回首字符，结果（包括缺失）都会缓存
+
+    有图集时从内存映射的图集中切出不小于目标尺寸的最小mip，否则读取散装PNG
+    """
+    atlas = get_emoji_atlas()
+    mip = atlas.pick_mip(size) if atlas is not None else 0
+    cache_key = (seq, mip)
+    if cache_key in _emoji_source_cache:
+        return _emoji_source_cache[cache_key]
+
+    emoji_img = None
+    try:
+        if atlas is not None:
+            for candidate in (seq, seq[0]):
+                if candidate in atlas:
+                    emoji_img = atlas.load(candidate, mip)
+                    break
+        else:
+            for candidate in (seq, seq[0]):
+                emoji_path = get_resource_path(os.path.join("assets", "emoji", _get_emoji_filename(candidate)))
+                if os.path.exists(emoji_path):
+                    emoji_img = Image.open(emoji_path).convert("RGBA")
+                    break
+        if emoji_img is None:
+            print(f"[load_emoji_cached] emoji asset not found: {seq!r}")
+    except Exception as e:
+        print(f"[load_emoji_cached] 加载emoji图片失败 {seq}: {e}")
+
+    _emoji_source_cache[cache_key] = emoji_img
+    return emoji_img
+
+def load_emoji_cached(seq: str, size: int) -> Optional[Image.Image]:
+    """按 (序列, 尺寸) 获取缩放好的emoji图片，资源不存在时返回None
+
+    返回的是缓存中的共享对象，调用方只能读取（粘贴），不要修改
+    """
+    cache_key = (seq, size)
+    emoji_img = _lru_get(_emoji_sized_cache, cache_key)
+    if emoji_img is not None:
+        return emoji_img
+
+    source = _load_emoji_source(seq, size)
+    if source is None:
+        return None
+
+    if source.width != size or source.height != size:
+        emoji_img = source.resize((size, size), Image.Resampling.LANCZOS)
+    else:
+        emoji_img = source
+
+    _lru_put(_emoji_sized_cache, cache_key, emoji_img, _EMOJI_SIZED_CACHE_LIMIT)
+    return emoji_img
+
+
+def load_content_image_resized(image: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """把粘贴进来的内容图片缩放到目标尺寸
+
+    - 图片带 info["content_key"]（内容哈希）时按 (哈希, 尺寸) 缓存，重复发送同一张图不再解码和重采样
+    - JPEG 重新打开原始字节（info["content_bytes"]）后用 draft 让解码器直接按 1/2、1/4、1/8 缩小解码；
+      draft 会改变图片本身，不能在调用方传入的图片上做（同一张图之后可能要按更大的尺寸绘制）
+    - 缩小倍数较大时通过 reducing_gap 先做整数倍 reduce()，再做一次小范围的双线性缩放
+    返回的是缓存中的共享对象，调用方只能读取（粘贴），不要修改
+    """
+    content_key = image.info.get("content_key")
+    cache_key = (content_key, size)
+    if content_key is not None:
+        cached = _lru_get(_content_image_cache, cache_key)
+        if cached is not None:
+            return cached
+
+    source = image
+    raw = image.info.get("content_bytes")
+    if image.format == "JPEG" and raw is not None:
+        source = Image.open(io.BytesIO(raw))
+        source.draft(None, size)
+
+    if source.size != size:
+        resized = source.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    else:
+        source.load()
+        resized = source
+
+    if content_key is not None:
+        _lru_put(_content_image_cache, cache_key, resized, _CONTENT_IMAGE_CACHE_LIMIT)
+    return resized
+
 
 def load_image_cached(image_path: str) -> Image.Image:
     """通用图片缓存加载，支持透明通道"""
@@ -320,8 +490,12 @@ def load_background_safe(image_path: str, default_size: tuple = (800, 600), defa
         return default_img
 
 # 安全加载角色图片（文件不存在时返回默认值）
-def load_character_safe(image_path: str, default_size: tuple = (800, 600), default_color: tuple = (0, 0, 0, 0), emotion_index: int = 0) -> Image.Image:
-    """安全加载角色图片，文件不存在时返回默认图片"""
+def load_character_safe(image_path: str, default_size: tuple = (800, 600), default_color: tuple = (0, 0, 0, 0), emotion_index: int = 0,
+                        character_meta: Optional[dict] = None) -> Image.Image:
+    """安全加载角色图片，文件不存在时返回默认图片
+
+    character_meta 为该角色在 chara_meta.yml 中的配置（缩放/偏移），不传时使用 CONFIGS.current_character
+    """
     try:
         # 生成不区分格式的缓存键（移除文件扩展名）
         cache_key = image_path.rsplit('.', 1)[0]  # 移除扩展名
@@ -329,9 +503,11 @@ def load_character_safe(image_path: str, default_size: tuple = (800, 600), defau
             if image_path and os.path.exists(image_path):
                 img = Image.open(image_path).convert("RGBA")
                 
+                meta = CONFIGS.current_character if character_meta is None else character_meta
+
                 # 应用缩放
-                scale = CONFIGS.current_character.get("scale", 1.0)
-                offset = CONFIGS.current_character.get("offset", (0, 0))
+                scale = meta.get("scale", 1.0)
+                offset = meta.get("offset", (0, 0))
                 
                 if scale != 1.0:
                     original_width, original_height = img.size
@@ -346,8 +522,8 @@ def load_character_safe(image_path: str, default_size: tuple = (800, 600), defau
                 result = Image.new("RGBA", (1000, 1000), (0, 0, 0, 0))
                 
                 # 应用额外偏移（如果有）
-                offsetX = CONFIGS.current_character.get(f"offsetX", {}).get(f"{emotion_index}", 0)
-                offsetY = CONFIGS.current_character.get(f"offsetY", {}).get(f"{emotion_index}", 0)
+                offsetX = meta.get(f"offsetX", {}).get(f"{emotion_index}", 0)
+                offsetY = meta.get(f"offsetY", {}).get(f"{emotion_index}", 0)
                 
                 # 计算粘贴位置（水平居中对齐 + 偏移）
                 paste_x = offset[0] + 500 - img_width//2 + offsetX
@@ -377,13 +553,23 @@ def load_resource_image(relative_path: str) -> Image.Image:
     image_path = get_resource_path(relative_path)
     return load_image_cached(image_path)
 
+def load_content_layer_cached(cache_key: tuple, render: Callable[[], Any]) -> Any:
+    """按绘制参数缓存内容图层：换表情/背景或重复发送相同内容时直接复用，未命中时调用 render 绘制
+
+    返回的是缓存中的共享对象，调用方只能读取（合成），不要修改
+    """
+    cached = _lru_get(_content_layer_cache, cache_key)
+    if cached is not None:
+        return cached
+
+    layer = render()
+    _lru_put(_content_layer_cache, cache_key, layer, _CONTENT_LAYER_CACHE_LIMIT)
+    return layer
+
+
 def clear_all_cache():
-    """清理所有缓存以释放内存"""
-    global _font_cache, _background_cache, _character_cache, _general_image_cache
-    _font_cache.clear()
-    _background_cache.clear()
-    _character_cache.clear()
-    _general_image_cache.clear()
+    """清理所有缓存以释放内存（包括注册的派生缓存，如 render_utils 的底图缓存）"""
+    clear_cache("all")
 
 def clear_character_cache():
     """清理角色图片缓存以释放内存"""
@@ -392,13 +578,31 @@ def clear_character_cache():
 
 def clear_cache(cache_type: str = "all"):
     """清理特定类型的缓存"""
-    global _font_cache, _background_cache, _character_cache, _general_image_cache
+    global _font_cache, _glyph_cache, _background_cache, _character_cache, _general_image_cache
     
     if cache_type in ("font", "all"):
         _font_cache.clear()
+        with _lru_lock:
+            _glyph_cache.clear()
     if cache_type in ("background", "all"):
         _background_cache.clear()
     if cache_type in ("character", "all"):
         _character_cache.clear()
     if cache_type in ("image", "all"):
-        _general_image_cache.clear()
\ No newline at end of file
+        _general_image_cache.clear()
+    if cache_type in ("emoji", "all"):
+        _emoji_source_cache.clear()
+        with _lru_lock:
+            _emoji_sized_cache.clear()
+    if cache_type in ("content", "all"):
+        with _lru_lock:
+            _content_image_cache.clear()
+            _content_layer_cache.clear()
+    for cache_types, clear in _cache_clear_hooks:
+        if cache_type in cache_types:
+            clear()
+
+
+def register_cache_clear_hook(clear: Callable[[], None], cache_types: Tuple[str, ...]):
+    """注册依赖这里缓存的派生缓存（如 render_utils 的底图缓存），clear_cache 清理对应类型时一并清理"""
+    _cache_clear_hooks.append((cache_types + ("all",), clear))
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""命令行入口 - 不打开GUI、不经过剪贴板直接生成文本框图片
+
+用法:
+    python -m manosaba render 输入.jsonl -o 输出目录 [--format png|webp] [--workers N]
+    python -m manosaba serve [--port 8765] [--workers N] [--max-pending N]
+
+输入为 JSONL（每行一个对象）或带表头的 CSV，字段:
+    text, character, emotion, background, image（可选，相对路径以输入文件所在目录为准）
+角色/表情/背景为空时使用当前角色和按行号固定的随机值。
+输出文件按输入行号命名（000000.png ...），已存在的文件会被跳过，中断后重新运行即可继续。
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from config import CONFIGS
+from engine import Engine
+from load_utils import load_font_cached
+from render_utils import RenderJob, render_job, resolve_font_name
+
+_OUTPUT_EXTENSIONS = {"png": ".png", "webp": ".webp"}
+
+# 渲染进程内的设置（由 _init_render_worker 设置，底图/字体缓存在进程生命周期内保持）
+_worker_settings: dict = {}
+_worker_engine = None
+
+
+def read_render_jobs(path: str) -> List[RenderJob]:
+    """读取 JSONL/CSV 任务文件"""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    fields = RenderJob._fields
+    jobs = []
+
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    for row in rows:
+        values = {k: (row.get(k) if row.get(k) != "" else None) for k in fields}
+        if values["image"] and not os.path.isabs(values["image"]):
+            values["image"] = os.path.join(base_dir, values["image"])
+        values["text"] = values["text"] or ""
+        jobs.append(RenderJob(**values))
+    return jobs
+
+
+def _init_render_worker(settings: dict):
+    """渲染进程初始化：保存设置并预热字体列表和当前角色字体"""
+    global _worker_settings, _worker_engine
+    _worker_settings = settings
+    # 渲染进程只需要配置和绘制缓存，不启动预加载线程、不创建情感分析器
+    _worker_engine = Engine(preload=False, sentiment=False).start()
+
+    font_name = resolve_font_name(CONFIGS.gui_settings.get("font_family"), CONFIGS.get_character())
+    load_font_cached(font_name, CONFIGS.gui_settings.get("font_size", 120))
+
+
+def _render_to_file(task: Tuple[int, RenderJob, str]) -> Tuple[int, int, float, Optional[str]]:
+    """渲染一个任务并原子写入文件，返回 (序号, 字节数, 耗时ms, 错误信息)"""
+    index, job, out_path = task
+    st = time.perf_counter()
+    try:
+        result = render_job(
+            job,
+            seed=_worker_settings.get("seed", 0) + index,
+            encoder_settings=_worker_settings.get("encoder_settings"),
+            compression_settings=_worker_settings.get("compression_settings"),
+        )
+        tmp_path = out_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(result.data)
+        os.replace(tmp_path, out_path)
+        return index, result.size, (time.perf_counter() - st) * 1000, None
+    except Exception as e:
+        return index, 0, (time.perf_counter() - st) * 1000, f"{type(e).__name__}: {e}"
+
+
+def _run_tasks(tasks, settings: dict, workers: int) -> Iterator[Tuple[int, int, float, Optional[str]]]:
+    """按输入顺序返回结果；workers<=1 时在当前进程中执行"""
+    if workers <= 1:
+        _init_render_worker(settings)
+        for task in tasks:
+            yield _render_to_file(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker, initargs=(settings,)) as executor:
+        # 分块提交，减少进程间通信；map 保证结果顺序与输入一致
+        chunksize = max(1, min(16, len(tasks) // (workers * 4)))
+        yield from executor.map(_render_to_file, tasks, chunksize=chunksize)
+
+
+def cmd_render(args) -> int:
+    jobs = read_render_jobs(args.input)
+    ext = _OUTPUT_EXTENSIONS[args.format]
+    os.makedirs(args.output, exist_ok=True)
+
+    tasks = []
+    for index, job in enumerate(jobs):
+        out_path = os.path.join(args.output, f"{index:06d}{ext}")
+        if not args.overwrite and os.path.exists(out_path):
+            continue
+        tasks.append((index, job, out_path))
+
+    skipped = len(jobs) - len(tasks)
+    print(f"共 {len(jobs)} 个任务，跳过已存在 {skipped} 个，待渲染 {len(tasks)} 个")
+    if not tasks:
+        return 0
+
+    encoder_settings = {"format": args.format}
+    if args.quality is not None:
+        encoder_settings["quality"] = args.quality
+    if args.compress_level is not None:
+        encoder_settings["compress_level"] = args.compress_level
+    settings = {
+        "seed": args.seed,
+        "encoder_settings": encoder_settings,
+        "compression_settings": (
+            {"pixel_reduction_ratio": args.pixel_reduction} if args.pixel_reduction else None
+        ),
+    }
+    workers = args.workers if args.workers is not None else (os.cpu_count() or 1)
+    workers = max(1, min(workers, len(tasks)))
+
+    st = time.perf_counter()
+    done = failed = 0
+    total_bytes = 0
+    for index, size, elapsed_ms, error in _run_tasks(tasks, settings, workers):
+        if error:
+            failed += 1
+            print(f"[{index:06d}] 失败: {error}")
+        else:
+            done += 1
+            total_bytes += size
+            if args.verbose:
+                print(f"[{index:06d}] {size} 字节, {elapsed_ms:.1f}ms")
+        finished = done + failed
+        if not args.verbose and (finished % 50 == 0 or finished == len(tasks)):
+            elapsed = time.perf_counter() - st
+            print(f"进度 {finished}/{len(tasks)}，{finished / elapsed:.1f} 张/秒")
+
+    elapsed = time.perf_counter() - st
+    print(
+        f"完成 {done} 张，失败 {failed} 张，进程数 {workers}，用时 {elapsed:.2f}s，"
+        f"吞吐 {done / elapsed:.2f} 张/秒，平均 {total_bytes // max(done, 1)} 字节"
+    )
+    return 1 if failed else 0
+
+
+def cmd_serve(args) -> int:
+    # 服务模式按需导入，批量渲染不需要加载 http.server
+    from render_server import serve
+
+    try:
+        serve(args.host, args.port, args.workers, args.max_pending, args.timeout, args.warm)
+    except (ValueError, OSError) as e:
+        print(f"渲染服务启动失败: {e}")
+        return 1
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="manosaba", description="魔裁文本框生成器命令行工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    render = subparsers.add_parser("render", help="批量渲染文本框图片")
+    render.add_argument("input", help="任务文件（.jsonl 或 .csv）")
+    render.add_argument("-o", "--output", required=True, help="输出目录")
+    render.add_argument("-f", "--format", choices=sorted(_OUTPUT_EXTENSIONS), default="png", help="输出格式")
+    render.add_argument("-j", "--workers", type=int, default=None, help="渲染进程数，默认CPU核数，1表示不使用子进程")
+    render.add_argument("--quality", type=int, default=None, help="WebP 质量")
+    render.add_argument("--compress-level", type=int, default=None, help="PNG 压缩等级（0-9）")
+    render.add_argument("--pixel-reduction", type=int, default=0, help="输出缩小比例（百分比），默认不缩小")
+    render.add_argument("--seed", type=int, default=0, help="未指定表情/背景时的随机种子（与行号相加）")
+    render.add_argument("--overwrite", action="store_true", help="覆盖已存在的输出文件")
+    render.add_argument("-v", "--verbose", action="store_true", help="逐张输出大小和耗时")
+    render.set_defaults(func=cmd_render)
+
+    serve = subparsers.add_parser("serve", help="启动本地HTTP渲染服务（只监听回环地址）")
+    serve.add_argument("--host", default="127.0.0.1", help="监听地址，只允许回环地址")
+    serve.add_argument("--port", type=int, default=8765, help="监听端口")
+    serve.add_argument("-j", "--workers", type=int, default=2, help="渲染线程数")
+    serve.add_argument("--max-pending", type=int, default=8, help="排队请求上限，超过时返回503")
+    serve.add_argument("--timeout", type=float, default=30.0, help="单个请求的渲染超时（秒）")
+    serve.add_argument("--warm", default=None, help="启动时预热的角色")
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
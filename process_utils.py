@@ -0,0 +1,215 @@
+"""前台进程解析 - 白名单检查用，进程名按 pid 缓存，白名单预先转成小写集合
+
+Windows: GetForegroundWindow -> pid，进程名按 (窗口, pid) 缓存，只有新窗口才调用 psutil
+macOS:   优先用 AppKit（pyobjc）的 NSWorkspace 直接读取前台应用；没有 pyobjc 时启动一个常驻的
+         osascript (JXA) 进程，每次检查通过管道问一次，而不是每次 fork 一个 osascript
+其他平台: 返回空字符串（不做白名单限制）
+"""
+
+import threading
+from collections import OrderedDict
+from sys import platform
+from typing import FrozenSet, Iterable, Optional
+
+if platform.startswith("win"):
+    try:
+        import win32gui
+        import win32process
+    except ImportError:
+        print("[red]请先安装 Windows 运行库: pip install pywin32[/red]")
+        raise
+
+PROCESS_NAME_CACHE_SIZE = 64
+HELPER_TIMEOUT = 2.0  # 秒
+
+# 常驻的 JXA 脚本：每从标准输入读到一行，输出一次前台进程名（与原来的 osascript 查询相同）
+_MAC_HELPER_SCRIPT = r"""
+ObjC.import('Foundation');
+var events = Application('System Events');
+var stdin = $.NSFileHandle.fileHandleWithStandardInput;
+var stdout = $.NSFileHandle.fileHandleWithStandardOutput;
+while (true) {
+    var data = stdin.availableData;
+    if (data.length == 0) break;
+    var name = '';
+    try { name = events.processes.whose({frontmost: true})[0].name(); } catch (e) {}
+    stdout.writeData($(name + '\n').dataUsingEncoding($.NSUTF8StringEncoding));
+}
+"""
+
+
+class _MacForegroundHelper:
+    """常驻的 osascript 进程，异常退出后下次检查时重新启动"""
+
+    def __init__(self):
+        self._process = None
+
+    def _start(self):
+        import subprocess
+
+        self._process = subprocess.Popen(
+            ["osascript", "-l", "JavaScript", "-e", _MAC_HELPER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+        )
+
+    def query(self) -> Optional[str]:
+        for _ in range(2):
+            if self._process is None or self._process.poll() is not None:
+                try:
+                    self._start()
+                except OSError:
+                    return None
+            try:
+                self._process.stdin.write("\n")
+                self._process.stdin.flush()
+                line = self._readline()
+            except (OSError, ValueError):
+                line = None
+            if line:
+                return line.strip()
+            self.close()
+        return None
+
+    def _readline(self) -> Optional[str]:
+        """带超时地读取一行（System Events 没有响应时不让发送流程一直卡住）"""
+        result = []
+        reader = threading.Thread(target=lambda: result.append(self._process.stdout.readline()), daemon=True)
+        reader.start()
+        reader.join(HELPER_TIMEOUT)
+        return result[0] if result else None
+
+    def close(self):
+        if self._process is not None:
+            try:
+                self._process.kill()
+            except OSError:
+                pass
+            self._process = None
+
+
+class ForegroundResolver:
+    """获取前台进程名（小写）并检查白名单"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names: "OrderedDict[tuple, str]" = OrderedDict()
+        self._whitelist_source = None
+        self._whitelist: FrozenSet[str] = frozenset()
+        self._appkit_workspace = None
+        self._appkit_checked = False
+        self._mac_helper: Optional[_MacForegroundHelper] = None
+
+    def _cached_name(self, key: tuple, lookup) -> Optional[str]:
+        name = self._names.get(key)
+        if name is None:
+            name = lookup()
+            if name is None:
+                return None
+            self._names[key] = name
+            if len(self._names) > PROCESS_NAME_CACHE_SIZE:
+                self._names.popitem(last=False)
+        else:
+            self._names.move_to_end(key)
+        return name
+
+    def _get_windows_name(self) -> Optional[str]:
+        import psutil
+
+        try:
+            hwnd = win32gui.GetForegroundWindow()
+            if not hwnd:
+                return None
+            _, pid = win32process.GetWindowThreadProcessId(hwnd)
+        except OSError:
+            return None
+
+        def lookup():
+            try:
+                return psutil.Process(pid).name().lower()
+            except (psutil.Error, OSError):
+                return None
+
+        # pid 可能被新进程复用，与窗口句柄一起作为键
+        return self._cached_name((hwnd, pid), lookup)
+
+    def _get_appkit_workspace(self):
+        if not self._appkit_checked:
+            self._appkit_checked = True
+            try:
+                from AppKit import NSWorkspace
+
+                self._appkit_workspace = NSWorkspace.sharedWorkspace()
+            except ImportError:
+                self._appkit_workspace = None
+        return self._appkit_workspace
+
+    def _get_mac_name(self) -> Optional[str]:
+        workspace = self._get_appkit_workspace()
+        if workspace is not None:
+            app = workspace.frontmostApplication()
+            if app is None:
+                return None
+
+            def lookup():
+                url = app.executableURL()
+                name = url.lastPathComponent() if url is not None else app.localizedName()
+                return str(name).lower() if name else None
+
+            launch_date = app.launchDate()
+            launched_at = launch_date.timeIntervalSince1970() if launch_date is not None else 0.0
+            return self._cached_name((app.processIdentifier(), launched_at), lookup)
+
+        if self._mac_helper is None:
+            self._mac_helper = _MacForegroundHelper()
+        name = self._mac_helper.query()
+        return name.lower() if name is not None else None
+
+    def get_foreground_process_name(self) -> Optional[str]:
+        """获取前台进程名（小写），获取失败返回None，不支持的平台返回空字符串"""
+        with self._lock:
+            if platform.startswith("win"):
+                return self._get_windows_name()
+            elif platform == "darwin":
+                return self._get_mac_name()
+            else:
+                # Linux 支持
+                return ""
+
+    def _compiled_whitelist(self, whitelist: Iterable[str]) -> FrozenSet[str]:
+        # 白名单列表只会被整体替换（设置保存、重新加载配置），按对象判断是否需要重新生成
+        if whitelist is not self._whitelist_source:
+            self._whitelist = frozenset(n.lower() for n in whitelist)
+            self._whitelist_source = whitelist
+        return self._whitelist
+
+    def process_allowed(self, name: Optional[str], whitelist) -> bool:
+        """校验进程名是否在白名单"""
+        if not whitelist or name == "":
+            return True
+        if name is None:
+            return False
+        return name in self._compiled_whitelist(whitelist)
+
+    def clear(self):
+        with self._lock:
+            self._names.clear()
+            if self._mac_helper is not None:
+                self._mac_helper.close()
+
+
+_resolver: Optional[ForegroundResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_foreground_resolver() -> ForegroundResolver:
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = ForegroundResolver()
+    return _resolver
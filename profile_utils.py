@@ -0,0 +1,191 @@
+"""性能分析模块 - 按需用 cProfile（可选 tracemalloc）记录接下来的 N 次发送，结果写入轮换目录
+
+触发方式:
+    环境变量 MANOSABA_PROFILE=N          启动后记录前 N 次发送
+    环境变量 MANOSABA_PROFILE_MEMORY=1   同时记录 tracemalloc 快照
+    环境变量 MANOSABA_PROFILE_DIR=路径   输出目录（默认程序目录下的 profiles）
+    快捷键 profile_next                  记录接下来的 N 次发送（N 为 settings.yml 中 profiling.capture_count）
+
+每次记录生成一个目录，包含:
+    profile.prof   cProfile 原始数据（可用 snakeviz / pstats 查看）
+    profile.txt    按累计耗时排序的前若干项
+    memory.txt     tracemalloc 分配最多的代码行和峰值（开启内存记录时）
+    trace.txt      耗时追踪树（开启 MANOSABA_TRACE 时）
+    params.json    本次发送的参数和结果
+超过 profiling.max_dumps 个目录时删除最旧的。cProfile 只记录调用线程，后台情感分析线程不在其中。
+"""
+
+import io
+import os
+import json
+import time
+import pstats
+import shutil
+import cProfile
+import threading
+import tracemalloc
+from typing import Any, Dict, Optional
+
+from path_utils import get_base_path
+from trace_utils import format_trace, get_recent_traces, is_tracing_enabled
+
+MAX_PROFILE_DUMPS = 20
+PROFILE_TOP_FUNCTIONS = 40
+MEMORY_TOP_LINES = 30
+_DUMP_MARKER = "params.json"
+
+_lock = threading.Lock()
+_remaining = int(os.environ.get("MANOSABA_PROFILE", "0") or 0)
+_memory = os.environ.get("MANOSABA_PROFILE_MEMORY", "").lower() in ("1", "true", "yes")
+_profile_dir = os.environ.get("MANOSABA_PROFILE_DIR") or os.path.join(get_base_path(), "profiles")
+_max_dumps = MAX_PROFILE_DUMPS
+_capture_count = 3
+
+
+def configure_profiling(settings: Optional[dict]):
+    """应用 settings.yml 中的 profiling 设置（环境变量优先）"""
+    global _memory, _profile_dir, _max_dumps, _capture_count
+    settings = settings or {}
+    with _lock:
+        if "MANOSABA_PROFILE_MEMORY" not in os.environ:
+            _memory = bool(settings.get("memory", _memory))
+        if "MANOSABA_PROFILE_DIR" not in os.environ and settings.get("dir"):
+            _profile_dir = settings["dir"]
+        _max_dumps = max(1, int(settings.get("max_dumps", _max_dumps)))
+        _capture_count = max(1, int(settings.get("capture_count", _capture_count)))
+
+
+def arm_profiling(count: Optional[int] = None) -> int:
+    """记录接下来的 count 次发送（默认 profiling.capture_count），返回待记录的总次数"""
+    global _remaining
+    with _lock:
+        _remaining = count if count is not None else _capture_count
+        return _remaining
+
+
+def get_profiling_remaining() -> int:
+    with _lock:
+        return _remaining
+
+
+def get_profile_dir() -> str:
+    return _profile_dir
+
+
+class _NullCapture:
+    """未开启记录时使用的空对象"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **params):
+        pass
+
+
+_NULL_CAPTURE = _NullCapture()
+
+
+class ProfileCapture:
+    """一次记录：进入时开始 cProfile/tracemalloc，退出时写入目录"""
+
+    def __init__(self, name: str, memory: bool):
+        self.name = name
+        self.memory = memory
+        self.params: Dict[str, Any] = {}
+        self.path: Optional[str] = None
+        self._profiler = cProfile.Profile()
+        self._started_tracemalloc = False
+        self._start = 0.0
+
+    def set(self, **params):
+        """补充本次发送的参数（角色、表情、文本长度、结果等）"""
+        self.params.update(params)
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._started_tracemalloc = True
+        self._start = time.perf_counter()
+        self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profiler.disable()
+        elapsed_ms = (time.perf_counter() - self._start) * 1000
+        if exc_type is not None:
+            self.params["error"] = f"{exc_type.__name__}: {exc}"
+
+        snapshot = peak = None
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+        try:
+            self.path = self._write(elapsed_ms, snapshot, peak)
+            print(f"[profile] 已保存性能分析: {self.path}")
+        except OSError as e:
+            print(f"[profile] 写入性能分析失败: {e}")
+        return False
+
+    def _write(self, elapsed_ms: float, snapshot, peak: Optional[int]) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+        path = os.path.join(_profile_dir, f"{stamp}-{self.name}")
+        os.makedirs(path, exist_ok=True)
+
+        self._profiler.dump_stats(os.path.join(path, "profile.prof"))
+        text = io.StringIO()
+        pstats.Stats(self._profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        with open(os.path.join(path, "profile.txt"), "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+
+        if snapshot is not None:
+            with open(os.path.join(path, "memory.txt"), "w", encoding="utf-8") as f:
+                f.write(f"峰值: {peak / 1024:.1f} KB\n\n")
+                for stat in snapshot.statistics("lineno")[:MEMORY_TOP_LINES]:
+                    f.write(f"{stat}\n")
+
+        if is_tracing_enabled():
+            traces = get_recent_traces()
+            if traces:
+                with open(os.path.join(path, "trace.txt"), "w", encoding="utf-8") as f:
+                    f.write(format_trace(traces[-1]))
+
+        params = dict(self.params, name=self.name, elapsed_ms=round(elapsed_ms, 1), memory=self.memory)
+        with open(os.path.join(path, _DUMP_MARKER), "w", encoding="utf-8") as f:
+            json.dump(params, f, ensure_ascii=False, indent=2, default=str)
+
+        _rotate_dumps()
+        return path
+
+
+def _rotate_dumps():
+    """只保留最新的 max_dumps 个记录目录（只处理带 params.json 的目录）"""
+    try:
+        dumps = sorted(
+            entry.path for entry in os.scandir(_profile_dir)
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, _DUMP_MARKER))
+        )
+    except OSError:
+        return
+    for path in dumps[:-_max_dumps]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def profile_capture(name: str) -> Any:
+    """还有待记录的次数时返回一个记录对象（配合 with 使用），否则返回空对象"""
+    global _remaining
+    if _remaining <= 0:
+        return _NULL_CAPTURE
+    with _lock:
+        if _remaining <= 0:
+            return _NULL_CAPTURE
+        _remaining -= 1
+        memory = _memory
+    return ProfileCapture(name, memory)
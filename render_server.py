@@ -0,0 +1,295 @@
+"""本地渲染服务 - 只监听本机回环地址，供同一台机器上的聊天机器人等程序请求文本框图片
+
+接口:
+    POST /render   JSON: text, character, emotion, background, image_base64, format(png/webp), quality, seed
+                   返回图片数据
+    GET  /preview  查询参数: character, emotion, background, format
+                   返回不带文字的底图
+    GET  /health   返回服务状态（JSON）
+
+渲染在固定数量的线程中进行，底图/字体/字形缓存在进程内共享；
+排队中的请求超过 max_pending 时返回 503。
+响应头 X-Queue-Ms / X-Render-Ms / X-Encode-Ms / X-Total-Ms 以及 Server-Timing 给出各阶段耗时。
+"""
+
+import io
+import json
+import time
+import base64
+import threading
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+from encode_utils import encode_image
+from engine import Engine
+from render_utils import RenderJob, get_base_image, render_job, resolve_job
+
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 20 * 1024 * 1024
+
+_CONTENT_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+class RenderServiceError(Exception):
+    """带HTTP状态码的请求错误"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RenderService:
+    """渲染线程池和排队限制"""
+
+    def __init__(self, workers: int = 2, max_pending: int = 8, timeout: float = 30.0):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+        # 正在渲染 + 排队中的请求数上限
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self._lock = threading.Lock()
+        self._stats = {"pending": 0, "completed": 0, "rejected": 0, "failed": 0}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, workers=self.workers, max_pending=self.max_pending)
+
+    def _count(self, key: str, delta: int = 1):
+        with self._lock:
+            self._stats[key] += delta
+
+    def run(self, func, *args) -> Tuple[object, float]:
+        """在渲染线程中执行 func，返回 (结果, 排队耗时ms)；队列已满时抛出 503"""
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise RenderServiceError(503, "渲染队列已满")
+        self._count("pending")
+        submitted = time.perf_counter()
+
+        def task():
+            queued_ms = (time.perf_counter() - submitted) * 1000
+            return func(*args), queued_ms
+
+        def release(_future=None):
+            # 任务真正结束（完成/失败/取消）后才归还名额：超时返回 504 的任务仍在运行，继续占用名额
+            self._count("pending", -1)
+            self._slots.release()
+
+        try:
+            future = self._executor.submit(task)
+        except RuntimeError:
+            release()
+            self._count("rejected")
+            raise RenderServiceError(503, "渲染服务正在关闭")
+        future.add_done_callback(release)
+
+        try:
+            result = future.result(timeout=self.timeout)
+            self._count("completed")
+            return result
+        except FuturesTimeoutError:
+            future.cancel()
+            self._count("failed")
+            raise RenderServiceError(504, "渲染超时")
+        except Exception:
+            self._count("failed")
+            raise
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _optional_int(value, name: str) -> Optional[int]:
+    """请求中的整数参数，格式不对时返回 400"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise RenderServiceError(400, f"参数 {name} 必须是整数")
+    try:
+        return int(value)
+    except ValueError:
+        raise RenderServiceError(400, f"参数 {name} 必须是整数: {value!r}")
+
+
+def _encoder_settings(fmt: Optional[str], quality: Optional[int]) -> dict:
+    fmt = (fmt or "png").lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in _CONTENT_TYPES:
+        raise RenderServiceError(400, f"不支持的输出格式: {fmt}")
+    settings = {"format": fmt}
+    quality = _optional_int(quality, "quality")
+    if quality is not None:
+        settings["quality"] = quality
+    return settings
+
+
+def _render_request(payload: dict) -> Tuple[bytes, str, Dict[str, float]]:
+    """执行 /render 请求，返回 (图片数据, 格式, 各阶段耗时)"""
+    st = time.perf_counter()
+    content_image = None
+    if payload.get("image_base64"):
+        try:
+            with Image.open(io.BytesIO(base64.b64decode(payload["image_base64"]))) as img:
+                content_image = img.convert("RGBA")
+        except Exception as e:
+            raise RenderServiceError(400, f"无法解析图片: {e}")
+
+    character = payload.get("character")
+    if character is not None and (isinstance(character, bool) or not isinstance(character, (int, str))):
+        raise RenderServiceError(400, "参数 character 必须是角色名或序号")
+    job = RenderJob(
+        text=str(payload.get("text") or ""),
+        character=character,
+        emotion=_optional_int(payload.get("emotion"), "emotion"),
+        background=_optional_int(payload.get("background"), "background"),
+    )
+    settings = _encoder_settings(payload.get("format"), payload.get("quality"))
+    seed = _optional_int(payload.get("seed"), "seed")
+    try:
+        result = render_job(job, seed=seed, encoder_settings=settings, content_image=content_image)
+    except ValueError as e:
+        raise RenderServiceError(400, str(e))
+    total_ms = (time.perf_counter() - st) * 1000
+    return bytes(result.data), result.format, {
+        "render": total_ms - result.elapsed_ms,
+        "encode": result.elapsed_ms,
+    }
+
+
+def _preview_request(query: Dict[str, str]) -> Tuple[bytes, str, Dict[str, float]]:
+    """执行 /preview 请求：只绘制底图"""
+    st = time.perf_counter()
+    job = RenderJob(
+        character=query.get("character"),
+        emotion=_optional_int(query.get("emotion"), "emotion"),
+        background=_optional_int(query.get("background"), "background"),
+    )
+    seed = _optional_int(query.get("seed"), "seed")
+    try:
+        character_name, background_index, emotion_index = resolve_job(job, seed)
+    except ValueError as e:
+        raise RenderServiceError(400, str(e))
+    base = get_base_image(character_name, background_index, emotion_index)
+    render_ms = (time.perf_counter() - st) * 1000
+    result = encode_image(base, _encoder_settings(query.get("format"), query.get("quality")))
+    return bytes(result.data), result.format, {"render": render_ms, "encode": result.elapsed_ms}
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    server_version = "ManosabaRender/1.0"
+    service: RenderService = None  # 由 create_server 设置
+
+    def log_message(self, format, *args):
+        print(f"[render_server] {self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, data: dict, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_image(self, data: bytes, fmt: str, timings: Dict[str, float]):
+        self.send_response(200)
+        self.send_header("Content-Type", _CONTENT_TYPES.get(fmt, "application/octet-stream"))
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in timings.items():
+            self.send_header(f"X-{name.capitalize()}-Ms", f"{value:.1f}")
+        self.send_header("Server-Timing", ", ".join(f"{name};dur={value:.1f}" for name, value in timings.items()))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, func, arg):
+        st = time.perf_counter()
+        try:
+            (data, fmt, timings), queued_ms = self.service.run(func, arg)
+        except RenderServiceError as e:
+            headers = {"Retry-After": "1"} if e.status == 503 else None
+            self._send_json(e.status, {"error": str(e)}, headers)
+            return
+        except Exception as e:
+            print(f"[render_server] 渲染失败: {e}")
+            self._send_json(500, {"error": f"渲染失败: {e}"})
+            return
+        timings = {"queue": queued_ms, **timings, "total": (time.perf_counter() - st) * 1000}
+        self._send_image(data, fmt, timings)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send_json(200, {"status": "ok", **self.service.stats()})
+        elif url.path == "/preview":
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            self._handle(_preview_request, query)
+        else:
+            self._send_json(404, {"error": "未知接口"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/render":
+            self._send_json(404, {"error": "未知接口"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self._send_json(413 if length > 0 else 400, {"error": "请求体为空或过大"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length).decode("utf-8"))
+            if not isinstance(payload, dict):
+                raise ValueError("请求体必须是JSON对象")
+        except ValueError as e:
+            self._send_json(400, {"error": f"无效的JSON: {e}"})
+            return
+        self._handle(_render_request, payload)
+
+
+def create_server(
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    workers: int = 2,
+    max_pending: int = 8,
+    timeout: float = 30.0,
+) -> ThreadingHTTPServer:
+    """创建渲染服务（只允许回环地址）"""
+    try:
+        loopback = host == "localhost" or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise ValueError(f"渲染服务只允许监听本机回环地址: {host}")
+
+    service = RenderService(workers, max_pending, timeout)
+    handler = type("BoundRenderRequestHandler", (RenderRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.render_service = service
+    return server
+
+
+def serve(host: str = "127.0.0.1", port: int = DEFAULT_PORT, workers: int = 2, max_pending: int = 8,
+          timeout: float = 30.0, warm_character: Optional[str] = None):
+    engine = Engine(preload=False, sentiment=False).start()
+    server = create_server(host, port, workers, max_pending, timeout)
+    if warm_character:
+        # 预热：先绘制一次底图，加载字体/背景/立绘缓存
+        _render_request({"text": "预热", "character": warm_character, "seed": 0})
+    print(f"渲染服务已启动: http://{host}:{server.server_address[1]}  (线程 {workers}，排队上限 {max_pending})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.render_service.shutdown()
+        engine.stop()
@@ -0,0 +1,274 @@
+"""无界面渲染模块 - 不依赖GUI和剪贴板，按 (文本, 角色, 表情, 背景, 图片) 直接生成文本框图片
+
+GUI（core.py）和命令行批量渲染（manosaba.py）共用这里的底图绘制。
+"""
+
+import os
+import random
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple, Union
+
+from PIL import Image, ImageDraw
+
+from config import CONFIGS, DEFAULT_BRACKET_COLOR, DEFAULT_TEXT_COLOR
+from path_utils import get_resource_path
+from font_utils import find_font_file, warn_missing_font
+from load_utils import (
+    load_background_safe, load_character_safe, load_image_cached, load_font_cached, register_cache_clear_hook,
+)
+from draw_utils import draw_content_auto
+from encode_utils import EncodeResult
+
+_IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp']
+
+# 底图缓存（GUI预览/发送和无界面渲染共用）: (角色, 背景, 表情) -> 底图
+# 每张是 2560x854 的 RGBA 图像（约 8.7MB），只保留最近几张；清理角色/背景/字体缓存时一并清空
+_base_image_cache: "OrderedDict[Tuple[str, int, int], Image.Image]" = OrderedDict()
+_BASE_IMAGE_CACHE_LIMIT = 4
+# 底图缓存的锁（同一底图只绘制一次）
+_base_image_lock = threading.Lock()
+
+
+def hex_to_rgb(hex_color: str) -> tuple:
+    """将十六进制颜色转换为RGB元组"""
+    hex_color = hex_color.lstrip('#')
+    if len(hex_color) == 3:
+        hex_color = ''.join([c*2 for c in hex_color])
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def resolve_font_name(font_family: Optional[str], character_name: str) -> str:
+    """对话框文字使用的字体文件，找不到设置的字体时使用角色专用字体"""
+    font_name = find_font_file(font_family)
+
+    if not font_name:
+        warn_missing_font(font_family)
+        font_name = CONFIGS.mahoshojo.get(character_name, {}).get("font", "font3.ttf")
+    return font_name
+
+
+def find_image_path(base_path: str) -> str:
+    """按支持的扩展名查找图片，都不存在时使用png路径"""
+    for ext in _IMAGE_EXTENSIONS:
+        if os.path.exists(base_path + ext):
+            return base_path + ext
+    return base_path + '.png'
+
+
+def generate_base_image_with_text(
+    character_name: str, background_index: int, emotion_index: int
+) -> Image.Image:
+    """生成带角色文字的基础图片"""
+    # 1. 创建一个2560x854的空白图片（透明背景）
+    canvas = Image.new("RGBA", (2560, 854), (0, 0, 0, 0))
+
+    # 2. 加载背景图（支持多格式），使用背景缓存函数（已包含缩放功能）
+    background_path = find_image_path(
+        get_resource_path(os.path.join("assets", "background", f"c{background_index}"))
+    )
+    background = load_background_safe(background_path, default_size=(2560, 854), default_color=(100, 100, 200))
+
+    # 计算背景图粘贴位置（底部对齐、水平居中）
+    bg_x = (canvas.width - background.width) // 2  # 水平居中
+    bg_y = canvas.height - background.height  # 底部对齐
+
+    # 将背景图粘贴到画布上
+    canvas.paste(background, (bg_x, bg_y), background)
+
+    # 3. 加载textbox1.png（黑色渐变效果）
+    textbox_path = get_resource_path(os.path.join("assets", "shader", "textbox.png"))
+    if os.path.exists(textbox_path):
+        textbox = load_image_cached(textbox_path)
+        # 确保textbox宽度为2560（如果原始尺寸不同，则进行等比缩放）
+        if textbox.width != 2560:
+            # 计算缩放比例和新高度
+            width_ratio = 2560 / textbox.width
+            new_height = int(textbox.height * width_ratio)
+            textbox = textbox.resize((2560, new_height), Image.Resampling.LANCZOS)
+
+        # 左下角对齐位置
+        textbox_y = canvas.height - textbox.height
+
+        # 确保textbox是RGBA模式
+        if textbox.mode != 'RGBA':
+            textbox = textbox.convert('RGBA')
+        # 创建一个新的合成图层
+        textbox_layer = Image.new("RGBA", canvas.size, (0, 0, 0, 0))
+        textbox_layer.paste(textbox, (0, textbox_y), textbox)
+
+        # 使用alpha_composite进行正确的alpha混合
+        canvas = Image.alpha_composite(canvas, textbox_layer)
+
+    # 4. 加载角色图片（支持多种格式）
+    overlay_path = find_image_path(get_resource_path(os.path.join(
+        "assets",
+        "chara",
+        character_name,
+        f"{character_name} ({emotion_index})"
+    )))
+    # 按目标角色自己的缩放/偏移绘制，不依赖（也不修改）CONFIGS.current_character
+    character_meta = CONFIGS.mahoshojo.get(character_name, CONFIGS.current_character)
+    overlay = load_character_safe(overlay_path, default_size=(800, 600), default_color=(0, 0, 0, 0), emotion_index=emotion_index,
+                                  character_meta=character_meta)
+
+    # 计算角色图片粘贴位置（左下角对齐，相对于整个画布）
+    chara_x = 0  # 左下角对齐，x坐标为0
+    chara_y = canvas.height - overlay.height  # 左下角对齐，y坐标为画布高度-角色图片高度
+
+    # 将角色图片粘贴到画布上
+    canvas.paste(overlay, (chara_x, chara_y), overlay)
+
+    # 5. 加载namebase.png
+    namebase_path = get_resource_path(os.path.join("assets", "shader", "namebase.png"))
+    if os.path.exists(namebase_path):
+        namebase = load_image_cached(namebase_path)
+        new_height = int(namebase.height * 1.3)
+        new_width = int(namebase.width * 1.3)
+        namebase = namebase.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+        # 左下角对齐粘贴
+        namebase_y = canvas.height - namebase.height-400
+        canvas.paste(namebase, (500, namebase_y), namebase)
+
+    # 6. 添加角色名称文字
+    if CONFIGS.text_configs_dict and character_name in CONFIGS.text_configs_dict:
+        draw = ImageDraw.Draw(canvas)
+        shadow_offset = (2, 2)
+        shadow_color = (0, 0, 0)
+        # 获取字体
+        font_name = character_meta.get("font", "font3.ttf")
+
+        for config in CONFIGS.text_configs_dict[character_name]:
+            text = config["text"]
+            position = tuple(config["position"])
+            font_color = tuple(config["font_color"])
+            font_size = config["font_size"]
+
+            font = load_font_cached(font_name, font_size)
+
+            # 计算新的位置
+            text_x = int(position[0])
+            # 假设文字在画布底部上方100px的位置
+            text_y = canvas.height - 850 + int(position[1])
+
+            # 绘制阴影文字
+            shadow_position = (
+                text_x + shadow_offset[0],
+                text_y + shadow_offset[1],
+                text_x + shadow_offset[0],
+                text_y + shadow_offset[1],
+            )
+            draw.text(shadow_position, text, fill=shadow_color, font=font)
+
+            # 绘制主文字
+            draw.text((text_x, text_y), text, fill=font_color, font=font)
+    return canvas
+
+
+def get_base_image(character_name: str, background_index: int, emotion_index: int) -> Image.Image:
+    """合成好的底图（带缓存，只读，不要在上面直接绘制）"""
+    cache_key = (character_name, background_index, emotion_index)
+    with _base_image_lock:
+        base = _base_image_cache.get(cache_key)
+        if base is not None:
+            _base_image_cache.move_to_end(cache_key)
+            return base
+
+        base = generate_base_image_with_text(character_name, background_index, emotion_index)
+
+        _base_image_cache[cache_key] = base
+        if len(_base_image_cache) > _BASE_IMAGE_CACHE_LIMIT:
+            _base_image_cache.popitem(last=False)
+        return base
+
+
+def clear_base_image_cache():
+    with _base_image_lock:
+        _base_image_cache.clear()
+
+
+register_cache_clear_hook(clear_base_image_cache, ("character", "background", "font"))
+
+
+class RenderJob(NamedTuple):
+    """一次无界面渲染任务，角色/表情/背景为空时使用当前角色和随机值"""
+    text: str = ""
+    character: Optional[Union[str, int]] = None  # 角色键名、全名或从1开始的序号
+    emotion: Optional[int] = None
+    background: Optional[int] = None
+    image: Optional[str] = None                  # 插入的图片路径
+
+
+def resolve_character(character: Optional[Union[str, int]]) -> str:
+    """把角色键名/全名/序号解析为 chara_meta 中的键名"""
+    if character is None or character == "":
+        return CONFIGS.get_character()
+    if isinstance(character, int) or str(character).isdigit():
+        index = int(character)
+        if 0 < index <= len(CONFIGS.character_list):
+            return CONFIGS.character_list[index - 1]
+        raise ValueError(f"角色序号超出范围: {character}")
+    if character in CONFIGS.mahoshojo:
+        return character
+    for key, meta in CONFIGS.mahoshojo.items():
+        if meta.get("full_name") == character:
+            return key
+    raise ValueError(f"未知角色: {character}")
+
+
+def resolve_job(job: RenderJob, seed: Optional[int] = None) -> Tuple[str, int, int]:
+    """确定任务使用的 (角色, 背景, 表情)，随机值由 seed 决定，便于重复渲染得到相同结果
+
+    表情/背景超出范围时抛出 ValueError（否则会画出空白立绘或纯色背景）。
+    """
+    character_name = resolve_character(job.character)
+    rng = random.Random(seed)
+    emotion_count = CONFIGS.mahoshojo[character_name]["emotion_count"]
+    background_count = max(CONFIGS.background_count, 1)
+    emotion_index = int(job.emotion) if job.emotion not in (None, "") else rng.randint(1, emotion_count)
+    background_index = int(job.background) if job.background not in (None, "") else rng.randint(1, background_count)
+    if not 1 <= emotion_index <= emotion_count:
+        raise ValueError(f"角色 {character_name} 的表情序号超出范围 (1-{emotion_count}): {emotion_index}")
+    if not 1 <= background_index <= background_count:
+        raise ValueError(f"背景序号超出范围 (1-{background_count}): {background_index}")
+    return character_name, background_index, emotion_index
+
+
+def render_job(
+    job: RenderJob,
+    seed: Optional[int] = None,
+    encoder_settings: Optional[dict] = None,
+    compression_settings: Optional[dict] = None,
+    content_image: Optional[Image.Image] = None,
+) -> EncodeResult:
+    """渲染一个任务并按 encoder_settings 编码（文字设置取自 settings.yml）
+
+    content_image 不为空时直接使用该图片，忽略 job.image 路径。
+    """
+    character_name, background_index, emotion_index = resolve_job(job, seed)
+    base = get_base_image(character_name, background_index, emotion_index)
+
+    if content_image is None and job.image:
+        with Image.open(job.image) as img:
+            content_image = img.convert("RGBA")
+
+    box_top_left, box_bottom_right = CONFIGS.config.BOX_RECT
+    return draw_content_auto(
+        base,
+        box_top_left,
+        box_bottom_right,
+        job.text or None,
+        content_image,
+        text_align="left",
+        text_valign="top",
+        image_align="center",
+        image_valign="middle",
+        color=hex_to_rgb(CONFIGS.gui_settings.get("text_color", DEFAULT_TEXT_COLOR)),
+        bracket_color=hex_to_rgb(CONFIGS.gui_settings.get("bracket_color", DEFAULT_BRACKET_COLOR)),
+        max_font_height=CONFIGS.gui_settings.get("font_size", 120),
+        font_name=resolve_font_name(CONFIGS.gui_settings.get("font_family"), character_name),
+        image_padding=12,
+        compression_settings=compression_settings,
+        encoder_settings=encoder_settings,
+    )
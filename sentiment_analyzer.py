@@ -1,10 +1,15 @@
 from typing import Optional, Dict, Any
 import re
 
-import openai
 from config import CONFIGS
 
 
+def _get_openai():
+    """首次使用时才导入 openai（未启用情感匹配时不加载，缩短启动时间）"""
+    import openai
+    return openai
+
+
 class AIClientManager:
     """AI客户端管理器"""
     
@@ -15,6 +20,7 @@ class AIClientManager:
     def initialize_client(self, client_type: str, config: Dict[str, Any]) -> bool:
         """初始化AI客户端"""
         try:
+            openai = _get_openai()
             openai.api_key = config.get("api_key", "")
             openai.base_url = config.get("base_url", "http://localhost:11434/v1/")
             self.current_client = client_type
@@ -29,7 +35,7 @@ class AIClientManager:
         """测试连接"""
         try:
             # 发送一个简单的测试请求
-            response = openai.chat.completions.create(
+            response = _get_openai().chat.completions.create(
                 model=model_name,
                 messages=[{"role": "user", "content": "Hello"}],
                 max_tokens=5
@@ -102,7 +108,7 @@ class SentimentAnalyzer:
             current_client = self.client_manager.current_client
             model_name = models[current_client]["model"] if current_client in models else "deepseek-chat"
 
-            response = openai.chat.completions.create(
+            response = _get_openai().chat.completions.create(
                 model=model_name,
                 messages=messages,
                 temperature=0.1,
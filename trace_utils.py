@@ -0,0 +1,175 @@
+"""耗时追踪模块 - 为发送流程记录嵌套的耗时区间，可导出为 Chrome trace 格式（chrome://tracing / Perfetto）
+
+用法:
+    with trace_span("layout", chars=120) as span:
+        ...
+        span.set(font_size=64)
+
+未启用时 trace_span 直接返回一个空对象，开销只有一次函数调用。
+启用方式: 环境变量 MANOSABA_TRACE=1，或调用 enable_tracing()。
+设置 MANOSABA_TRACE_FILE=路径 后，每完成一次顶层追踪就把最近的追踪写入该文件。
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+MAX_RECENT_TRACES = 32
+
+_enabled = os.environ.get("MANOSABA_TRACE", "").lower() in ("1", "true", "yes")
+_trace_file = os.environ.get("MANOSABA_TRACE_FILE") or None
+_local = threading.local()
+_recent: Deque["Span"] = deque(maxlen=MAX_RECENT_TRACES)
+_recent_lock = threading.Lock()
+
+
+class _NullSpan:
+    """未启用追踪时使用的空区间"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """一个耗时区间，子区间按开始顺序记录在 children 中"""
+
+    __slots__ = ("name", "args", "start_ns", "end_ns", "children", "thread_id")
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+        self.start_ns = 0
+        self.end_ns = 0
+        self.children: List["Span"] = []
+        self.thread_id = threading.get_ident()
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set(self, **args):
+        """补充区间参数（如最终字号、编码大小）"""
+        self.args.update(args)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        if stack:
+            stack[-1].children.append(self)
+        stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        stack = _local.stack
+        stack.pop()
+        if not stack:
+            _finish_trace(self)
+        return False
+
+
+def trace_span(name: str, **args) -> Any:
+    """开始一个耗时区间（配合 with 使用），在其他区间内部调用时自动成为子区间"""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, args)
+
+
+def enable_tracing(enabled: bool = True, trace_file: Optional[str] = None):
+    global _enabled, _trace_file
+    _enabled = enabled
+    if trace_file is not None:
+        _trace_file = trace_file
+
+
+def is_tracing_enabled() -> bool:
+    return _enabled
+
+
+def _finish_trace(root: Span):
+    with _recent_lock:
+        _recent.append(root)
+    if _trace_file:
+        try:
+            export_chrome_trace(_trace_file)
+        except OSError as e:
+            print(f"[trace] 写入追踪文件失败: {e}")
+
+
+def get_recent_traces() -> List[Span]:
+    """最近完成的顶层追踪（旧的在前）"""
+    with _recent_lock:
+        return list(_recent)
+
+
+def clear_traces():
+    with _recent_lock:
+        _recent.clear()
+
+
+def format_trace(root: Span) -> str:
+    """把一次追踪格式化为缩进的耗时树，便于在控制台查看"""
+    lines = []
+
+    def walk(span: Span, depth: int):
+        args = " ".join(f"{k}={v}" for k, v in span.args.items())
+        lines.append(f"{'  ' * depth}{span.name}: {span.duration_ms:.1f}ms {args}".rstrip())
+        for child in span.children:
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return "\n".join(lines)
+
+
+def to_chrome_trace(traces: Optional[List[Span]] = None) -> Dict[str, Any]:
+    """转换为 Chrome trace-event JSON（完整事件 ph=X，时间单位微秒）"""
+    if traces is None:
+        traces = get_recent_traces()
+    pid = os.getpid()
+    events = []
+
+    def walk(span: Span):
+        events.append({
+            "name": span.name,
+            "ph": "X",
+            "ts": span.start_ns / 1000,
+            "dur": (span.end_ns - span.start_ns) / 1000,
+            "pid": pid,
+            "tid": span.thread_id,
+            "args": {k: v if isinstance(v, (int, float, str, bool)) or v is None else str(v)
+                     for k, v in span.args.items()},
+        })
+        for child in span.children:
+            walk(child)
+
+    for root in traces:
+        walk(root)
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def export_chrome_trace(path: str, traces: Optional[List[Span]] = None) -> str:
+    """把追踪写入 Chrome trace JSON 文件，返回文件路径"""
+    data = to_chrome_trace(traces)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path